@@ -1,3 +1,8 @@
-from energy_balance.config_parser import get_config
+from energy_balance.config_parser import get_config, Config
 
-CONFIG = get_config()
\ No newline at end of file
+
+def __getattr__(name):
+    # CONFIG is read when first used rather than on import, and is read again if the config files have changed
+    if name == 'CONFIG':
+        return get_config()
+    raise AttributeError(f"module 'energy_balance' has no attribute '{name}'")
@@ -0,0 +1,3 @@
+from energy_balance.cli import main
+
+main()
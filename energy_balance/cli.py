@@ -0,0 +1,67 @@
+import argparse
+import importlib
+import sys
+
+# the module of each subcommand and a short description for the help
+# the modules are only imported when their subcommand is run, so each only loads the dependencies it needs
+SUBCOMMANDS = {
+    'download-data': ('energy_balance.scripts.download_data', "Download today's data from the logger to daily csv files."),
+    'download-data-by-date': ('energy_balance.scripts.download_data_by_date', "Download data from the logger to daily csv files for a range of dates."),
+    'logger-daemon': ('energy_balance.scripts.logger_daemon', "Poll the logger tables continuously over one connection, appending to daily csv files."),
+    'add-to-mysql': ('energy_balance.scripts.add_to_mysql', "Insert today's data from the csv files into MySQL tables."),
+    'manage-schema': ('energy_balance.scripts.manage_schema', "Create partitioned MySQL tables from the logger tables and add partitions ahead of time."),
+    'create-files': ('energy_balance.scripts.create_files', "Create quality controlled netCDF files."),
+    'create-qc-csvs': ('energy_balance.scripts.create_qc_csvs', "Create masked csv files from the quality control."),
+    'process': ('energy_balance.scripts.process', "Create netCDF files and masked csv files from one quality control run."),
+    'calculate-valid-min-max': ('energy_balance.scripts.calculate_valid_min_max', "Recalculate valid_min and valid_max of variables in one or many netCDF files."),
+    'override-qc': ('energy_balance.scripts.override_qc', "Set QC flags in existing netCDF files for some time periods, and log them to be set again on reprocessing."),
+    'plot-csv': ('energy_balance.scripts.plot_csv', "Plot columns from a csv file."),
+    'benchmark-netcdf': ('energy_balance.scripts.benchmark_netcdf', "Compare netCDF storage settings on synthetic data."),
+    'benchmark-pipeline': ('energy_balance.scripts.benchmark_pipeline', "Time and memory profile each stage of the processing on synthetic data."),
+    'check-startup': ('energy_balance.scripts.check_startup', "Check the start up time of each subcommand is within a budget."),
+}
+
+
+def arg_parse(argv):
+    epilog = "subcommands:\n" + "\n".join(f"  {name:<25}{description}" for name, (_, description) in SUBCOMMANDS.items())
+    epilog += "\n\nUse 'energy-balance <subcommand> --help' to see the options for a subcommand."
+
+    parser = argparse.ArgumentParser(prog='energy-balance',
+                                     formatter_class=argparse.RawDescriptionHelpFormatter,
+                                     epilog=epilog)
+
+    parser.add_argument('subcommand',
+                        type=str,
+                        choices=list(SUBCOMMANDS),
+                        metavar='subcommand',
+                        help="The subcommand to run, see below.")
+
+    parser.add_argument('args',
+                        nargs=argparse.REMAINDER,
+                        help="The options for the subcommand.")
+
+    return parser.parse_args(argv)
+
+
+def run(subcommand, args):
+    """
+    Run a subcommand, importing its module only now.
+
+    :param subcommand: (str) The name of the subcommand e.g. create-files
+    :param args: (list) The command line options for the subcommand e.g. ['-s', '2021-07', '-f', 'monthly', '-d', 'soil']
+    :returns: The return value of the subcommand's main function.
+    """
+    module = importlib.import_module(SUBCOMMANDS[subcommand][0])
+
+    # the scripts parse sys.argv, so make it look as if the script was run directly
+    sys.argv = [f"energy-balance {subcommand}"] + list(args)
+    return module.main()
+
+
+def main(argv=None):
+    args = arg_parse(sys.argv[1:] if argv is None else argv)
+    return run(args.subcommand, args.args)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,21 +1,85 @@
 import os
+from collections.abc import Mapping
 from configparser import ConfigParser
 from itertools import chain
+from types import MappingProxyType
 
-# Global CONFIG used by other packages
-_CONFIG = None
+# Parsed configs, keyed by the config files they were read from
+# each entry is (modification times of the files, Config)
+_CONFIGS = {}
 
 
-def get_config(package=None):
-    global _CONFIG
+class Config(Mapping):
+    """
+    Read-only configuration, a mapping of section name to a read-only mapping of option name to (typed) value.
+    Lists in the config file are given as tuples.
 
-    if True:  # not _CONFIG:
-        _load_config(package)
+    :param sections: (dict) The options for each section e.g. {'common': {'qc_flag_level': 1}}
+    :param files: (sequence) The config files the options were read from.
+    """
 
-    return _CONFIG
+    def __init__(self, sections, files=()):
+        self._sections = {name: MappingProxyType({k: _freeze(v) for k, v in options.items()}) for name, options in sections.items()}
+        self.files = tuple(files)
 
+    def __getitem__(self, section):
+        return self._sections[section]
 
-def _gather_config_files(package=None):
+    def __iter__(self):
+        return iter(self._sections)
+
+    def __len__(self):
+        return len(self._sections)
+
+    def __repr__(self):
+        return f"Config(files={self.files})"
+
+    def __reduce__(self):
+        # allow configs to be passed to other processes, read-only mappings (e.g. dict options) can't be pickled so are passed as dicts
+        return Config, ({name: {k: _thaw(v) for k, v in options.items()} for name, options in self._sections.items()}, self.files)
+
+    def replace(self, section, **options):
+        """
+        Create a new config with some options changed, this config is not modified.
+
+        :param section: (str) The section containing the options e.g. 'common'
+        :param options: (dict) The new values of the options e.g. netcdf_path='/tmp'
+        :returns: (Config) The new config.
+        """
+        sections = {name: dict(values) for name, values in self._sections.items()}
+        sections.setdefault(section, {}).update(options)
+        return Config(sections, self.files)
+
+
+def _freeze(value):
+    # dict options are read-only, like the sections
+    return MappingProxyType(dict(value)) if isinstance(value, Mapping) else value
+
+
+def _thaw(value):
+    return dict(value) if isinstance(value, Mapping) else value
+
+
+def get_config(package=None, config_file=None):
+    """
+    Get the config, read from the default config file, /config.ini and the file set in the CONFIG environment variable (or config_file).
+    The config is only parsed again if any of the files have been modified since it was last read.
+
+    :param package: Not used.
+    :param config_file: (str) Optional. A config file to use instead of the CONFIG environment variable.
+    :returns: (Config) The config.
+    """
+    conf_files = tuple(_gather_config_files(package, config_file))
+    mtimes = tuple(os.stat(f).st_mtime_ns if os.path.isfile(f) else None for f in conf_files)
+
+    cached = _CONFIGS.get(conf_files)
+    if cached is None or cached[0] != mtimes:
+        cached = _CONFIGS[conf_files] = (mtimes, _load_config(conf_files))
+
+    return cached[1]
+
+
+def _gather_config_files(package=None, config_file=None):
     conf_files = []
     default_config = os.path.join(os.path.dirname(__file__), "etc", "config.ini")
 
@@ -30,20 +94,22 @@ def _gather_config_files(package=None):
         conf_files.append(sys_config)
 
     CONFIG = "CONFIG"
-    if CONFIG in os.environ:
+    if config_file:
+        conf_files.append(os.path.expanduser(config_file))
+    elif CONFIG in os.environ:
         conf_files.append(os.path.expanduser(os.environ[CONFIG]))
 
     return conf_files
 
 
 def _to_list(i):
-    return i.split()
+    return tuple(i.split())
 
 
 def _to_dict(i):
     if not i.strip():
-        return {}
-    return dict([_.split(":") for _ in i.strip().split("\n")])
+        return MappingProxyType({})
+    return MappingProxyType(dict([_.split(":") for _ in i.strip().split("\n")]))
 
 
 def _to_int(i):
@@ -88,10 +154,7 @@ def _get_mappers(conf):
     return mappers
 
 
-def _load_config(package=None):
-    global _CONFIG
-
-    conf_files = _gather_config_files(package)
+def _load_config(conf_files):
     conf = ConfigParser()
 
     conf.read(conf_files)
@@ -107,8 +170,11 @@ def _load_config(package=None):
             value = conf.get(section, key)
 
             if key in mappers:
-                value = mappers[key](value)
+                try:
+                    value = mappers[key](value)
+                except Exception as exc:
+                    raise ValueError(f"Invalid value for {key} in section [{section}] of the config: {exc}") from exc
 
             config[section][key] = value
 
-    _CONFIG = config
\ No newline at end of file
+    return Config(config, conf_files)
@@ -0,0 +1,143 @@
+import json
+import os
+import time
+from datetime import datetime, timedelta
+
+from .connection import get_backoff
+from .csv_files import write_records
+
+# name of the checkpoint file kept in each table's directory while it is backfilled
+CHECKPOINT_NAME = '.backfill.json'
+
+# bounds of the time range requested from the logger at once, and the range to start with
+MIN_CHUNK = timedelta(minutes=30)
+MAX_CHUNK = timedelta(days=7)
+START_CHUNK = timedelta(hours=6)
+
+# requests taking less than half of this (in seconds) double the chunk size, those taking longer halve it
+TARGET_REQUEST_TIME = 20
+
+
+def get_checkpoint_path(dir_path, table):
+    """
+    Get the path of the backfill checkpoint file of a table.
+
+    :param dir_path: (str) The path to the top level directory of the csv files e.g. logger_csv_path from the config.
+    :param table: (str) The name of the table on the logger.
+    :returns: (str) The path of the checkpoint file e.g. <dir_path>/SoilMoisture/.backfill.json
+    """
+    return os.path.join(dir_path, table, CHECKPOINT_NAME)
+
+
+def read_checkpoint(checkpoint_path, start, end):
+    """
+    Read a backfill checkpoint, if it is for the same time range.
+
+    :param checkpoint_path: (str) The path of the checkpoint file.
+    :param start: (datetime.datetime) The start of the backfill.
+    :param end: (datetime.datetime) The end of the backfill.
+    :returns: (tuple) The time to continue from and the chunk size to use, or (None, None) if there is no checkpoint for this range.
+    """
+    if not os.path.isfile(checkpoint_path):
+        return None, None
+
+    with open(checkpoint_path) as f:
+        checkpoint = json.load(f)
+
+    if checkpoint['start'] != start.isoformat() or checkpoint['end'] != end.isoformat():
+        return None, None
+
+    return datetime.fromisoformat(checkpoint['next']), timedelta(seconds=checkpoint['chunk'])
+
+
+def write_checkpoint(checkpoint_path, start, end, next_start, chunk):
+    """
+    Save the progress of a backfill, replacing the checkpoint file in one step so it is never left half written.
+
+    :param checkpoint_path: (str) The path of the checkpoint file.
+    :param start: (datetime.datetime) The start of the backfill.
+    :param end: (datetime.datetime) The end of the backfill.
+    :param next_start: (datetime.datetime) The time from which to continue.
+    :param chunk: (datetime.timedelta) The current chunk size.
+    :returns: None
+    """
+    checkpoint = {
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'next': next_start.isoformat(),
+        'chunk': chunk.total_seconds(),
+    }
+
+    os.makedirs(os.path.dirname(checkpoint_path), exist_ok=True)
+    tmp_path = checkpoint_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, checkpoint_path)
+
+
+def backfill_table(device, table, start, end, dir_path, dt_header, retries=5, delay=1, max_delay=300):
+    """
+    Download the records of a table between two times to the daily csv files, in chunks of time that adapt to how quickly the logger
+    responds: a chunk that is downloaded quickly doubles the next chunk, and a slow or failed request halves it.
+    Progress is saved to a checkpoint file after each chunk, so a backfill of the same range that is interrupted resumes where it stopped.
+    The checkpoint is removed once the backfill is complete.
+
+    :param device: (pycampbellcr1000.CR1000) The open connection to the logger.
+    :param table: (str) The name of the table on the logger from which the data is being extracted.
+    :param start: (datetime.datetime) The time from which to collect data.
+    :param end: (datetime.datetime) The time after which to stop collecting data, inclusive.
+    :param dir_path: (str) The path to the top level directory in which to create the csv files and folders.
+    :param dt_header: (str) The name of the date/time column.
+    :param retries: (int) The number of times to retry a failed request in a row before giving up. Default is 5.
+    :param delay: (float) The time in seconds to wait after the first failed request, doubling with each further failure. Default is 1.
+    :param max_delay: (float) The longest time in seconds to wait before retrying. Default is 300.
+    :returns: (int) The number of records written.
+    """
+    checkpoint_path = get_checkpoint_path(dir_path, table)
+    next_start, chunk = read_checkpoint(checkpoint_path, start, end)
+
+    if next_start is None:
+        next_start, chunk = start, START_CHUNK
+    else:
+        print(f"Resuming {table} from {next_start.isoformat()}")
+
+    written = 0
+    failures = 0
+
+    while next_start <= end:
+        # chunks end just before the next one starts, so no record is fetched twice
+        chunk_end = min(next_start + chunk - timedelta(microseconds=1), end)
+
+        requested = time.monotonic()
+        try:
+            data = device.get_data(table, next_start, chunk_end)
+        except Exception as exc:
+            failures += 1
+            if failures > retries:
+                raise
+
+            chunk = max(chunk / 2, MIN_CHUNK)
+            wait = get_backoff(failures, delay, max_delay)
+            print(f"Request for {table} failed ({exc}), retrying in {wait}s")
+            time.sleep(wait)
+            continue
+
+        elapsed = time.monotonic() - requested
+        failures = 0
+
+        records, _ = write_records(data, dir_path, table, dt_header)
+        written += records
+        next_start = chunk_end + timedelta(microseconds=1)
+
+        if elapsed < TARGET_REQUEST_TIME / 2:
+            chunk = min(chunk * 2, MAX_CHUNK)
+        elif elapsed > TARGET_REQUEST_TIME:
+            chunk = max(chunk / 2, MIN_CHUNK)
+
+        write_checkpoint(checkpoint_path, start, end, next_start, chunk)
+        print(f"{records} records downloaded for {table} up to {chunk_end.strftime('%Y-%m-%d %H:%M:%S')}")
+
+    if os.path.isfile(checkpoint_path):
+        os.remove(checkpoint_path)
+
+    return written
@@ -0,0 +1,55 @@
+import time
+
+
+def connect(url):
+    """
+    Open a connection to the logger.
+
+    :param url: (str) URL for connection with logger in format 'tcp:iphost:port' or 'serial:/dev/ttyUSB0:19200:8N1'.
+                URLs starting 'sim:' connect to a simulated logger, see energy_balance.logger.simulated.
+    :returns: (pycampbellcr1000.CR1000 or SimulatedLogger) The open connection.
+    """
+    if url.startswith('sim:'):
+        from .simulated import SimulatedLogger
+        return SimulatedLogger.from_url(url)
+
+    # imported here so that other commands (and --help) don't have to load it
+    from pycampbellcr1000 import CR1000
+    return CR1000.from_url(url)
+
+
+def get_backoff(attempt, delay=1, max_delay=300):
+    """
+    Get the time to wait before retrying, doubling with each attempt.
+
+    :param attempt: (int) The number of attempts that have failed so far, from 1.
+    :param delay: (float) The time in seconds to wait after the first failed attempt. Default is 1.
+    :param max_delay: (float) The longest time in seconds to wait. Default is 300.
+    :returns: (float) The time to wait in seconds.
+    """
+    return min(delay * 2 ** (attempt - 1), max_delay)
+
+
+def retry(func, *args, retries=5, delay=1, max_delay=300, **kwargs):
+    """
+    Call a function, retrying with backoff (see get_backoff) if it raises an exception.
+
+    :param func: (callable) The function to call.
+    :param args: Positional arguments for func.
+    :param retries: (int) The number of times to retry before the exception is raised. Default is 5.
+    :param delay: (float) The time in seconds to wait after the first failed attempt. Default is 1.
+    :param max_delay: (float) The longest time in seconds to wait. Default is 300.
+    :param kwargs: Keyword arguments for func.
+    :returns: The return value of func.
+    """
+    attempt = 0
+    while True:
+        try:
+            return func(*args, **kwargs)
+        except Exception as exc:
+            attempt += 1
+            if attempt > retries:
+                raise
+            wait = get_backoff(attempt, delay, max_delay)
+            print(f"Attempt {attempt} failed ({exc}), retrying in {wait}s")
+            time.sleep(wait)
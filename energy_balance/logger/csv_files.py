@@ -0,0 +1,123 @@
+import os
+import csv
+from datetime import datetime, timedelta
+
+# size of the blocks read from the end of a csv file when looking for its last line
+BLOCK_SIZE = 4096
+
+# values in the csv files that are missing, inserted into databases as NULL
+NULL_VALUES = {'', 'NAN', 'NaN', 'nan'}
+
+
+def get_csv_path(dir_path, table, date):
+    """
+    Get the path of the daily csv file for a logger table.
+
+    :param dir_path: (str) The path to the top level directory of the csv files e.g. logger_csv_path from the config.
+    :param table: (str) The name of the table on the logger.
+    :param date: (datetime.date) The date of the file.
+    :returns: (str) The path of the csv file e.g. <dir_path>/SoilMoisture/SoilMoisture_2021-07-21.csv
+    """
+    return os.path.join(dir_path, table, f"{table}_{date.strftime('%Y-%m-%d')}.csv")
+
+
+def read_last_line(csv_path):
+    """
+    Read the first and last lines of a csv file, reading the end of the file backwards in blocks, so the whole file is never read.
+
+    :param csv_path: (str) The path to the csv file.
+    :returns: (tuple) The first line (the header) and the last non-empty line, as strings. Both are None if the file is empty or doesn't exist.
+    """
+    if not os.path.isfile(csv_path) or os.path.getsize(csv_path) == 0:
+        return None, None
+
+    with open(csv_path, 'rb') as f:
+        first = f.readline()
+
+        end = f.seek(0, os.SEEK_END)
+        position = end
+        tail = b''
+        # stop when a complete line (other than trailing newlines) has been read, or at the start of the file
+        while position > 0 and tail.rstrip(b'\r\n').count(b'\n') == 0:
+            position = max(0, position - BLOCK_SIZE)
+            f.seek(position)
+            tail = f.read(end - position)
+
+    last = tail.rstrip(b'\r\n').rsplit(b'\n', 1)[-1]
+    return first.decode().rstrip('\r\n'), last.decode().rstrip('\r')
+
+
+def get_last_time(csv_path, dt_header):
+    """
+    Get the time of the last record in a csv file, from its last line.
+
+    :param csv_path: (str) The path to the csv file.
+    :param dt_header: (str) The name of the date/time column.
+    :returns: (datetime.datetime) The time of the last record, or None if the file doesn't exist or has no records.
+    """
+    header, last = read_last_line(csv_path)
+    if header is None or last == header:
+        return None
+
+    header, last = csv.reader([header, last])
+    return datetime.fromisoformat(last[header.index(dt_header)])
+
+
+def get_latest_time(dir_path, table, dt_header, date):
+    """
+    Get the time of the last record of a table saved to the daily csv files, looking in the file for the date then the day before,
+    so records logged just before midnight are still found once the day has rolled over.
+
+    :param dir_path: (str) The path to the top level directory of the csv files e.g. logger_csv_path from the config.
+    :param table: (str) The name of the table on the logger.
+    :param dt_header: (str) The name of the date/time column.
+    :param date: (datetime.date) The date of the latest file to look in.
+    :returns: (datetime.datetime) The time of the last record, or None if neither file has any records.
+    """
+    for day in (date, date - timedelta(days=1)):
+        latest = get_last_time(get_csv_path(dir_path, table, day), dt_header)
+        if latest is not None:
+            return latest
+
+    return None
+
+
+def write_records(data, dir_path, table, dt_header):
+    """
+    Append records from the logger to the daily csv files of the table, splitting them by the date of each record.
+    Records that are not after the last record already in a file are skipped, so records are never duplicated.
+
+    :param data: (pycampbellcr1000.utils.ListDict) The records, in time order, as returned by get_data on the logger.
+    :param dir_path: (str) The path to the top level directory of the csv files e.g. logger_csv_path from the config.
+    :param table: (str) The name of the table on the logger.
+    :param dt_header: (str) The name of the date/time column.
+    :returns: (tuple) The number of records written and the time of the last record written (None if none were written).
+    """
+    written = 0
+    last_written = None
+
+    # records are in time order, so each day's records are together
+    start = 0
+    while start < len(data):
+        date = data[start][dt_header].date()
+        end = start
+        while end < len(data) and data[end][dt_header].date() == date:
+            end += 1
+
+        csv_path = get_csv_path(dir_path, table, date)
+        latest = get_last_time(csv_path, dt_header)
+        records = [r for r in data[start:end] if latest is None or r[dt_header] > latest]
+
+        if records:
+            os.makedirs(os.path.dirname(csv_path), exist_ok=True)
+            # the header is only written to a new (or empty) file
+            header = not os.path.isfile(csv_path) or os.path.getsize(csv_path) == 0
+            with open(csv_path, 'a') as f:
+                f.write(type(data)(records).to_csv(header=header))
+
+            written += len(records)
+            last_written = records[-1][dt_header]
+
+        start = end
+
+    return written, last_written
@@ -0,0 +1,235 @@
+import math
+import operator
+
+from energy_balance import get_config
+
+# the periods rollup tables can be kept for, with the start of the period containing a time
+PERIODS = {
+    'hourly': lambda t: t.replace(minute=0, second=0, microsecond=0),
+    'daily': lambda t: t.replace(hour=0, minute=0, second=0, microsecond=0),
+}
+
+# columns of the logger tables that aren't rolled up, as well as the date/time column
+EXCLUDED_COLUMNS = {'RecNbr'}
+
+# the function for each operator in the QC rules, nan is handled separately as it takes no value
+OPERATORS = {
+    '<': operator.lt,
+    '>': operator.gt,
+    '<=': operator.le,
+    '>=': operator.ge,
+}
+
+# columns of the rollup tables, after period_start and variable, in the order they are inserted
+STATISTICS = ['mean', 'minimum', 'maximum', 'count', 'qc_pass', 'total']
+
+
+def get_rollup_name(name, period):
+    """
+    Get the name of a rollup table.
+
+    :param name: (str) The name of the table in the database e.g. soil_temp
+    :param period: (str) The period e.g. hourly
+    :returns: (str) The name of the rollup table e.g. soil_temp_hourly
+    """
+    return f"{name}_{period}"
+
+
+def create_rollup_tables(cur, name, periods):
+    """
+    Create the rollup tables of a table, if they don't exist.
+    Each has a row for each period and column of the table, with the statistics of the column's values in that period.
+
+    :param cur: The database cursor.
+    :param name: (str) The name of the table in the database.
+    :param periods: (sequence) The periods to create tables for e.g. ('hourly', 'daily')
+    :returns: None
+    """
+    for period in periods:
+        cur.execute(f"CREATE TABLE IF NOT EXISTS {get_rollup_name(name, period)} ("
+                    f"period_start DATETIME NOT NULL, variable VARCHAR(64) NOT NULL, "
+                    f"mean DOUBLE, minimum DOUBLE, maximum DOUBLE, "
+                    f"count INT NOT NULL, qc_pass INT NOT NULL, total DOUBLE NOT NULL, "
+                    f"PRIMARY KEY (period_start, variable))")
+
+
+def get_rollup_query(name):
+    """
+    Create the MySQL query that adds the statistics of some new values to a row of a rollup table, creating the row if it doesn't exist.
+    The mean is updated first, as MySQL uses the new values of columns updated earlier in the same query.
+
+    :param name: (str) The name of the rollup table.
+    :returns: (str) The query, with a %s placeholder for period_start, variable and each of STATISTICS.
+    """
+    columns = ['period_start', 'variable'] + STATISTICS
+    updates = [
+        "mean = CASE WHEN count + VALUES(count) > 0 THEN (total + VALUES(total)) / (count + VALUES(count)) END",
+        "minimum = CASE WHEN minimum IS NULL OR VALUES(minimum) < minimum THEN VALUES(minimum) ELSE minimum END",
+        "maximum = CASE WHEN maximum IS NULL OR VALUES(maximum) > maximum THEN VALUES(maximum) ELSE maximum END",
+        "count = count + VALUES(count)",
+        "qc_pass = qc_pass + VALUES(qc_pass)",
+        "total = total + VALUES(total)",
+    ]
+    return (f"INSERT INTO {name} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))}) "
+            f"ON DUPLICATE KEY UPDATE {', '.join(updates)}")
+
+
+def get_qc_checks(config, columns):
+    """
+    Get the QC conditions of the columns of a table from the QC rules in the config (the [soil_qc] and [radiation_qc] sections).
+    Conditions on columns that aren't in the table (e.g. soil heat flux conditions on the soil temperature) can't be checked
+    from its rows, so they are left out.
+
+    :param config: (energy_balance.Config) The config.
+    :param columns: (sequence) The columns of the table.
+    :returns: (dict) A list of (column, operator, value, flag) conditions for each column that has QC rules.
+    """
+    # imported here so that other commands (and --help) don't have to load numpy and pandas
+    from energy_balance.netcdf.qc_rules import get_columns, parse_rule
+
+    checks = {}
+    for section in config:
+        if not section.endswith('_qc') or section[:-3] not in config:
+            continue
+
+        settings = config[section[:-3]]
+        for name, text in config[section].items():
+            rule = parse_rule(text)
+
+            for i, target in enumerate(get_columns(settings, name)):
+                if target not in columns:
+                    continue
+
+                conditions = []
+                for column, op, value, flag in rule:
+                    if column:
+                        # conditions on other columns use the column at the same index, as in the quality control
+                        sources = get_columns(settings, column)
+                        column = sources[0] if len(sources) == 1 else sources[i]
+                        if column not in columns:
+                            continue
+                    else:
+                        column = target
+
+                    value = None if op == 'nan' else float(settings.get(value, value))
+                    conditions.append((column, op, value, flag))
+
+                checks[target] = conditions
+
+    return checks
+
+
+def get_flag(conditions, row):
+    """
+    Get the QC flag of a value: the flag of the first condition met, or 1 (good data) if none are met.
+
+    :param conditions: (list) The (column, operator, value, flag) conditions of the value's column, see get_qc_checks.
+    :param row: (dict) The values of the row, as floats, nan if missing.
+    :returns: (int) The flag.
+    """
+    for column, op, value, flag in conditions:
+        x = row.get(column, math.nan)
+        if math.isnan(x):
+            met = op == 'nan'
+        else:
+            met = op != 'nan' and OPERATORS[op](x, value)
+
+        if met:
+            return flag
+
+    return 1
+
+
+class Rollups:
+
+    """
+    Statistics of each column of a table for each hour and/or day, accumulated from rows as they are loaded into the database
+    and then added to the table's rollup tables (e.g. soil_temp_hourly and soil_temp_daily) with write.
+    Only the new rows are read: their statistics are combined with those already in the rollup tables, so the rollup tables are
+    kept up to date without reading the table again.
+
+    For each column and period, the rollup tables have the mean, minimum, maximum, the number of values (count), the number of values
+    that pass the QC rules in the config, with a flag no higher than qc_flag_level (qc_pass), and the sum of the values (total).
+    Missing values aren't counted and don't pass.
+
+    :param name: (str) The name of the table in the database.
+    :param dt_header: (str) The name of the date/time column.
+    :param periods: (sequence) Optional. The periods to keep statistics for, any of PERIODS. Default is hourly and daily.
+    :param config: (energy_balance.Config) Optional. The config to use for the QC rules, the config from the config files if not provided.
+    """
+
+    def __init__(self, name, dt_header, periods=tuple(PERIODS), config=None):
+        for period in periods:
+            if period not in PERIODS:
+                raise ValueError(f"Unknown rollup period '{period}', must be one of {', '.join(PERIODS)}")
+
+        self.config = config if config is not None else get_config()
+        self.name = name
+        self.dt_header = dt_header
+        self.periods = tuple(periods)
+        self.qc_flag_level = self.config['common']['qc_flag_level']
+
+        # the QC conditions for each set of columns, as the columns of the csv files can change
+        self._checks = {}
+        # [count, qc_pass, total, minimum, maximum] for each (period start, column) of each period
+        self._stats = {period: {} for period in self.periods}
+
+    def add(self, time, columns, values):
+        """
+        Add the values of a row. Values that aren't numbers (e.g. strings) are not rolled up.
+
+        :param time: (datetime.datetime) The time of the row.
+        :param columns: (sequence) The column names.
+        :param values: (sequence) The values, None or nan if missing.
+        :returns: None
+        """
+        columns = tuple(columns)
+        checks = self._checks.get(columns)
+        if checks is None:
+            checks = self._checks[columns] = get_qc_checks(self.config, columns)
+
+        row = {}
+        for column, value in zip(columns, values):
+            if column == self.dt_header or column in EXCLUDED_COLUMNS:
+                continue
+            try:
+                row[column] = math.nan if value is None else float(value)
+            except (TypeError, ValueError):
+                continue
+
+        starts = [(self._stats[period], PERIODS[period](time)) for period in self.periods]
+
+        for column, value in row.items():
+            missing = math.isnan(value)
+            passed = not missing and get_flag(checks.get(column, ()), row) <= self.qc_flag_level
+
+            for stats, start in starts:
+                entry = stats.get((start, column))
+                if entry is None:
+                    entry = stats[(start, column)] = [0, 0, 0., None, None]
+
+                if not missing:
+                    entry[0] += 1
+                    entry[2] += value
+                    entry[3] = value if entry[3] is None else min(entry[3], value)
+                    entry[4] = value if entry[4] is None else max(entry[4], value)
+                if passed:
+                    entry[1] += 1
+
+    def write(self, cur):
+        """
+        Add the statistics of the rows added since the last write to the rollup tables. They are not committed.
+
+        :param cur: The database cursor.
+        :returns: (int) The number of rows of the rollup tables updated.
+        """
+        updated = 0
+        for period, stats in self._stats.items():
+            rows = [(start, column, total / count if count else None, minimum, maximum, count, passed, total)
+                    for (start, column), (count, passed, total, minimum, maximum) in stats.items()]
+            if rows:
+                cur.executemany(get_rollup_query(get_rollup_name(self.name, period)), rows)
+                updated += len(rows)
+
+        self._stats = {period: {} for period in self.periods}
+        return updated
@@ -0,0 +1,229 @@
+import csv
+import glob
+import os
+import re
+from datetime import date, datetime
+
+from .csv_files import NULL_VALUES
+
+# the column type for each field type of a logger table definition, other field types are stored as DOUBLE
+FIELD_TYPES = {
+    'ASCII': 'VARCHAR(255)',
+    'Bool': 'BOOLEAN',
+    'Bool2': 'BOOLEAN',
+    'Bool4': 'BOOLEAN',
+    'Byte': 'BIGINT',
+    'Int1': 'BIGINT',
+    'Int2': 'BIGINT',
+    'Int4': 'BIGINT',
+    'Int8': 'BIGINT',
+    'UInt1': 'BIGINT',
+    'UInt2': 'BIGINT',
+    'UInt4': 'BIGINT',
+    'Long': 'BIGINT',
+    'ULong': 'BIGINT',
+    'NSec': 'DATETIME',
+    'SecNano': 'DATETIME',
+}
+
+# the record number added to each record by pycampbellcr1000, after the date/time
+RECORD_NUMBER = 'RecNbr'
+
+# number of rows of a csv file read to find the types of its columns
+SAMPLE_ROWS = 100
+
+# name of the partition holding any records after the monthly partitions
+MAX_PARTITION = 'pmax'
+
+# monthly partitions are named p<year><month> e.g. p202108 holds the records in August 2021
+MONTHLY_PARTITION = re.compile(r'^p(\d{4})(\d{2})$')
+
+DIALECTS = ['mysql', 'sqlite']
+
+
+def _get_value_type(value):
+    for parse, column_type in ((int, 'BIGINT'), (float, 'DOUBLE'), (datetime.fromisoformat, 'DATETIME')):
+        try:
+            parse(value)
+            return column_type
+        except ValueError:
+            pass
+    return 'VARCHAR(255)'
+
+
+def get_csv_columns(dir_path, table, dt_header):
+    """
+    Get the columns of a logger table from the header of its latest daily csv file, with types found from the values in the file.
+    A column is BIGINT if all its values are integers, DOUBLE if they are all numbers, DATETIME if they are all times and otherwise
+    VARCHAR(255). Columns with no values are DOUBLE.
+
+    :param dir_path: (str) The path to the top level directory of the csv files e.g. logger_csv_path from the config.
+    :param table: (str) The name of the logger table.
+    :param dt_header: (str) The name of the date/time column.
+    :returns: (list) The (name, type) of each column, in the order of the csv file.
+    """
+    csv_paths = sorted(glob.glob(os.path.join(dir_path, table, f"{table}_*.csv")))
+    if not csv_paths:
+        raise FileNotFoundError(f"No csv files found for {table} in {dir_path}")
+
+    with open(csv_paths[-1], newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        types = [set() for _ in header]
+
+        for i, row in enumerate(reader):
+            if i == SAMPLE_ROWS:
+                break
+            for value, value_types in zip(row, types):
+                if value not in NULL_VALUES:
+                    value_types.add(_get_value_type(value))
+
+    columns = []
+    for name, value_types in zip(header, types):
+        if name == dt_header:
+            column_type = 'DATETIME'
+        elif not value_types or value_types <= {'BIGINT', 'DOUBLE'}:
+            column_type = 'BIGINT' if value_types == {'BIGINT'} else 'DOUBLE'
+        elif len(value_types) == 1:
+            column_type = value_types.pop()
+        else:
+            column_type = 'VARCHAR(255)'
+        columns.append((name, column_type))
+
+    return columns
+
+
+def get_logger_columns(device, table, dt_header):
+    """
+    Get the columns of a logger table from its table definition on the logger, with the date/time and record number columns
+    that pycampbellcr1000 adds to each record, as in the csv files.
+
+    :param device: (pycampbellcr1000.CR1000) The open connection to the logger.
+    :param table: (str) The name of the table on the logger.
+    :param dt_header: (str) The name of the date/time column.
+    :returns: (list) The (name, type) of each column, see FIELD_TYPES.
+    """
+    def decode(value):
+        return value.decode() if isinstance(value, bytes) else value
+
+    for definition in device.table_def:
+        if decode(definition['Header']['TableName']) == table:
+            fields = [(decode(f['FieldName']), FIELD_TYPES.get(decode(f['FieldType']), 'DOUBLE')) for f in definition['Fields']]
+            return [(dt_header, 'DATETIME'), (RECORD_NUMBER, 'BIGINT')] + fields
+
+    raise ValueError(f"Table {table} not found on the logger")
+
+
+def get_first_csv_date(dir_path, tables):
+    """
+    Get the date of the oldest daily csv file of any of the logger tables, from the file names, without opening them.
+
+    :param dir_path: (str) The path to the top level directory of the csv files e.g. logger_csv_path from the config.
+    :param tables: (list) The names of the logger tables.
+    :returns: (datetime.date) The date of the oldest file, or None if there are none.
+    """
+    dates = []
+    for table in tables:
+        for csv_path in glob.glob(os.path.join(dir_path, table, f"{table}_*.csv")):
+            name = os.path.splitext(os.path.basename(csv_path))[0]
+            try:
+                dates.append(datetime.strptime(name[len(table) + 1:], '%Y-%m-%d').date())
+            except ValueError:
+                continue
+    return min(dates) if dates else None
+
+
+def _next_month(month):
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def get_month_starts(start, end):
+    """
+    Get the first day of each month from the month of start to the month of end.
+
+    :param start: (datetime.date) A date in the first month.
+    :param end: (datetime.date) A date in the last month.
+    :returns: (list) The first day of each month, as datetime.date.
+    """
+    months = []
+    month = date(start.year, start.month, 1)
+    while month <= end:
+        months.append(month)
+        month = _next_month(month)
+    return months
+
+
+def get_partition_definitions(months):
+    """
+    Get the definitions of monthly partitions, each holding the records of its month.
+    The first partition also holds any records before it.
+
+    :param months: (list) The first day of each month, as datetime.date.
+    :returns: (list) The definition of each partition e.g. "PARTITION p202108 VALUES LESS THAN ('2021-09-01')"
+    """
+    definitions = []
+    for month in months:
+        definitions.append(f"PARTITION p{month.strftime('%Y%m')} VALUES LESS THAN ('{_next_month(month).isoformat()}')")
+    return definitions
+
+
+def get_create_table_query(name, columns, dt_header, dialect='mysql', months=()):
+    """
+    Create the query to create a table for a logger table, if it doesn't exist, with the date/time column as the primary key.
+    For MySQL, the table is partitioned by the date/time, with a partition for each month and one for any later records.
+
+    :param name: (str) The name of the table in the database.
+    :param columns: (list) The (name, type) of each column, see get_csv_columns and get_logger_columns.
+    :param dt_header: (str) The name of the date/time column.
+    :param dialect: (str) 'mysql', or 'sqlite' for a local database, which isn't partitioned. Default is 'mysql'.
+    :param months: (list) The first day of each month to create a partition for. Only used for MySQL.
+    :returns: (str) The query.
+    """
+    if dialect not in DIALECTS:
+        raise ValueError(f"Unknown dialect '{dialect}', must be one of {', '.join(DIALECTS)}")
+
+    definitions = [f"`{c}` {t} NOT NULL" if c == dt_header else f"`{c}` {t}" for c, t in columns]
+    definitions.append(f"PRIMARY KEY (`{dt_header}`)")
+    query = f"CREATE TABLE IF NOT EXISTS {name} (\n    " + ",\n    ".join(definitions) + "\n)"
+
+    if dialect == 'mysql' and months:
+        partitions = get_partition_definitions(months) + [f"PARTITION {MAX_PARTITION} VALUES LESS THAN (MAXVALUE)"]
+        query += f"\nPARTITION BY RANGE COLUMNS(`{dt_header}`) (\n    " + ",\n    ".join(partitions) + "\n)"
+
+    return query
+
+
+def get_partitions(cur, name):
+    """
+    Get the names of the partitions of a MySQL table.
+
+    :param cur: The database cursor.
+    :param name: (str) The name of the table.
+    :returns: (list) The names of the partitions, empty if the table isn't partitioned.
+    """
+    cur.execute("SELECT PARTITION_NAME FROM information_schema.PARTITIONS "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s ORDER BY PARTITION_ORDINAL_POSITION", (name,))
+    return [row[0] for row in cur.fetchall() if row[0] is not None]
+
+
+def get_add_partitions_query(name, partitions, until):
+    """
+    Create the query to add monthly partitions to a MySQL table, up to and including a month, by splitting them from its last partition.
+    The last partition is usually empty, as the partitions are added ahead of time, so this is quick.
+
+    :param name: (str) The name of the table.
+    :param partitions: (list) The names of the table's partitions, see get_partitions.
+    :param until: (datetime.date) A date in the last month to add a partition for.
+    :returns: (tuple) The query and the first day of each month added, or (None, []) if there are no partitions to add.
+    """
+    monthly = [MONTHLY_PARTITION.match(p) for p in partitions]
+    monthly = [date(int(m[1]), int(m[2]), 1) for m in monthly if m]
+    if not monthly or partitions[-1] != MAX_PARTITION:
+        raise ValueError(f"{name} is not partitioned by month, its partitions are: {', '.join(partitions) or 'none'}")
+
+    months = get_month_starts(max(monthly), until)[1:]
+    if not months:
+        return None, []
+
+    definitions = get_partition_definitions(months) + [f"PARTITION {MAX_PARTITION} VALUES LESS THAN (MAXVALUE)"]
+    return f"ALTER TABLE {name} REORGANIZE PARTITION {MAX_PARTITION} INTO (\n    " + ",\n    ".join(definitions) + "\n)", months
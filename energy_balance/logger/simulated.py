@@ -0,0 +1,276 @@
+import csv
+import io
+import math
+import random
+import re
+import sqlite3
+from datetime import datetime, timedelta
+
+from energy_balance import get_config
+
+# MySQL's upsert, which is run with sqlite's equivalent
+ON_DUPLICATE_KEY = re.compile(r"\s+ON DUPLICATE KEY UPDATE\s+", re.IGNORECASE)
+UPDATE_VALUES = re.compile(r"VALUES\((`?\w+`?)\)", re.IGNORECASE)
+
+# columns of the tables that aren't set in the config
+OTHER_COLUMNS = {
+    'Housekeeping': ['BattV_Min', 'PTemp_C_Avg'],
+    'GPS_datetime': ['Latitude', 'Longitude'],
+}
+
+
+class Records(list):
+
+    """
+    A list of records, each a dictionary, in the form returned by pycampbellcr1000 (a ListDict).
+    """
+
+    def to_csv(self, delimiter=',', header=True):
+        """
+        Serialize the records to csv.
+
+        :param delimiter: (str) The delimiter to use. Default is ','.
+        :param header: (bool) If True, the first line is the header. Default is True.
+        :returns: (str) The records in csv format.
+        """
+        if not self:
+            return ''
+
+        output = io.StringIO()
+        writer = csv.DictWriter(output, fieldnames=list(self[0].keys()), delimiter=delimiter, lineterminator='\n')
+        if header:
+            writer.writeheader()
+        writer.writerows(self)
+        return output.getvalue()
+
+
+def get_table_columns(config=None):
+    """
+    Get the data columns of each table on the simulated logger, using the soil and radiation headers in the config.
+
+    :param config: (energy_balance.Config) Optional. The config to use, the config from the config files if not provided.
+    :returns: (dict) The list of columns for each table name.
+    """
+    config = config if config is not None else get_config()
+    soil = config['soil']
+    radiation = config['radiation']
+
+    columns = {
+        'SoilMoisture': list(soil['soil_moisture_headers']),
+        'SoilTemperature': list(soil['soil_temperature_headers']),
+        'SoilHeatFlux': list(soil['soil_heat_flux_headers']),
+        'Radiation': [radiation[h] for h in ('lwdn_header', 'lwup_header', 'swdn_header', 'swup_header', 'body_temp_header')
+                      if radiation[h] != 'null'],
+    }
+    columns.update(OTHER_COLUMNS)
+    return columns
+
+
+class SimulatedLogger:
+
+    """
+    A stand-in for pycampbellcr1000.CR1000, that creates records on request, so the download scripts can be tested without a logger.
+    Each table has a record at every multiple of the interval, up to the current time (utc), with values that only depend on the time,
+    so the same record always has the same values. Requests can be made to fail at random, to test reconnecting and retrying.
+
+    :param interval: (int) The time between records in seconds. Default is 300.
+    :param failure_rate: (float) The probability of each request failing with a ConnectionError. Default is 0.
+    :param config: (energy_balance.Config) Optional. The config to take the table columns from, the config from the config files if not provided.
+    """
+
+    def __init__(self, interval=300, failure_rate=0., config=None):
+        self.interval = interval
+        self.failure_rate = failure_rate
+        self.columns = get_table_columns(config)
+        self.clock_offset = timedelta(0)
+        self.connected = True
+        self.requests = 0
+        self._random = random.Random()
+
+    @classmethod
+    def from_url(cls, url):
+        """
+        Open a simulated logger from a URL in format 'sim:[interval[:failure_rate]]' e.g. 'sim:', 'sim:60' or 'sim:300:0.1'
+
+        :param url: (str) The URL.
+        :returns: (SimulatedLogger) The simulated logger.
+        """
+        options = [o for o in url.split(':')[1:] if o]
+        types = (int, float)
+        return cls(*(t(o) for t, o in zip(types, options)))
+
+    def list_tables(self):
+        """ Returns the names of the tables on the logger. """
+        return list(self.columns)
+
+    @property
+    def table_def(self):
+        """ The definitions of the tables on the logger, in the form parsed by pycampbellcr1000, with IEEE4 fields. """
+        return [{'Header': {'TableName': table.encode()},
+                 'Fields': [{'FieldName': column.encode(), 'FieldType': 'IEEE4'} for column in columns]}
+                for table, columns in self.columns.items()]
+
+    def gettime(self):
+        """ Returns the current time on the logger. """
+        return datetime.utcnow() + self.clock_offset
+
+    def set_time(self, dtime):
+        """
+        Set the time on the logger.
+
+        :param dtime: (datetime.datetime) The time to set.
+        """
+        self.clock_offset = dtime - datetime.utcnow()
+
+    def record(self, table, dtime, number):
+        """
+        Create the record of a table at a time.
+
+        :param table: (str) The name of the table.
+        :param dtime: (datetime.datetime) The time of the record.
+        :param number: (int) The record number.
+        :returns: (dict) The record.
+        """
+        hours = (dtime - datetime(1970, 1, 1)).total_seconds() / 3600.
+        record = {'Datetime': dtime, 'RecNbr': number}
+        for i, column in enumerate(self.columns[table]):
+            # a daily cycle, offset for each column
+            record[column] = round(20 + 10 * math.sin(2 * math.pi * (hours + 3 * i) / 24.), 4)
+        return record
+
+    def get_data(self, tablename, start_date=None, stop_date=None):
+        """
+        Get the records of a table between two times.
+
+        :param tablename: (str) The name of the table.
+        :param start_date: (datetime.datetime) Optional. The time of the first record, inclusive. Default is the start of today.
+        :param stop_date: (datetime.datetime) Optional. The time of the last record, inclusive. Default is the current time on the logger.
+        :returns: (Records) The records in time order.
+        """
+        if not self.connected:
+            raise ConnectionError("Simulated logger is not connected")
+
+        self.requests += 1
+        if self._random.random() < self.failure_rate:
+            raise ConnectionError("Simulated logger connection failure")
+
+        if tablename not in self.columns:
+            raise ValueError(f"Table {tablename} not found on the simulated logger")
+
+        now = self.gettime()
+        start_date = start_date or datetime.combine(now.date(), datetime.min.time())
+        stop_date = min(stop_date or now, now)
+
+        interval = timedelta(seconds=self.interval)
+        epoch = datetime(1970, 1, 1)
+        # the first multiple of the interval at or after the start
+        first = math.ceil((start_date - epoch) / interval)
+        last = math.floor((stop_date - epoch) / interval)
+
+        records = Records(self.record(tablename, epoch + n * interval, n) for n in range(first, last + 1))
+        return records
+
+    def bye(self):
+        """ Close the connection to the logger. """
+        self.connected = False
+
+
+class SimulatedCursor:
+
+    """
+    A cursor of a SimulatedDatabase, taking queries in the form used with mysql.connector, see SimulatedCursor.translate.
+
+    :param cursor: (sqlite3.Cursor) The sqlite cursor to run the queries with.
+    """
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, operation, params=()):
+        """
+        Run a query, with %s placeholders as in mysql.connector.
+
+        :param operation: (str) The query.
+        :param params: (sequence) Optional. The values of the placeholders.
+        """
+        self._cursor.execute(self.translate(operation), self.adapt(params))
+
+    def executemany(self, operation, seq_params):
+        """
+        Run a query once for each set of values.
+
+        :param operation: (str) The query, with %s placeholders.
+        :param seq_params: (iterable) The values of the placeholders for each run.
+        """
+        self._cursor.executemany(self.translate(operation), (self.adapt(p) for p in seq_params))
+
+    @staticmethod
+    def translate(operation):
+        """
+        Translate a query from MySQL to sqlite: %s placeholders become ?, and ON DUPLICATE KEY UPDATE becomes ON CONFLICT DO UPDATE.
+
+        :param operation: (str) The query.
+        :returns: (str) The query for sqlite.
+        """
+        operation = operation.replace('%s', '?')
+        insert, *update = ON_DUPLICATE_KEY.split(operation, 1)
+        if update:
+            updates = UPDATE_VALUES.sub(r'excluded.\1', update[0])
+            operation = f"{insert} ON CONFLICT DO UPDATE SET {updates}"
+        return operation
+
+    @staticmethod
+    def adapt(params):
+        """ Convert datetimes to strings, as sqlite stores them. """
+        return [p.isoformat(' ') if isinstance(p, datetime) else p for p in params]
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    def close(self):
+        self._cursor.close()
+
+
+class SimulatedDatabase:
+
+    """
+    A stand-in for a mysql.connector connection, backed by sqlite, so the MySQL loading can be run and timed without a database server.
+
+    :param path: (str) Optional. The path of the sqlite database file. Default is ':memory:', a new database in memory.
+    """
+
+    def __init__(self, path=':memory:'):
+        self._connection = sqlite3.connect(path)
+
+    def create_table(self, name, columns):
+        """
+        Create a table, if it doesn't exist, with a column for each name provided.
+
+        :param name: (str) The name of the table.
+        :param columns: (list) The names of the columns.
+        """
+        self._connection.execute(f"CREATE TABLE IF NOT EXISTS {name} ({', '.join(columns)})")
+
+    def count(self, name):
+        """ Returns the number of rows in a table. """
+        return self._connection.execute(f"SELECT COUNT(*) FROM {name}").fetchone()[0]
+
+    def cursor(self):
+        """ Returns a new SimulatedCursor. """
+        return SimulatedCursor(self._connection.cursor())
+
+    def commit(self):
+        self._connection.commit()
+
+    def rollback(self):
+        self._connection.rollback()
+
+    def close(self):
+        self._connection.close()
@@ -0,0 +1,555 @@
+import math
+import os
+import queue
+import sqlite3
+import threading
+from datetime import datetime
+
+from energy_balance import get_config
+from .csv_files import get_latest_time, write_records
+from .rollups import Rollups, create_rollup_tables
+
+# the sinks that can be set in download_sinks in the config
+SINK_NAMES = ['csv', 'sqlite', 'mysql']
+
+# number of rows inserted into a database with each query
+BATCH_SIZE = 1000
+
+# table in the database recording the time of the last record loaded into each table
+STATE_TABLE = 'energy_balance_load_state'
+
+
+def get_insert_query(name, columns, mode='upsert'):
+    """
+    Create the MySQL query to insert a row into a table.
+
+    :param name: (str) The name of the table in the database.
+    :param columns: (list) The column names.
+    :param mode: (str) 'insert' to insert the values in the order of the table's columns,
+                 'upsert' to insert into the named columns, replacing any row with the same unique key. Default is 'upsert'.
+    :returns: (str) The query, with a %s placeholder for each value.
+    """
+    placeholders = ', '.join(['%s'] * len(columns))
+    if mode == 'insert':
+        return f"INSERT INTO {name} VALUES ({placeholders})"
+
+    names = ', '.join(f"`{c}`" for c in columns)
+    updates = ', '.join(f"`{c}` = VALUES(`{c}`)" for c in columns)
+    return f"INSERT INTO {name} ({names}) VALUES ({placeholders}) ON DUPLICATE KEY UPDATE {updates}"
+
+
+def create_state_table(cur):
+    """
+    Create the table recording the time of the last record loaded into each table, if it doesn't exist.
+
+    :param cur: The database cursor.
+    :returns: None
+    """
+    cur.execute(f"CREATE TABLE IF NOT EXISTS {STATE_TABLE} (table_name VARCHAR(64) PRIMARY KEY, last_loaded DATETIME(6) NOT NULL)")
+
+
+def get_high_water_mark(cur, name, dt_header):
+    """
+    Get the time of the last record loaded into a table.
+    If none has been recorded, the latest time in the table is used, so rows loaded before the high water mark was kept aren't loaded again.
+
+    :param cur: The database cursor.
+    :param name: (str) The name of the table in the database.
+    :param dt_header: (str) The name of the date/time column.
+    :returns: (datetime.datetime) The time of the last record loaded, or None if nothing has been loaded yet.
+    """
+    cur.execute(f"SELECT last_loaded FROM {STATE_TABLE} WHERE table_name = %s", (name,))
+    row = cur.fetchone()
+    if row is None:
+        cur.execute(f"SELECT MAX(`{dt_header}`) FROM {name}")
+        row = cur.fetchone()
+
+    last_loaded = row[0] if row else None
+    if last_loaded is None:
+        return None
+    return datetime.fromisoformat(last_loaded) if isinstance(last_loaded, str) else last_loaded
+
+
+def set_high_water_mark(cur, name, last_loaded):
+    """
+    Record the time of the last record loaded into a table. This is committed with the rows loaded, so the two always agree.
+
+    :param cur: The database cursor.
+    :param name: (str) The name of the table in the database.
+    :param last_loaded: (datetime.datetime) The time of the last record loaded.
+    :returns: None
+    """
+    cur.execute(f"INSERT INTO {STATE_TABLE} (table_name, last_loaded) VALUES (%s, %s) "
+                f"ON DUPLICATE KEY UPDATE last_loaded = VALUES(last_loaded)", (name, last_loaded))
+
+
+class Sink:
+
+    """
+    Base class for somewhere the records downloaded from the logger are written to.
+    Records are written in batches, each of records from one table in time order, as returned by get_data on the logger.
+    Only records after the last one already written to the sink are written, so the same records can be written again safely.
+
+    Specific implementations must set get_stored_time and write_new.
+
+    :param dt_header: (str) The name of the date/time column.
+    """
+
+    def __init__(self, dt_header):
+        self.dt_header = dt_header
+        self._last_times = {}
+
+    def get_stored_time(self, table):
+        """
+        Class specific implementation to find the time of the last record of a table already in the sink.
+
+        :param table: (str) The name of the logger table.
+        :returns: (datetime.datetime) The time of the last record, or None if there are none.
+        """
+        raise NotImplementedError
+
+    def write_new(self, table, records):
+        """
+        Class specific implementation to write records, all newer than those in the sink.
+
+        :param table: (str) The name of the logger table.
+        :param records: (list) The records, each a dictionary.
+        """
+        raise NotImplementedError
+
+    def get_last_time(self, table):
+        """
+        Get the time of the last record of a table written to the sink. The sink is only read the first time, after that it is remembered.
+
+        :param table: (str) The name of the logger table.
+        :returns: (datetime.datetime) The time of the last record, or None if there are none.
+        """
+        if table not in self._last_times:
+            self._last_times[table] = self.get_stored_time(table)
+        return self._last_times[table]
+
+    def forget(self, table):
+        """
+        Forget the time of the last record of a table, so it is read from the sink again, e.g. after a write fails.
+
+        :param table: (str) The name of the logger table.
+        """
+        self._last_times.pop(table, None)
+
+    def write(self, table, records):
+        """
+        Write the records of a table that are after the last one in the sink.
+
+        :param table: (str) The name of the logger table.
+        :param records: (pycampbellcr1000.utils.ListDict) The records in time order.
+        :returns: (int) The number of records written.
+        """
+        last = self.get_last_time(table)
+        new = type(records)(r for r in records if last is None or r[self.dt_header] > last)
+
+        if new:
+            self.write_new(table, new)
+            self._last_times[table] = new[-1][self.dt_header]
+
+        return len(new)
+
+    def close(self):
+        """ Close the sink. """
+        pass
+
+
+class CSVSink(Sink):
+
+    """
+    Writes records to the daily csv files of each table e.g. <dir_path>/SoilMoisture/SoilMoisture_2021-07-21.csv
+
+    :param dir_path: (str) The path to the top level directory of the csv files e.g. logger_csv_path from the config.
+    :param dt_header: (str) The name of the date/time column.
+    """
+
+    def __init__(self, dir_path, dt_header):
+        super().__init__(dt_header)
+        self.dir_path = dir_path
+
+    def __repr__(self):
+        return f"CSVSink({self.dir_path!r})"
+
+    def get_stored_time(self, table):
+        return get_latest_time(self.dir_path, table, self.dt_header, datetime.utcnow().date())
+
+    def write_new(self, table, records):
+        write_records(records, self.dir_path, table, self.dt_header)
+
+
+class DatabaseSink(Sink):
+
+    """
+    Base class for sinks writing records to a table in a database for each logger table, with bulk inserts.
+    The tables are found from the MAX of their date/time column. Specific implementations must set connect, release and get_insert_query.
+
+    :param tables: (dict) The name of the database table for each logger table.
+    :param dt_header: (str) The name of the date/time column.
+    :param batch_size: (int) The number of rows inserted with each query. Default is BATCH_SIZE.
+    """
+
+    def __init__(self, tables, dt_header, batch_size=BATCH_SIZE):
+        super().__init__(dt_header)
+        self.tables = dict(tables)
+        self.batch_size = batch_size
+
+    def connect(self):
+        """ Class specific implementation to get an open connection. """
+        raise NotImplementedError
+
+    def release(self, cnx):
+        """ Class specific implementation to finish with a connection from connect. """
+        raise NotImplementedError
+
+    def get_insert_query(self, name, columns):
+        """
+        Class specific implementation to create the query to insert a row into a table.
+
+        :param name: (str) The name of the table in the database.
+        :param columns: (list) The column names.
+        :returns: (str) The query.
+        """
+        raise NotImplementedError
+
+    @staticmethod
+    def adapt(value):
+        """ Convert a value from the logger for the database: nan is inserted as NULL. """
+        if isinstance(value, float) and math.isnan(value):
+            return None
+        return value
+
+    def update_tables(self, cur, table, records):
+        """
+        Update any other tables from the records written, in the same transaction. Does nothing unless extended.
+
+        :param cur: The database cursor, with the records inserted but not committed.
+        :param table: (str) The name of the logger table.
+        :param records: (list) The records written, each a dictionary.
+        """
+        pass
+
+    def get_stored_time(self, table):
+        cnx = self.connect()
+        try:
+            cur = cnx.cursor()
+            cur.execute(f"SELECT MAX(`{self.dt_header}`) FROM {self.tables[table]}")
+            last = cur.fetchone()[0]
+            cur.close()
+        finally:
+            self.release(cnx)
+
+        return datetime.fromisoformat(last) if isinstance(last, str) else last
+
+    def write_new(self, table, records):
+        columns = list(records[0].keys())
+        query = self.get_insert_query(self.tables[table], columns)
+        rows = [[self.adapt(r[c]) for c in columns] for r in records]
+
+        cnx = self.connect()
+        try:
+            cur = cnx.cursor()
+            for start in range(0, len(rows), self.batch_size):
+                cur.executemany(query, rows[start:start + self.batch_size])
+            self.update_tables(cur, table, records)
+            cur.close()
+            cnx.commit()
+        except Exception:
+            cnx.rollback()
+            raise
+        finally:
+            self.release(cnx)
+
+
+class SQLiteSink(DatabaseSink):
+
+    """
+    Writes records to a local sqlite database, for use without a database server and for testing.
+    A table is created for each logger table when it is first written to, with a column for each field of the records
+    and the date/time column as the primary key, so records are never duplicated.
+
+    :param path: (str) The path of the sqlite database file.
+    :param tables: (dict) The name of the database table for each logger table.
+    :param dt_header: (str) The name of the date/time column.
+    :param batch_size: (int) The number of rows inserted with each query. Default is BATCH_SIZE.
+    """
+
+    def __init__(self, path, tables, dt_header, batch_size=BATCH_SIZE):
+        super().__init__(tables, dt_header, batch_size)
+        self.path = path
+        self._connection = None
+        # the connection is shared between threads, one at a time
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f"SQLiteSink({self.path!r})"
+
+    def connect(self):
+        self._lock.acquire()
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        return self._connection
+
+    def release(self, cnx):
+        self._lock.release()
+
+    @staticmethod
+    def adapt(value):
+        """ Convert a value from the logger for sqlite: nan is inserted as NULL and datetimes as strings. """
+        if isinstance(value, datetime):
+            return value.isoformat(' ')
+        return DatabaseSink.adapt(value)
+
+    def get_stored_time(self, table):
+        try:
+            return super().get_stored_time(table)
+        except sqlite3.OperationalError:
+            # the table hasn't been created yet
+            return None
+
+    def get_insert_query(self, name, columns):
+        return f"INSERT OR IGNORE INTO {name} ({', '.join(columns)}) VALUES ({', '.join(['?'] * len(columns))})"
+
+    def write_new(self, table, records):
+        columns = [f"{c} PRIMARY KEY" if c == self.dt_header else c for c in records[0].keys()]
+        cnx = self.connect()
+        try:
+            cnx.execute(f"CREATE TABLE IF NOT EXISTS {self.tables[table]} ({', '.join(columns)})")
+        finally:
+            self.release(cnx)
+
+        super().write_new(table, records)
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+class MySQLSink(DatabaseSink):
+
+    """
+    Writes records to MySQL tables, which must already exist with a column named after each field of the records.
+    Connections are taken from a pool, so a connection that has dropped is replaced, and rows are upserted
+    (see get_insert_query), so records already in a table with a unique key on the date/time column are replaced rather than duplicated.
+    As add_to_mysql.py does, the rollup tables of each table (for each of rollup_periods in the config) and the time of the last record loaded
+    (in energy_balance_load_state) are updated in the same transaction as the rows, so add_to_mysql.py can also be run without loading them again.
+
+    :param tables: (dict) The name of the MySQL table for each logger table.
+    :param dt_header: (str) The name of the date/time column.
+    :param pool_size: (int) The number of connections in the pool. Default is 2.
+    :param batch_size: (int) The number of rows inserted with each query. Default is BATCH_SIZE.
+    :param config: (energy_balance.Config) Optional. The config to use for rollup_periods and the QC rules of the rollups,
+                   the config from the config files if not provided.
+    :param connect_args: Arguments for mysql.connector.connect e.g. user, password, database and host.
+    """
+
+    def __init__(self, tables, dt_header, pool_size=2, batch_size=BATCH_SIZE, config=None, **connect_args):
+        super().__init__(tables, dt_header, batch_size)
+        # imported here so that other commands (and --help) don't have to load it
+        from mysql.connector.pooling import MySQLConnectionPool
+
+        self.config = config if config is not None else get_config()
+        self.periods = tuple(self.config['common'].get('rollup_periods', ()))
+        self.database = connect_args.get('database')
+        self.pool = MySQLConnectionPool(pool_name='energy_balance', pool_size=pool_size, **connect_args)
+        # the state and rollup tables are created before the first write
+        self._created = False
+
+    def __repr__(self):
+        return f"MySQLSink({self.database!r})"
+
+    def connect(self):
+        cnx = self.pool.get_connection()
+        if not self._created:
+            # CREATE TABLE commits implicitly, so this is done before any rows are inserted
+            cur = cnx.cursor()
+            create_state_table(cur)
+            for name in self.tables.values():
+                create_rollup_tables(cur, name, self.periods)
+            cur.close()
+            cnx.commit()
+            self._created = True
+        return cnx
+
+    def release(self, cnx):
+        # returns the connection to the pool
+        cnx.close()
+
+    def get_insert_query(self, name, columns):
+        return get_insert_query(name, columns, 'upsert')
+
+    def update_tables(self, cur, table, records):
+        name = self.tables[table]
+        if self.periods:
+            # new rollups for each write, so nothing is counted twice if the write fails and is retried
+            rollups = Rollups(name, self.dt_header, self.periods, self.config)
+            columns = list(records[0].keys())
+            for record in records:
+                rollups.add(record[self.dt_header], columns, [self.adapt(record[c]) for c in columns])
+            rollups.write(cur)
+        set_high_water_mark(cur, name, records[-1][self.dt_header])
+
+
+class QueuedSink:
+
+    """
+    Writes to a sink in a separate thread, from a bounded queue, so a slow sink (e.g. a database) doesn't hold up reading from the logger.
+    Writing only waits if the queue is full. If a batch can't be written, the error is printed, the sink reads its last record again,
+    and the batches of that table queued before the next call to get_last_time are dropped, so the records are downloaded again
+    for it from the failed batch on the next update, rather than later batches being written and leaving a gap.
+
+    :param sink: (Sink) The sink to write to.
+    :param maxsize: (int) The maximum number of batches waiting to be written. Default is 100.
+    """
+
+    def __init__(self, sink, maxsize=100):
+        self.sink = sink
+        self.queue = queue.Queue(maxsize)
+        self.errors = 0
+        # the state of each table below is shared with the writing thread, so is only used with the lock held
+        self._lock = threading.Lock()
+        # the time of the last record queued for each table
+        self._queued = {}
+        # the number of failed writes of each table, batches are only written if none have failed since they were queued
+        self._generations = {}
+        # the generation of each table when its last time was read, batches queued after are dropped if it has changed
+        self._synced = {}
+        self._thread = threading.Thread(target=self._run, name=repr(sink), daemon=True)
+        self._thread.start()
+
+    def __repr__(self):
+        return f"QueuedSink({self.sink!r})"
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+
+            table, generation, records = item
+            with self._lock:
+                if generation != self._generations.get(table, 0):
+                    # a write of the table failed after this batch was queued, it is downloaded again instead
+                    continue
+
+            try:
+                self.sink.write(table, records)
+            except Exception as exc:
+                print(f"Could not write {table} to {self.sink!r}: {exc}")
+                with self._lock:
+                    self.errors += 1
+                    self._generations[table] = self._generations.get(table, 0) + 1
+                    self._queued.pop(table, None)
+                    self.sink.forget(table)
+
+    def get_last_time(self, table):
+        """
+        Get the time of the last record of a table queued, or if none have been queued since the last failed write, written to the sink.
+
+        :param table: (str) The name of the logger table.
+        :returns: (datetime.datetime) The time of the last record, or None if there are none.
+        """
+        with self._lock:
+            self._synced[table] = self._generations.get(table, 0)
+            if table in self._queued:
+                return self._queued[table]
+        return self.sink.get_last_time(table)
+
+    def write(self, table, records):
+        """
+        Queue records to be written to the sink. They are dropped if a write of the table has failed since its last time was read,
+        as they would leave a gap after the failed batch.
+
+        :param table: (str) The name of the logger table.
+        :param records: (pycampbellcr1000.utils.ListDict) The records in time order.
+        :returns: (int) The number of records queued.
+        """
+        if not records:
+            return 0
+
+        with self._lock:
+            generation = self._generations.get(table, 0)
+            if self._synced.get(table, generation) != generation:
+                return 0
+            self._queued[table] = records[-1][self.sink.dt_header]
+
+        self.queue.put((table, generation, records))
+        return len(records)
+
+    def close(self):
+        """ Write all the records queued, then close the sink. """
+        self.queue.put(None)
+        self._thread.join()
+        self.sink.close()
+
+
+class Sinks(list):
+
+    """
+    All the sinks the records downloaded from the logger are written to.
+    """
+
+    def get_last_time(self, table):
+        """
+        Get the time from which records of a table are needed: the earliest of the last times in each sink.
+
+        :param table: (str) The name of the logger table.
+        :returns: (datetime.datetime) The time, or None if any sink has no records of the table.
+        """
+        times = [sink.get_last_time(table) for sink in self]
+        if not times or None in times:
+            return None
+        return min(times)
+
+    def write(self, table, records):
+        """
+        Write records to all the sinks.
+
+        :param table: (str) The name of the logger table.
+        :param records: (pycampbellcr1000.utils.ListDict) The records in time order.
+        :returns: (int) The number of records.
+        """
+        for sink in self:
+            sink.write(table, records)
+        return len(records)
+
+    def close(self):
+        """ Finish writing to, and close, all the sinks. """
+        for sink in self:
+            sink.close()
+
+
+def create_sinks(names=None, config=None):
+    """
+    Create the sinks to write downloaded records to, each writing from its own queue, using the settings in the config.
+
+    :param names: (list) Optional. The names of the sinks, any of SINK_NAMES. Default is download_sinks from the config.
+    :param config: (energy_balance.Config) Optional. The config to use, the config from the config files if not provided.
+    :returns: (Sinks) The sinks.
+    """
+    config = config if config is not None else get_config()
+    common = config['common']
+    names = names if names is not None else common['download_sinks']
+    dt_header = common['datetime_header']
+    tables = dict(zip(common['logger_tables'], common['mysql_tables']))
+
+    sinks = Sinks()
+    for name in names:
+        if name == 'csv':
+            sink = CSVSink(os.path.expanduser(common['logger_csv_path']), dt_header)
+        elif name == 'sqlite':
+            sink = SQLiteSink(os.path.expanduser(common['sqlite_path']), tables, dt_header)
+        elif name == 'mysql':
+            mysql = config['mysql']
+            sink = MySQLSink(tables, dt_header, pool_size=mysql['pool_size'], config=config, host=mysql['host'],
+                             user=mysql['user'], password=mysql['password'], database=mysql['database'])
+        else:
+            raise ValueError(f"Unknown sink {name}, options are {', '.join(SINK_NAMES)}")
+
+        sinks.append(QueuedSink(sink, common['sink_queue_size']))
+
+    return sinks
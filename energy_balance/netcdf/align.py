@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+
+from .times import to_epoch_nanoseconds, NANOSECONDS_PER_SECOND
+
+
+def get_time_axis(times, tolerance):
+    """
+    Find the common time axis of several tables. Times within the tolerance of the previous time are the same record on the axis.
+
+    :param times: (list) The times of each table, as int64 arrays of nanoseconds since 1970-01-01T00:00:00.
+    :param tolerance: (int) The tolerance in nanoseconds.
+    :returns: (tuple) The index into the concatenated times of the first time of each record on the axis,
+              and the position on the axis of each time in each table.
+    """
+    first = times[0]
+
+    # usually the tables are all logged at the same times, which are then the axis
+    if all(np.array_equal(t, first) for t in times[1:]) and np.all(np.diff(first) > tolerance):
+        positions = np.arange(len(first))
+        return positions, [positions] * len(times)
+
+    all_times = np.concatenate(times)
+
+    # each table is normally already sorted, so a stable sort just merges the sorted runs
+    order = np.argsort(all_times, kind='stable')
+    sorted_times = all_times[order]
+
+    # a new record starts wherever the gap to the previous time is more than the tolerance
+    starts = np.ones(len(sorted_times), dtype=bool)
+    starts[1:] = np.diff(sorted_times) > tolerance
+
+    # the position on the axis of each time, in the original (concatenated) order
+    positions = np.empty(len(all_times), dtype=np.int64)
+    positions[order] = np.cumsum(starts) - 1
+
+    offsets = np.cumsum([0] + [len(t) for t in times])
+    return order[starts], [positions[offsets[i]:offsets[i + 1]] for i in range(len(times))]
+
+
+def align_tables(tables, dt_header, tolerance=0):
+    """
+    Join tables onto a common time axis, made of the times in all of the tables.
+    Records in different tables within the tolerance of each other are joined as the same time, so timestamps that are slightly skewed
+    between tables are still matched. A record missing from a table is kept, with nan for that table's columns so it is flagged by the QC.
+    If a table has more than one record at the same time, the first is used.
+
+    :param tables: (list) A pandas dataframe for each table, containing dt_header and the columns to keep from that table.
+    :param dt_header: (str) The name of the date/time column in each table.
+    :param tolerance: (float) Optional. The tolerance in seconds. Default is 0, only identical times are joined.
+    :returns: (tuple) The joined dataframe, with dt_header followed by the columns of each table in order, sorted by time,
+              and the times of its rows as an int64 array of seconds since 1970-01-01T00:00:00.
+    """
+    # tables with the same date/time column as the first (the usual case) don't need to be parsed again
+    first = tables[0][dt_header]
+    first_times = to_epoch_nanoseconds(first)
+    times = [first_times] + [first_times if table[dt_header].equals(first) else to_epoch_nanoseconds(table[dt_header]) for table in tables[1:]]
+
+    axis_index, positions = get_time_axis(times, int(tolerance * NANOSECONDS_PER_SECOND))
+
+    # each time on the axis, and its date/time string, are from the earliest record joined
+    if np.array_equal(axis_index, np.arange(len(first))):
+        # all from the first table, so its columns can be used as they are
+        dt = first.array
+        axis_times = first_times
+    else:
+        offsets = np.cumsum([0] + [len(t) for t in times])
+        source = np.searchsorted(offsets, axis_index, side='right') - 1
+        dt = np.empty(len(axis_index), dtype=object)
+        axis_times = np.empty(len(axis_index), dtype=np.int64)
+
+        for i, table in enumerate(tables):
+            selected = source == i
+            if selected.any():
+                rows = axis_index[selected] - offsets[i]
+                dt[selected] = table[dt_header].take(rows).to_numpy(dtype=object)
+                axis_times[selected] = times[i][rows]
+
+    columns = {dt_header: dt}
+    for table, table_positions in zip(tables, positions):
+        if np.all(np.diff(table_positions) > 0):
+            rows = slice(None)
+        else:
+            table_positions, rows = np.unique(table_positions, return_index=True)
+
+        for col in table.columns.drop(dt_header):
+            values = np.full(len(axis_index), np.nan)
+            values[table_positions] = table[col].to_numpy(dtype=np.float64)[rows]
+            columns[col] = values
+
+    return pd.DataFrame(columns), axis_times // NANOSECONDS_PER_SECOND
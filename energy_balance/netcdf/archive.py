@@ -0,0 +1,315 @@
+import glob
+import os
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+from netCDF4 import Dataset
+
+from energy_balance import get_config
+from .base_netcdf import BaseNetCDF
+from .masks import COMMON_QC_VARIABLES, QC_PREFIX, get_qc_pairs
+
+# number of digits of the date in the file names of each frequency e.g. 20210730 for daily files
+DATE_DIGITS = {'daily': 8, 'monthly': 6}
+
+
+class DatasetCache:
+
+    """
+    A least recently used cache of netCDF files open for reading, so reading many time ranges from the same files doesn't open them each time.
+    When more than max_open files are open, the least recently used is closed. Use it as a context manager, so the files are closed after:
+
+        with DatasetCache() as cache:
+            times, values = read_range('soil', start, end, cache=cache)
+
+    While the cache holds a file open, HDF5 locks it, so nothing can write to it (e.g. create_files in append mode, override_qc or
+    calculate_valid_min_max), in this process or any other. Close the cache before running anything that writes the files.
+    A file that has been replaced since it was opened (e.g. created again) is opened again.
+    Values are read from the files as stored, without masking or scaling.
+
+    :param max_open: (int) Optional. The maximum number of files to keep open. Default is 16.
+    """
+
+    def __init__(self, max_open=16):
+        if max_open < 1:
+            raise ValueError(f"max_open must be at least 1, not {max_open}")
+
+        self.max_open = max_open
+        # (dataset, modification time) for each path, least recently used first
+        self._open = OrderedDict()
+
+    def get(self, path):
+        """
+        Get an open netCDF file, opening it if it isn't open or has changed.
+
+        :param path: (str) The path to the netCDF file.
+        :returns: (netCDF4.Dataset) The file, open for reading. It is closed by the cache, so don't close it.
+        """
+        mtime = os.stat(path).st_mtime_ns
+
+        if path in self._open:
+            dataset, opened_mtime = self._open[path]
+            if opened_mtime == mtime:
+                self._open.move_to_end(path)
+                return dataset
+            self._close(path)
+
+        dataset = Dataset(path, 'r')
+        dataset.set_auto_maskandscale(False)
+        self._open[path] = (dataset, mtime)
+
+        while len(self._open) > self.max_open:
+            self._close(next(iter(self._open)))
+
+        return dataset
+
+    def _close(self, path):
+        dataset, _ = self._open.pop(path)
+        dataset.close()
+
+    def close(self):
+        """
+        Close all the open files.
+        """
+        while self._open:
+            self._close(next(iter(self._open)))
+
+    def __contains__(self, path):
+        return path in self._open
+
+    def __len__(self):
+        return len(self._open)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+@contextmanager
+def open_dataset(path, cache=None):
+    """
+    Open a netCDF file for reading, without masking or scaling, from the cache if one is given.
+
+    :param path: (str) The path to the netCDF file.
+    :param cache: (DatasetCache) Optional. The cache to get the file from, the file is left open in it.
+                  Default is to open the file and close it when done.
+    :returns: (netCDF4.Dataset) The file, open for reading.
+    """
+    if cache is not None:
+        yield cache.get(path)
+        return
+
+    with Dataset(path, 'r') as dataset:
+        dataset.set_auto_maskandscale(False)
+        yield dataset
+
+
+def to_epoch(time):
+    """
+    Convert a time to seconds since 1970-01-01T00:00:00.
+
+    :param time: (str, datetime.datetime, numpy.datetime64 or int) The time, in ISO 8601 format if a string e.g. 2021-07-30T10:00:00.
+                 An int is taken as seconds since 1970-01-01T00:00:00 already.
+    :returns: (int) Seconds since 1970-01-01T00:00:00.
+    """
+    if isinstance(time, (int, np.integer)):
+        return int(time)
+    return int(np.datetime64(time, 's').astype(np.int64))
+
+
+def find_files(data_product, start, end, frequency='daily', config=None):
+    """
+    Find the netCDF files of a data product that may have records from start to end, from the dates in their file names,
+    without opening them.
+
+    :param data_product: (str) The data product e.g. soil or radiation.
+    :param start: (int) The start time in seconds since 1970-01-01T00:00:00.
+    :param end: (int) The end time in seconds since 1970-01-01T00:00:00.
+    :param frequency: (str) 'daily' or 'monthly', the files to read. Default is daily.
+    :param config: (energy_balance.Config) Optional. The config to use, the config from the config files if not provided.
+    :returns: (list) The paths of the files, in date order.
+    """
+    if frequency not in DATE_DIGITS:
+        raise ValueError(f'Frequency {frequency} is not supported. Options are daily or monthly.')
+
+    digits = DATE_DIGITS[frequency]
+    pattern = BaseNetCDF.get_output_file('[0-9]' * digits, data_product, config)
+    unit = 'D' if frequency == 'daily' else 'M'
+
+    first = str(np.datetime64(start, 's').astype(f'datetime64[{unit}]')).replace('-', '')
+    last = str(np.datetime64(end, 's').astype(f'datetime64[{unit}]')).replace('-', '')
+    prefix, _, suffix = os.path.basename(pattern).partition('[0-9]' * digits)
+
+    fpaths = []
+    for fpath in glob.glob(pattern):
+        name = os.path.basename(fpath)
+        date = name[len(prefix):len(name) - len(suffix)]
+        if first <= date <= last:
+            fpaths.append(fpath)
+    return sorted(fpaths)
+
+
+def get_time_coverage(dataset):
+    """
+    Get the time coverage of an open netCDF file from its time_coverage_start and time_coverage_end attributes.
+
+    :param dataset: (netCDF4.Dataset) The open netCDF file.
+    :returns: (tuple) The start and end in seconds since 1970-01-01T00:00:00, or None if the attributes aren't set.
+    """
+    try:
+        return to_epoch(dataset.time_coverage_start), to_epoch(dataset.time_coverage_end)
+    except (AttributeError, ValueError):
+        return None
+
+
+def get_mask(dataset, name, values, first, last, qc_flag, pairs):
+    """
+    Get the mask of some records of a variable: True where the value is a fill value, or its QC flags
+    (its own and any of COMMON_QC_VARIABLES with its dimensions) are above qc_flag.
+
+    :param dataset: (netCDF4.Dataset) The open netCDF file, read without auto masking.
+    :param name: (str) The name of the variable.
+    :param values: (numpy.ndarray) The values of the records, as stored in the file.
+    :param first: (int) The index of the first record.
+    :param last: (int) The index after the last record.
+    :param qc_flag: (int) Max value of qc to show, or None to only mask fill values.
+    :param pairs: (dict) The QC flag variable of each variable, see get_qc_pairs.
+    :returns: (numpy.ndarray) The mask, with the shape of values.
+    """
+    var = dataset[name]
+    mask = np.zeros(values.shape, dtype=bool)
+    if '_FillValue' in var.ncattrs():
+        mask |= values == var._FillValue
+    if values.dtype.kind == 'f':
+        mask |= np.isnan(values)
+
+    if qc_flag is None or name not in pairs:
+        return mask
+
+    qc_names = [pairs[name]] + [c for c in COMMON_QC_VARIABLES if c in dataset.variables and c != pairs[name]]
+    for qc_name in qc_names:
+        qc_var = dataset[qc_name]
+        if not set(qc_var.dimensions) <= set(var.dimensions):
+            continue
+
+        flags = qc_var[first:last]
+        masked = flags > qc_flag
+        if '_FillValue' in qc_var.ncattrs():
+            masked |= flags == qc_var._FillValue
+        if flags.ndim < values.ndim:
+            masked = masked.reshape(flags.shape + (1,) * (values.ndim - flags.ndim))
+        mask |= masked
+
+    return mask
+
+
+def read_file(dataset, fpath, start, end, variables, qc_flag):
+    """
+    Read the records of an open netCDF file from start to end (inclusive), masked at a QC flag level, see read_range.
+    Only the time variable and the records in the range are read, and nothing if the file's time coverage is outside the range.
+
+    :param dataset: (netCDF4.Dataset) The open netCDF file, read without auto masking.
+    :param fpath: (str) The path of the file, for errors.
+    :param start: (int) The start time in seconds since 1970-01-01T00:00:00.
+    :param end: (int) The end time in seconds since 1970-01-01T00:00:00.
+    :param variables: (list) The names of the variables to read, or None for every variable with a QC flag variable.
+    :param qc_flag: (int) Max value of qc to show.
+    :returns: (tuple) The times of the records and a dictionary of their values for each variable, empty arrays if there are none in the range.
+    """
+    times = np.array([], dtype=np.int64)
+    first = last = 0
+    coverage = get_time_coverage(dataset)
+    if coverage is None or (coverage[1] >= start and coverage[0] <= end):
+        file_times = np.rint(dataset['time'][:]).astype(np.int64)
+        first = int(np.searchsorted(file_times, start, side='left'))
+        last = max(first, int(np.searchsorted(file_times, end, side='right')))
+        times = file_times[first:last]
+
+    pairs = get_qc_pairs(dataset)
+    values = {}
+    for name in (variables if variables is not None else list(pairs)):
+        if name not in dataset.variables:
+            raise KeyError(f"{name} is not a variable in {fpath}")
+
+        data = dataset[name][first:last]
+        if not name.startswith(QC_PREFIX):
+            mask = get_mask(dataset, name, data, first, last, qc_flag, pairs)
+            data = data.astype(float)
+            data[mask] = np.nan
+        values[name] = data
+
+    return times, values
+
+
+def read_range(data_product, start, end, variables=None, qc_flag=None, frequency='daily', cache=None, config=None):
+    """
+    Read the records of a data product from start to end (inclusive) from the netCDF files, masked at a QC flag level.
+    Only the files that may have records in the range are opened, and only the records in the range are read from them.
+    Each file is closed after it is read, unless a cache is given, which keeps them open so reading the same files again is quick
+    (see DatasetCache, nothing can write the files while it holds them).
+
+    :param data_product: (str) The data product e.g. soil or radiation.
+    :param start: (str, datetime.datetime, numpy.datetime64 or int) The start time, see to_epoch.
+    :param end: (str, datetime.datetime, numpy.datetime64 or int) The end time, see to_epoch.
+    :param variables: (list) Optional. The names of the variables to read e.g. ['soil_temperature']. QC flag variables can be read too, and
+                      are not masked. Default is every variable with a QC flag variable.
+    :param qc_flag: (int) Optional. Max value of qc to show i.e. 1 will show only 'good data', 2 will show good data and data marked with a flag of 2.
+                    Default is qc_flag_level from the config. Values that aren't shown, and fill values, are nan.
+    :param frequency: (str) Optional. 'daily' or 'monthly', the files to read. Default is daily.
+    :param cache: (DatasetCache) Optional. The cache of open files to use. Default is to open and close each file.
+    :param config: (energy_balance.Config) Optional. The config to use, the config from the config files if not provided.
+    :returns: (tuple) The times, as an int64 array of seconds since 1970-01-01T00:00:00, and a dictionary of the values of each variable,
+              as arrays with a row for each time e.g. a (time, index) float array for soil_temperature.
+              If there are no records in the range, the arrays are empty, with the same variables and dimensions.
+    """
+    config = config if config is not None else get_config()
+    qc_flag = config['common']['qc_flag_level'] if qc_flag is None else qc_flag
+    start, end = to_epoch(start), to_epoch(end)
+
+    fpaths = find_files(data_product, start, end, frequency, config)
+    if not fpaths:
+        raise FileNotFoundError(f"No {frequency} {data_product} files found from {np.datetime64(start, 's')} to {np.datetime64(end, 's')}")
+
+    times = []
+    values = {}
+    for fpath in fpaths:
+        with open_dataset(fpath, cache) as dataset:
+            file_times, file_values = read_file(dataset, fpath, start, end, variables, qc_flag)
+
+        times.append(file_times)
+        for name, data in file_values.items():
+            values.setdefault(name, []).append(data)
+
+    return np.concatenate(times), {name: np.concatenate(v) for name, v in values.items()}
+
+
+def read_range_dataframe(data_product, start, end, variables=None, qc_flag=None, frequency='daily', cache=None, config=None):
+    """
+    Read the records of a data product from start to end into a pandas dataframe, see read_range.
+    Variables with an index dimension e.g. soil_temperature have a column for each index e.g. soil_temperature_1.
+
+    :param data_product: (str) The data product e.g. soil or radiation.
+    :param start: (str, datetime.datetime, numpy.datetime64 or int) The start time, see to_epoch.
+    :param end: (str, datetime.datetime, numpy.datetime64 or int) The end time, see to_epoch.
+    :param variables: (list) Optional. The names of the variables to read, see read_range.
+    :param qc_flag: (int) Optional. Max value of qc to show, see read_range. Default is qc_flag_level from the config.
+    :param frequency: (str) Optional. 'daily' or 'monthly', the files to read. Default is daily.
+    :param cache: (DatasetCache) Optional. The cache of open files to use. Default is to open and close each file.
+    :param config: (energy_balance.Config) Optional. The config to use, the config from the config files if not provided.
+    :returns: (pandas.DataFrame) The values, indexed by time.
+    """
+    times, values = read_range(data_product, start, end, variables, qc_flag, frequency, cache, config)
+
+    columns = {}
+    for name, data in values.items():
+        if data.ndim == 1:
+            columns[name] = data
+        else:
+            for i in range(data.shape[1]):
+                columns[f"{name}_{i + 1}"] = data[:, i]
+
+    return pd.DataFrame(columns, index=pd.DatetimeIndex(times.astype('datetime64[s]'), name='time'))
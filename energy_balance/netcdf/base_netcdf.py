@@ -2,13 +2,14 @@ __author__ = 'Elle Smith'
 __date__ = '09 Aug 2021'
 __contact__ = 'eleanor.smith@stfc.ac.uk'
 
-import pandas as pd
 from netCDF4 import Dataset
 from datetime import datetime
 import numpy as np
 import os
 
-from energy_balance import CONFIG
+from energy_balance import get_config
+from .times import to_epoch_seconds, to_isoformat, calendar_fields
+from .masks import QCMask
 
 class BaseNetCDF:
 
@@ -17,41 +18,114 @@ class BaseNetCDF:
     Creates all the common variables found in netCDF files under the NCAS-GENERAL Data Standard.
     Sets all the required global attributes.
 
-    Constant values are taken from the config file, excluding 'headers' and 'data_product' which must be set in each specific implementation.
+    Constant values are taken from the config in the configure method, excluding 'data_product' which must be set in each specific implementation.
+    'headers' must be set in each specific implementation of configure. 'common_headers' can be set to the headers of QC flags that apply to all columns.
 
     :param df: A pandas dataframe containing all columns required to create the netCDF file.
     :param qc: A pandas dataframe with the same columns as df, but containing the quality control values instead. (i.e. 1, 2, 3 etc.)
     :param date: (datetime.datetime) The date to create the netCDF file for. If frequency is monthly, only the year and month will be taken into account.
     :param frequency: (str) 'daily' or 'monthly'. Determines whether the file will use data from one day or for one month.
+    :param times: (numpy.ndarray) Optional. The times of each row in df as seconds since 1970-01-01T00:00:00, e.g. QualityControl.times. Parsed from df if not provided.
+    :param append: (bool) Optional. If True and the file already exists, the rows in df are appended to the existing file rather than the file being rewritten.
+                   df should only contain records newer than the last time in the file (see get_last_time). Default is False.
+    :param mask: (energy_balance.netcdf.masks.QCMask) Optional. The mask of df from the quality control, e.g. QualityControl.mask, so the QC flags aren't compared again.
+                 Created from qc if not provided.
+    :param config: (energy_balance.Config) Optional. The config to use. If not provided, the config from the config files (see energy_balance.get_config) is used.
     """
 
-    dt_header = CONFIG['common']['datetime_header']
     headers = 'UNDEFINED'
+    # headers of qc flags that mask all the columns e.g. sensor cleaning
+    common_headers = []
     data_product = "UNDEFINED"
-    qc_flag_level = CONFIG['common']['qc_flag_level']
-    fill_value = CONFIG['common']['fill_value']
 
-    def __init__(self, df, qc, date, frequency):
+    def __init__(self, df, qc, date, frequency, times=None, append=False, mask=None, config=None):
+        self.config = config if config is not None else get_config()
+        self.configure()
+
         self.df = df
         self.qc = qc
-        self.get_masked_data(self.qc_flag_level)
+        self.mask = mask
+        self.times = times if times is not None else self.convert_times(df[self.dt_header])
 
         # validate date format
         date = self.convert_date_to_string(date, frequency)
 
-        output_file_name = f"ncas-energy-balance-1_{CONFIG['global']['platform']}_{date}_{self.data_product}_v{CONFIG['global']['product_version']}.nc"
-        output_path = CONFIG['common']['netcdf_path']
-        output_file = os.path.expanduser(os.path.join(output_path, output_file_name))
+        output_file = self.get_output_file(date, self.data_product, self.config)
         print(output_file)
 
-        self.dataset = Dataset(output_file, "w", format='NETCDF4_CLASSIC')
+        self.append = append and os.path.isfile(output_file)
+        if self.append and len(self.times) == 0:
+            print(f"No new records to append to {output_file}")
+            return
+
+        self.get_masked_data(self.qc_flag_level)
+
+        if self.append:
+            self.dataset = Dataset(output_file, "a")
+            # new records are written after those already in the file
+            self.start = len(self.dataset.dimensions["time"])
+        else:
+            self.dataset = Dataset(output_file, "w", format='NETCDF4_CLASSIC')
+            self.start = 0
+
         self.create_netcdf()
         self.dataset.close()
 
-        print(f"Dataset created at {output_file}")
+        if self.append:
+            print(f"{len(self.times)} records appended to {output_file}")
+        else:
+            print(f"Dataset created at {output_file}")
+
+
+    def configure(self):
+        """
+        Set the constant values used to create the file from self.config. Specific implementations should extend this to set self.headers.
+        """
+        common = self.config['common']
+        self.dt_header = common['datetime_header']
+        self.qc_flag_level = common['qc_flag_level']
+        self.fill_value = common['fill_value']
+        # storage settings (compression and chunking) for data variables and for qc variables
+        self.data_storage = {k[len('data_'):]: v for k, v in self.config['netcdf'].items() if k.startswith('data_')}
+        self.qc_storage = {k[len('qc_'):]: v for k, v in self.config['netcdf'].items() if k.startswith('qc_')}
+
+    @staticmethod
+    def get_output_file(date, data_product, config=None):
+        """
+        Get the path of the netCDF file for a date and data product, in the netcdf_path set in the config file.
+
+        :param date: (str) The date as it appears in the file name, e.g. 20210730 for a daily file or 202107 for a monthly file. Can include wildcards.
+        :param data_product: (str) The data product e.g. soil or radiation.
+        :param config: (energy_balance.Config) Optional. The config to use, the config from the config files if not provided.
+        :returns: (str) The path of the netCDF file.
+        """
+        config = config if config is not None else get_config()
+        output_file_name = f"ncas-energy-balance-1_{config['global']['platform']}_{date}_{data_product}_v{config['global']['product_version']}.nc"
+        output_path = config['common']['netcdf_path']
+        return os.path.expanduser(os.path.join(output_path, output_file_name))
+
+    @classmethod
+    def get_last_time(cls, date, frequency, config=None):
+        """
+        Get the time of the last record in an existing netCDF file, to find which records need to be appended.
+
+        :param date: (datetime.datetime) The date of the file.
+        :param frequency: (str) The frequency of the file - daily or monthly.
+        :param config: (energy_balance.Config) Optional. The config to use, the config from the config files if not provided.
+        :returns: (int) The last time in the file as seconds since 1970-01-01T00:00:00, or None if the file doesn't exist or is empty.
+        """
+        output_file = cls.get_output_file(cls.convert_date_to_string(date, frequency), cls.data_product, config)
+        if not os.path.isfile(output_file):
+            return None
 
+        with Dataset(output_file, "r") as dataset:
+            time_var = dataset["time"]
+            if len(time_var) == 0:
+                return None
+            return int(time_var[-1])
 
-    def convert_date_to_string(self, date, frequency):
+    @staticmethod
+    def convert_date_to_string(date, frequency):
         """
         Generate a date string for the file name based on the date provided and the frequency required.
 
@@ -67,7 +141,7 @@ class BaseNetCDF:
             date = date.strftime("%Y%m%d")
 
         else:
-            raise ValueError(f'Frequency {self.frequency} is not supported. Options are daily or monthly.')
+            raise ValueError(f'Frequency {frequency} is not supported. Options are daily or monthly.')
         
         return date
 
@@ -77,17 +151,9 @@ class BaseNetCDF:
         Convert times from strings to total seconds since 1970-01-01T00:00:00.
 
         :param times: (sequence) Times to convert to total seconds since 1970-01-01T00:00:00.
-        :returns: (list) The times converted to total seconds since 1970-01-01T00:00:00. 
+        :returns: (numpy.ndarray) The times converted to total seconds since 1970-01-01T00:00:00. 
         """
-        ref_time = datetime.strptime("1970-01-01T00:00:00", "%Y-%m-%dT%H:%M:%S")
-        
-        time_values = []
-        for t in times:
-            t = datetime.strptime(t, "%Y-%m-%d %H:%M:%S")
-            diff = t - ref_time
-            ts = diff.total_seconds()
-            time_values.append(ts)
-        return time_values
+        return to_epoch_seconds(times)
 
     @staticmethod
     def times_as_datetimes(times):
@@ -97,51 +163,103 @@ class BaseNetCDF:
         :param times: (sequence) Times to convert to datetimes in format Y-m-d H:M:S.
         :returns: (list) The times converted to datetimes.
         """
-        datetimes = []
-        for t in times:
-            t = datetime.strptime(t, "%Y-%m-%d %H:%M:%S")
-            datetimes.append(t)
-        return datetimes
+        return to_epoch_seconds(times).astype('datetime64[s]').astype(datetime).tolist()
 
     def get_masked_data(self, mask_value):
         """
-        Create masked pandas dataframe based on self.qc and the qc flag requested.
+        Get the data masked at the qc flag level requested, from self.mask, creating the mask from self.qc if it wasn't provided.
+        The data isn't copied, each column is masked when it is written.
         Sets self.df_masked.
 
         :param mask_value: (int) Max value of qc to show i.e. 1 will show only 'good data', 2 will show good data and data marked with a flag of 2.
         """
-        self.mask = (self.qc <= mask_value)
-        self.df_masked = pd.DataFrame(columns = self.headers)
-        self.df_masked[self.dt_header] = self.df[self.dt_header]
+        if self.mask is None:
+            self.mask = QCMask(self.df, self.qc, self.headers, self.dt_header, self.common_headers)
+        self.df_masked = self.mask.view(mask_value)
 
-        for col in self.headers:
-            mask_column = self.mask[col+'_qc']
-            self.df_masked[col] = self.df[col][mask_column]
+    def get_variable(self, name, data_type, dims, **kwargs):
+        """
+        Create a variable in the netCDF4 dataset or, when appending to an existing file, get the existing variable.
+
+        :param name: (str) The name of the variable.
+        :param data_type: The data type of the variable to be created e.g. numpy.float32 
+        :param dims: (tuple) The dimensions of the variable to be created e.g. ('time', ) or ('time', 'index')
+        :param kwargs: (dict) Any other arguments to use when creating the variable e.g. fill_value
+        :returns: (netCDF4.Variable) The variable.
+        """
+        if self.append:
+            return self.dataset[name]
+        return self.dataset.createVariable(name, data_type, dims, **kwargs)
+
+    def get_storage_options(self, dims, qc=False):
+        """
+        Get the compression and chunking options to use when creating a variable, from data_storage or qc_storage.
+
+        :param dims: (tuple) The dimensions of the variable to be created e.g. ('time', ) or ('time', 'index')
+        :param qc: (bool) If True, use the settings for quality control variables, otherwise those for data variables.
+        :returns: (dict) Options to pass to netCDF4.Dataset.createVariable e.g. {'zlib': True, 'complevel': 4, 'shuffle': True}
+        """
+        settings = self.qc_storage if qc else self.data_storage
+        options = {}
+
+        if settings['zlib']:
+            options.update(zlib=True, complevel=settings['complevel'], shuffle=settings['shuffle'])
+
+        if settings['chunk_size']:
+            # chunk along time, keeping the full length of any other dimension in each chunk
+            options['chunksizes'] = tuple(settings['chunk_size'] if d == 'time' else len(self.dataset.dimensions[d]) for d in dims)
+
+        return options
+
+    def write_values(self, var, values):
+        """
+        Write values along the time dimension of a variable, after any records already in the file.
+
+        :param var: (netCDF4.Variable) The variable to write to.
+        :param values: (sequence) The values to write, one for each row of df.
+        """
+        var[self.start:self.start + len(self.times)] = values
+
+    def set_valid_range(self, var, values):
+        """
+        Set valid_min and valid_max on a variable from the values provided, ignoring nans.
+        When appending, the range already set on the variable is extended to include the new values.
+
+        :param var: (netCDF4.Variable) The variable to set valid_min and valid_max on.
+        :param values: (sequence) The valid values of the variable.
+        """
+        valid_min = np.nanmin(values)
+        valid_max = np.nanmax(values)
+
+        if self.append and 'valid_min' in var.ncattrs():
+            valid_min = np.nanmin([var.valid_min, valid_min])
+            valid_max = np.nanmax([var.valid_max, valid_max])
+
+        var.valid_min = np.array(valid_min).astype(var.dtype)
+        var.valid_max = np.array(valid_max).astype(var.dtype)
 
     def create_time_variable(self):
         """
         Create the common time variable.
         """
         time_units = "seconds since 1970-01-01 00:00:00"
-        time_var = self.dataset.createVariable("time", np.float64, ("time",))
+        time_var = self.get_variable("time", np.float64, ("time",))
 
-        self.times = self.df[self.dt_header]
-        time_var[:] = self.convert_times(self.times)
+        self.write_values(time_var, self.times.astype(np.float64))
         time_var.units = time_units
         time_var.standard_name = "time"
         time_var.calendar = "standard"
         time_var.axis = 'T'
         time_var.long_name = "Time (seconds since 1970-01-01 00:00:00)"
 
-        time_var.valid_min = time_var[:].min()
-        time_var.valid_max = time_var[:].max()
+        self.set_valid_range(time_var, self.times.astype(np.float64))
 
     def create_lon_variable(self):
         """
         Create the common longitude variable.
         """
         lon_var = self.dataset.createVariable("longitude", np.float32, ("longitude",))
-        lon_var[:] = CONFIG['common']['longitude_value']
+        lon_var[:] = self.config['common']['longitude_value']
         lon_var.units = "degrees_east"
         lon_var.standard_name = "longitude"
         lon_var.long_name = "Longitude"
@@ -151,7 +269,7 @@ class BaseNetCDF:
         Create the common latitude variable.
         """
         lat_var = self.dataset.createVariable("latitude", np.float32, ("latitude",))
-        lat_var[:] = CONFIG['common']['latitude_value']
+        lat_var[:] = self.config['common']['latitude_value']
         lat_var.units = "degrees_north"
         lat_var.standard_name = "latitude"
         lat_var.long_name = "Latitude"
@@ -167,19 +285,17 @@ class BaseNetCDF:
         :param kwargs: (dict) Dictionary of attributes {'attr_name': 'attr_value'} to set on the variable e.g. {'standard_name': 'soil_temperature'}
         """
         # Create variable
-        var = self.dataset.createVariable(name, data_type, dims, fill_value=self.fill_value)
+        var = self.get_variable(name, data_type, dims, fill_value=self.fill_value, **self.get_storage_options(dims))
 
         # convert any nan values to fill values
-        self.df[header][np.isnan(self.df[header])] = self.fill_value
-
-        var[:] = self.df[header]
+        values = self.df[header].to_numpy(dtype=np.float64)
+        self.write_values(var, np.where(np.isnan(values), self.fill_value, values))
 
         # mask the data according to the qc
         var_masked = self.df_masked[header].astype(data_type)
         
         # Set variable attributes
-        var.valid_min = np.nanmin(var_masked) # get from valid values
-        var.valid_max = np.nanmax(var_masked)
+        self.set_valid_range(var, var_masked) # get from valid values
 
         for k, v in kwargs.items():
             setattr(var, k, v)
@@ -193,12 +309,11 @@ class BaseNetCDF:
         :param values: (sequence) The values to set for this variable.
         :param long_name: (str) The long name of this variable.
         """
-        var = self.dataset.createVariable(name, data_type, ("time",))
-        var[:] = values
+        var = self.get_variable(name, data_type, ("time",))
+        self.write_values(var, values)
         var.units = "1"
         var.long_name = long_name
-        var.valid_min = var[:].min()
-        var.valid_max = var[:].max()
+        self.set_valid_range(var, values)
 
     def create_qc_variable(self, name, header, dimensions, **kwargs):
         """
@@ -210,9 +325,9 @@ class BaseNetCDF:
         :param kwargs: (dict) Dictionary of attributes {'attr_name': 'attr_value'} to set on the variable e.g. {'standard_name': 'soil_temperature'}
 
         """
-        var = self.dataset.createVariable(name, np.byte, dimensions)
+        var = self.get_variable(name, np.byte, dimensions, **self.get_storage_options(dimensions, qc=True))
         qc_header = header + '_qc'
-        var[:] = self.qc[qc_header]
+        self.write_values(var, self.qc[qc_header])
         var.units = "1"
         for k, v in kwargs.items():
             setattr(var, k, v)
@@ -220,13 +335,15 @@ class BaseNetCDF:
     def set_global_attributes(self):
         """
         Sets the global attributes in the dataset based on those listed in the config file.
+        When appending, only the attributes that change with the new records are updated.
         """
-        for k, v in CONFIG['global'].items():
-            setattr(self.dataset, k, v)
+        if not self.append:
+            for k, v in self.config['global'].items():
+                setattr(self.dataset, k, v)
+            self.dataset.time_coverage_start = to_isoformat(self.times[0])
 
         self.dataset.last_revised_date = datetime.utcnow().isoformat()
-        self.dataset.time_coverage_start = datetime.strptime(self.times.iloc[0], "%Y-%m-%d %H:%M:%S").isoformat()
-        self.dataset.time_coverage_end = datetime.strptime(self.times.iloc[-1], "%Y-%m-%d %H:%M:%S").isoformat()
+        self.dataset.time_coverage_end = to_isoformat(self.times[-1])
 
     def create_specific_dimensions(self):
         """
@@ -242,46 +359,42 @@ class BaseNetCDF:
 
     def create_netcdf(self):
         """
-        Method to create the netCDF dataset
+        Method to create the netCDF dataset, or when appending, to add the new records to each variable.
         """
-        # Create the time dimension - with unlimited length
-        self.dataset.createDimension("time", None)
-        # Create the latitude dimension - with length 1 as stationary
-        self.dataset.createDimension("latitude", 1)
-        # Create the longitude dimension - with length 1 as stationary
-        self.dataset.createDimension("longitude", 1)
+        if not self.append:
+            # Create the time dimension - with unlimited length
+            self.dataset.createDimension("time", None)
+            # Create the latitude dimension - with length 1 as stationary
+            self.dataset.createDimension("latitude", 1)
+            # Create the longitude dimension - with length 1 as stationary
+            self.dataset.createDimension("longitude", 1)
 
         # create basic variables
         self.create_time_variable()
-        self.create_lat_variable()
-        self.create_lon_variable()
+        if not self.append:
+            self.create_lat_variable()
+            self.create_lon_variable()
 
         # create other variables e.g. year of day
-        datetimes = self.times_as_datetimes(self.times)
+        fields = calendar_fields(self.times)
         # day of year
-        doy_vals = [t.timetuple().tm_yday for t in datetimes]
-        self.create_time_related_variable("day_of_year", np.float32, doy_vals, "Day of Year")
+        self.create_time_related_variable("day_of_year", np.float32, fields['day_of_year'], "Day of Year")
         # year
-        year_vals = [t.year for t in datetimes]
-        self.create_time_related_variable("year", np.int32, year_vals, "Year")
+        self.create_time_related_variable("year", np.int32, fields['year'], "Year")
         # month
-        month_vals = [t.month for t in datetimes]
-        self.create_time_related_variable("month", np.int32, month_vals, "Month")
+        self.create_time_related_variable("month", np.int32, fields['month'], "Month")
         # day
-        day_vals = [t.day for t in datetimes]
-        self.create_time_related_variable("day", np.int32, day_vals, "Day")
+        self.create_time_related_variable("day", np.int32, fields['day'], "Day")
         # hour
-        hour_vals = [t.hour for t in datetimes]
-        self.create_time_related_variable("hour", np.int32, hour_vals, "Hour")
+        self.create_time_related_variable("hour", np.int32, fields['hour'], "Hour")
         # minute
-        minute_vals = [t.minute for t in datetimes]
-        self.create_time_related_variable("minute", np.int32, minute_vals, "Minute")
+        self.create_time_related_variable("minute", np.int32, fields['minute'], "Minute")
         # second
-        second_vals = [t.second for t in datetimes]
-        self.create_time_related_variable("second", np.float32, second_vals, "Second")
+        self.create_time_related_variable("second", np.float32, fields['second'], "Second")
 
         # create specific dimensions and variables
-        self.create_specific_dimensions()
+        if not self.append:
+            self.create_specific_dimensions()
         self.create_specific_variables()
 
         # set global attributes
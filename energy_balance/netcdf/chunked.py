@@ -0,0 +1,59 @@
+from energy_balance import get_config
+
+
+def get_max_memory(config=None):
+    """
+    Get the memory limit for quality controlling one chunk of input files, from max_memory in the config file.
+
+    :param config: (energy_balance.Config) Optional. The config to use, the config from the config files if not provided.
+    :returns: (int) The memory limit in bytes, or None if max_memory is empty (all files are processed at once).
+    """
+    config = config if config is not None else get_config()
+    max_memory = config['common'].get('max_memory', '').strip()
+    if not max_memory:
+        return None
+    return int(float(max_memory) * 1024 * 1024)
+
+
+def process_in_chunks(qc_class, date, frequency, max_memory, netcdf_class=None, csv_paths=None, config=None):
+    """
+    Quality control the input files for the date in chunks, writing each chunk to the output files before reading the next,
+    so that memory use is bounded by the chunk size rather than the length of the time period.
+    The first chunk creates the output files and later chunks are appended to them, so the files are the same as when
+    all the data is processed at once.
+
+    :param qc_class: (class) The QualityControl class for the data product e.g. SoilQualityControl
+    :param date: (datetime.datetime) The date for which to create the files.
+    :param frequency: (str) The frequency for files - daily or monthly.
+    :param max_memory: (int) Approximate maximum memory to use for each chunk, in bytes.
+    :param netcdf_class: (class) Optional. The BaseNetCDF class for the data product e.g. SoilNetCDF, if a netCDF file should be created.
+    :param csv_paths: (dict) Optional. The path at which to create the masked csv for each qc flag level, if any should be created.
+                      A level of None uses qc_flag_level from the config.
+    :param config: (energy_balance.Config) Optional. The config to use, the config from the config files if not provided.
+    :returns: None
+    """
+    config = config if config is not None else get_config()
+    written = False
+
+    for files in qc_class.chunk_input_files(date, frequency, max_memory, config):
+        try:
+            qc = qc_class(date, frequency, files=files, config=config)
+        except FileNotFoundError:
+            # no input files at all in this chunk
+            continue
+
+        if len(qc.times) == 0:
+            continue
+
+        # the csv is written first, as the netCDF classes convert values (e.g. to kelvin) in place
+        if csv_paths:
+            for qc_flag, csv_path in csv_paths.items():
+                qc.create_masked_csv(csv_path, append=written, qc_flag=qc_flag)
+
+        if netcdf_class:
+            netcdf_class(qc.df, qc.qc, date, frequency, times=qc.times, append=written, mask=qc.mask, config=config)
+
+        written = True
+
+    if not written:
+        raise FileNotFoundError
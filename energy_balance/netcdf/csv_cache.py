@@ -0,0 +1,199 @@
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from energy_balance import get_config
+
+ENTRY_SUFFIX = '.col'
+
+# cache directories that have had stale entries removed by this process
+_PRUNED = set()
+
+
+def get_cache_dir(config=None):
+    """
+    Get the directory of the csv cache from the config file.
+
+    :param config: (energy_balance.Config) Optional. The config to use, the config from the config files if not provided.
+    :returns: (str) The directory of the cache, or None if caching is turned off (csv_cache_path is empty).
+    """
+    config = config if config is not None else get_config()
+    cache_dir = config['common'].get('csv_cache_path', '').strip()
+    if not cache_dir:
+        return None
+    return os.path.expanduser(cache_dir)
+
+
+def _entry_path(cache_dir, path):
+    """ Get the path of the cache entry for the csv file at path. """
+    name = hashlib.sha1(os.path.abspath(path).encode()).hexdigest()
+    return os.path.join(cache_dir, f"{name}{ENTRY_SUFFIX}")
+
+
+def _key(path):
+    """ Get the (path, size, mtime) key for the csv file at path. """
+    stat = os.stat(path)
+    return os.path.abspath(path), stat.st_size, stat.st_mtime_ns
+
+
+def _read_header(f):
+    """ Read the header of an open cache entry, returns the header and the position at which the column data starts. """
+    header_length = int.from_bytes(f.read(8), 'little')
+    header = json.loads(f.read(header_length))
+    return header, 8 + header_length
+
+
+def _header_key(header):
+    """ Get the (path, size, mtime) key stored in the header of a cache entry. """
+    return header['path'], header['size'], header['mtime']
+
+
+def _load_entry(entry, key):
+    """
+    Load a dataframe from a cache entry, if the entry was made from the same version of the csv file.
+
+    :returns: (pandas.DataFrame) The cached dataframe, or None if the entry is missing or stale.
+    """
+    try:
+        with open(entry, 'rb') as f:
+            header, start = _read_header(f)
+            if _header_key(header) != key:
+                return None
+            buffer = f.read()
+
+    except (OSError, ValueError, KeyError):
+        return None
+
+    columns = {}
+    for col in header['columns']:
+        values = np.frombuffer(buffer, dtype=col['dtype'], count=header['rows'], offset=col['offset'])
+        if 'nulls_offset' in col:
+            # restore missing values in text columns
+            nulls = np.frombuffer(buffer, dtype=bool, count=header['rows'], offset=col['nulls_offset'])
+            values = values.astype(object)
+            values[nulls] = np.nan
+        columns[col['name']] = values
+
+    return pd.DataFrame(columns)
+
+
+def _save_entry(entry, key, df):
+    """
+    Save the columns of a dataframe as a cache entry: a json header followed by the data of each column, one after the other.
+    The entry is written to a temporary file and moved into place, so processes running in parallel never read a partly written entry.
+    """
+    path, size, mtime = key
+    header = {'path': path, 'size': size, 'mtime': mtime, 'rows': len(df), 'columns': []}
+    buffers = []
+    offset = 0
+
+    for name in df.columns:
+        values = df[name].to_numpy()
+        col = {'name': str(name)}
+
+        if values.dtype.kind not in 'biufcmM':
+            # text columns are stored as fixed width strings, with the position of any missing values
+            nulls = df[name].isna().to_numpy()
+            if nulls.any():
+                col['nulls_offset'] = offset
+                buffers.append(nulls.tobytes())
+                offset += nulls.nbytes
+            values = df[name].fillna('').astype(str).to_numpy(dtype=str)
+
+        values = np.ascontiguousarray(values)
+        col['dtype'] = values.dtype.str
+        col['offset'] = offset
+        buffers.append(values.tobytes())
+        offset += values.nbytes
+        header['columns'].append(col)
+
+    header_bytes = json.dumps(header).encode()
+
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(entry), suffix='.tmp')
+    except OSError:
+        return
+
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(len(header_bytes).to_bytes(8, 'little'))
+            f.write(header_bytes)
+            for buffer in buffers:
+                f.write(buffer)
+        os.replace(tmp_path, entry)
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def prune_cache(cache_dir):
+    """
+    Remove cache entries that are stale, i.e. where the csv file has been removed or changed since the entry was made.
+
+    :param cache_dir: (str) The directory of the cache.
+    :returns: (int) The number of entries removed.
+    """
+    removed = 0
+    if not os.path.isdir(cache_dir):
+        return removed
+
+    for name in os.listdir(cache_dir):
+        entry = os.path.join(cache_dir, name)
+        if not name.endswith(ENTRY_SUFFIX):
+            continue
+
+        try:
+            with open(entry, 'rb') as f:
+                path, size, mtime = _header_key(_read_header(f)[0])
+            stale = not os.path.isfile(path) or _key(path) != (path, size, mtime)
+        except (OSError, ValueError, KeyError):
+            stale = True
+
+        if stale:
+            try:
+                os.remove(entry)
+                removed += 1
+            except OSError:
+                pass
+
+    return removed
+
+
+def read_csv(path, config=None):
+    """
+    Read a csv file into a pandas dataframe, using the parsed columns from the cache if the file has
+    not changed (same path, size and modification time) since it was last read.
+    Falls back to pandas.read_csv if the cache is turned off or can not be written to.
+
+    :param path: (str) The path to the csv file.
+    :param config: (energy_balance.Config) Optional. The config to use, the config from the config files if not provided.
+    :returns: (pandas.DataFrame) The data from the csv file.
+    """
+    cache_dir = get_cache_dir(config)
+    if cache_dir is None:
+        return pd.read_csv(path)
+
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+    except OSError:
+        return pd.read_csv(path)
+
+    if cache_dir not in _PRUNED:
+        _PRUNED.add(cache_dir)
+        prune_cache(cache_dir)
+
+    key = _key(path)
+    entry = _entry_path(cache_dir, path)
+
+    df = _load_entry(entry, key)
+    if df is not None:
+        return df
+
+    # a missing or stale entry is replaced by the newly parsed file
+    df = pd.read_csv(path)
+    _save_entry(entry, key, df)
+    return df
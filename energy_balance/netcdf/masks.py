@@ -0,0 +1,139 @@
+import numpy as np
+
+# prefix of the names of the QC flag variables in the netCDF files
+QC_PREFIX = 'qc_flag_'
+
+# QC flag variables in the netCDF files that apply to every data variable with the same dimensions, as well as the variable's own flags
+COMMON_QC_VARIABLES = ['qc_flag_cleaning', 'qc_flag_body_temperature']
+
+
+class QCMask:
+
+    """
+    Masks the data using its QC flags, for any number of QC flag levels.
+    The flags are compared once for each level requested, and the data is never copied: each level is a MaskedView of the original dataframe.
+    This is created once by the quality control and can be passed on, e.g. to the netCDF classes, so the masking isn't repeated.
+
+    :param df: (pandas.DataFrame) The data, containing the date/time column and all the headers.
+    :param qc: (pandas.DataFrame) The QC flags, with a column named <header>_qc for each header and for each of common_headers.
+    :param headers: (list) The columns of df to mask.
+    :param dt_header: (str) The name of the date/time column in df.
+    :param common_headers: (list) Optional. Headers of QC flags that apply to all the columns e.g. 'cleaning' for the sensor cleaning flag.
+    """
+
+    def __init__(self, df, qc, headers, dt_header, common_headers=()):
+        self.df = df
+        self.headers = list(headers)
+        self.dt_header = dt_header
+        self.flags = qc[[h + '_qc' for h in self.headers]].to_numpy()
+
+        # a record is masked in all columns if any of the common flags are above the level, so only the highest is needed
+        common_headers = [h + '_qc' for h in common_headers]
+        self.common_flags = qc[common_headers].to_numpy().max(axis=1) if common_headers else None
+
+        self._masks = {}
+
+    def get_mask(self, qc_flag):
+        """
+        Get the mask for a QC flag level, compared only the first time each level is requested.
+
+        :param qc_flag: (int) Max value of qc to show i.e. 1 will show only 'good data', 2 will show good data and data marked with a flag of 2.
+        :returns: (numpy.ndarray) A boolean array, with a row for each record and a column for each header, True where the data is shown.
+        """
+        if qc_flag not in self._masks:
+            mask = self.flags <= qc_flag
+            if self.common_flags is not None:
+                mask &= (self.common_flags <= qc_flag)[:, None]
+            self._masks[qc_flag] = mask
+
+        return self._masks[qc_flag]
+
+    def view(self, qc_flag):
+        """
+        Get the data masked at a QC flag level.
+
+        :param qc_flag: (int) Max value of qc to show, see get_mask.
+        :returns: (MaskedView) The masked data.
+        """
+        return MaskedView(self, qc_flag)
+
+
+class MaskedView:
+
+    """
+    The data masked at one QC flag level. Values are only masked when a column, or the whole dataframe, is requested,
+    so the data is read as it is at that time, e.g. after the soil temperatures have been converted to kelvin.
+
+    :param qc_mask: (QCMask) The mask of the data.
+    :param qc_flag: (int) Max value of qc to show, see QCMask.get_mask.
+    """
+
+    def __init__(self, qc_mask, qc_flag):
+        self.qc_mask = qc_mask
+        self.qc_flag = qc_flag
+        self.mask = qc_mask.get_mask(qc_flag)
+
+    def __getitem__(self, header):
+        """
+        Get one column of the masked data.
+
+        :param header: (str) The name of the column.
+        :returns: (numpy.ndarray) The values of the column as floats, with nan where the data is masked.
+        """
+        i = self.qc_mask.headers.index(header)
+        return np.where(self.mask[:, i], self.qc_mask.df[header].to_numpy(dtype=np.float64), np.nan)
+
+    def to_frame(self):
+        """
+        Create a dataframe of the masked data, with the date/time column followed by the headers.
+
+        :returns: (pandas.DataFrame) The masked data, with nan where the data is masked.
+        """
+        df = self.qc_mask.df
+        masked = df[self.qc_mask.headers].where(self.mask)
+        masked.insert(0, self.qc_mask.dt_header, df[self.qc_mask.dt_header])
+        return masked
+
+    def to_csv(self, file_path, append=False):
+        """
+        Write the masked data to a csv file.
+
+        :param file_path: (str) The path of the csv file e.g. /path/to/my/file.csv
+        :param append: (bool) If True, add the rows to the end of an existing csv file, without the header. Default is False.
+        """
+        if append:
+            self.to_frame().to_csv(file_path, index=False, mode='a', header=False)
+        else:
+            self.to_frame().to_csv(file_path, index=False)
+
+
+def get_qc_pairs(dataset):
+    """
+    Find the quality control variable of each data variable in a netCDF file.
+    A variable's ancillary_variables attribute is used if it names a quality control variable. Otherwise the quality control variable
+    is found by name: qc_flag_<name> is paired with a variable whose name contains all the words of <name>, in any order, the quality
+    control variable matching the most words being used e.g. qc_flag_soil_heat_flux with downward_heat_flux_in_soil
+    and qc_flag_downwelling_shortwave with downwelling_shortwave_flux_in_air.
+
+    :param dataset: (netCDF4.Dataset) The open netCDF file.
+    :returns: (dict) The name of the quality control variable for each data variable that has one.
+    """
+    # common quality control variables can also be the own quality control variable of a variable e.g. radiometer_body_temperature
+    qc_names = [name for name in dataset.variables if name.startswith(QC_PREFIX)]
+
+    pairs = {}
+    for name, var in dataset.variables.items():
+        if name.startswith(QC_PREFIX):
+            continue
+
+        ancillary = [a for a in getattr(var, 'ancillary_variables', '').split() if a in qc_names]
+        if ancillary:
+            pairs[name] = ancillary[0]
+            continue
+
+        words = set(name.split('_'))
+        matches = [qc_name for qc_name in qc_names if set(qc_name[len(QC_PREFIX):].split('_')) <= words]
+        if matches:
+            pairs[name] = max(matches, key=lambda qc_name: len(qc_name.split('_')))
+
+    return pairs
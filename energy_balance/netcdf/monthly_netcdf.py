@@ -0,0 +1,154 @@
+import glob
+import os
+from datetime import datetime
+
+import numpy as np
+from netCDF4 import Dataset
+
+from .base_netcdf import BaseNetCDF
+
+# storage settings to carry over from the daily files when creating variables
+FILTER_SETTINGS = ('zlib', 'complevel', 'shuffle', 'fletcher32')
+
+
+def get_daily_files(date, data_product, config=None):
+    """
+    Get the daily netCDF files that exist for the month of the date provided, in date order.
+
+    :param date: (datetime.datetime) The date, only the year and month are taken into account.
+    :param data_product: (str) The data product e.g. soil or radiation.
+    :param config: (energy_balance.Config) Optional. The config to use, the config from the config files if not provided.
+    :returns: (list) The paths of the daily netCDF files.
+    """
+    daily_glob = BaseNetCDF.get_output_file(date.strftime("%Y%m") + "[0-3][0-9]", data_product, config)
+    return sorted(glob.glob(daily_glob))
+
+
+def copy_variable(dataset, var):
+    """
+    Create a variable in the dataset with the same type, dimensions, storage settings (compression and chunking) and attributes as var.
+
+    :param dataset: (netCDF4.Dataset) The dataset in which to create the variable.
+    :param var: (netCDF4.Variable) The variable to copy.
+    :returns: (netCDF4.Variable) The new variable, containing no data.
+    """
+    kwargs = {}
+    filters = var.filters() or {}
+    kwargs.update({k: v for k, v in filters.items() if k in FILTER_SETTINGS and v})
+
+    chunking = var.chunking()
+    if chunking != 'contiguous':
+        kwargs['chunksizes'] = chunking
+
+    if '_FillValue' in var.ncattrs():
+        kwargs['fill_value'] = var.getncattr('_FillValue')
+
+    new_var = dataset.createVariable(var.name, var.datatype, var.dimensions, **kwargs)
+    new_var.setncatts({k: var.getncattr(k) for k in var.ncattrs() if k != '_FillValue'})
+    return new_var
+
+
+def append_daily(dataset, daily_file, start, valid_ranges):
+    """
+    Append the records of a daily netCDF file to a monthly file along the time dimension.
+
+    :param dataset: (netCDF4.Dataset) The monthly file, open for writing without masking.
+    :param daily_file: (str) The path of the daily file.
+    :param start: (int) The index of the first record to write in the monthly file.
+    :param valid_ranges: (dict) The lists of valid_min and valid_max of each variable with a valid range, the daily file's values are added to them.
+    :returns: (tuple) The number of records appended, and the time_coverage_start and time_coverage_end of the daily file.
+    """
+    with Dataset(daily_file, "r") as daily:
+        daily.set_auto_maskandscale(False)
+
+        for name in dataset.variables:
+            if name not in daily.variables:
+                raise ValueError(f"Variable {name} is not in {daily_file}, so the daily files can't be joined")
+        for name in daily.variables:
+            if name not in dataset.variables:
+                raise ValueError(f"Variable {name} in {daily_file} is not in the first daily file, so the daily files can't be joined")
+
+        length = len(daily.dimensions['time'])
+        for name, var in daily.variables.items():
+            if 'time' in var.dimensions:
+                dataset[name][start:start + length] = var[:]
+            if name in valid_ranges:
+                if 'valid_min' not in var.ncattrs() or 'valid_max' not in var.ncattrs():
+                    raise ValueError(f"Variable {name} in {daily_file} has no valid_min or valid_max")
+                valid_ranges[name][0].append(var.valid_min)
+                valid_ranges[name][1].append(var.valid_max)
+
+        return length, (daily.time_coverage_start, daily.time_coverage_end)
+
+
+def create_monthly_from_daily(date, data_product, config=None):
+    """
+    Create a monthly netCDF file by joining the daily netCDF files for that month along the time dimension.
+    The quality control has already been done when the daily files were created, so it is not repeated.
+    Only valid_min/valid_max and the global attributes that depend on the data are recalculated.
+    The file is written to a temporary path and only moved to the output path once it is complete, so a failure never leaves a partial file.
+
+    :param date: (datetime.datetime) The date, only the year and month are taken into account.
+    :param data_product: (str) The data product e.g. soil or radiation.
+    :param config: (energy_balance.Config) Optional. The config to use, the config from the config files if not provided.
+    :returns: (str) The path of the monthly file created.
+    """
+    daily_files = get_daily_files(date, data_product, config)
+    if not daily_files:
+        print(f"No daily {data_product} files found for {date.strftime('%Y-%m')}, skipping")
+        raise FileNotFoundError
+
+    output_file = BaseNetCDF.get_output_file(date.strftime("%Y%m"), data_product, config)
+    print(output_file)
+    tmp_file = output_file + '.tmp'
+
+    try:
+        with Dataset(daily_files[0], "r") as first:
+            dataset = Dataset(tmp_file, "w", format=first.data_model)
+            try:
+                # copy the raw values, fill values included, without masking
+                first.set_auto_maskandscale(False)
+                dataset.set_auto_maskandscale(False)
+
+                for name, dim in first.dimensions.items():
+                    dataset.createDimension(name, None if dim.isunlimited() else len(dim))
+
+                valid_ranges = {}
+                for name, var in first.variables.items():
+                    new_var = copy_variable(dataset, var)
+                    if 'time' not in var.dimensions:
+                        new_var[:] = var[:]
+                    if 'valid_min' in var.ncattrs():
+                        valid_ranges[name] = ([], [])
+
+                dataset.setncatts({k: first.getncattr(k) for k in first.ncattrs()})
+            except Exception:
+                dataset.close()
+                raise
+
+        with dataset:
+            # append each day along the unlimited time dimension
+            start = 0
+            time_coverage = []
+            for daily_file in daily_files:
+                length, coverage = append_daily(dataset, daily_file, start, valid_ranges)
+                time_coverage.append(coverage)
+                start += length
+
+            # the valid range of the month is the range of the valid ranges of each day
+            for name, (mins, maxs) in valid_ranges.items():
+                var = dataset[name]
+                var.valid_min = np.nanmin(mins)
+                var.valid_max = np.nanmax(maxs)
+
+            dataset.last_revised_date = datetime.utcnow().isoformat()
+            dataset.time_coverage_start = time_coverage[0][0]
+            dataset.time_coverage_end = time_coverage[-1][1]
+
+        os.replace(tmp_file, output_file)
+    finally:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+
+    print(f"Dataset created at {output_file}")
+    return output_file
@@ -0,0 +1,162 @@
+import json
+import os
+from datetime import datetime
+
+from energy_balance import get_config
+from .masks import QC_PREFIX
+from .qc_rules import get_columns
+from .times import parse_period, in_periods
+
+# the QC flag variables in the netCDF files of each data product that can be overridden,
+# with the name of the columns they flag as used in the QC rules e.g. soil_temperature for soil_temperature_headers
+QC_VARIABLES = {
+    'soil': {
+        'qc_flag_soil_temperature': 'soil_temperature',
+        'qc_flag_soil_heat_flux': 'soil_heat_flux',
+        'qc_flag_soil_water_potential': 'soil_moisture',
+    },
+    'radiation': {
+        'qc_flag_downwelling_shortwave': 'swdn',
+        'qc_flag_upwelling_shortwave': 'swup',
+        'qc_flag_downwelling_longwave': 'lwdn',
+        'qc_flag_upwelling_longwave': 'lwup',
+        'qc_flag_body_temperature': 'body_temp',
+        'qc_flag_cleaning': 'cleaning',
+    },
+}
+
+# QC flags that are not of a column of the csv files, the name is the column of the QC dataframe
+DERIVED_QC = {'cleaning'}
+
+
+def get_qc_variable_name(data_product, variable):
+    """
+    Get the name of a QC flag variable that can be overridden.
+
+    :param data_product: (str) 'soil' or 'radiation'.
+    :param variable: (str) The QC flag variable, with or without the qc_flag_ prefix, e.g. qc_flag_soil_temperature or soil_temperature.
+    :returns: (str) The name of the QC flag variable e.g. qc_flag_soil_temperature
+    """
+    variables = QC_VARIABLES[data_product]
+    name = variable if variable.startswith(QC_PREFIX) else QC_PREFIX + variable
+    if name not in variables:
+        raise ValueError(f"{variable} is not a QC flag variable of the {data_product} files, must be one of {', '.join(variables)}")
+    return name
+
+
+def get_override_columns(override, config=None):
+    """
+    Get the columns of the QC dataframe flagged by an override.
+
+    :param override: (dict) The override, see create_override.
+    :param config: (energy_balance.Config) Optional. The config to use, the config from the config files if not provided.
+    :returns: (list) The names of the columns e.g. ['T107_1_qc']
+    """
+    config = config if config is not None else get_config()
+    data_product = override['data_product']
+    name = QC_VARIABLES[data_product][override['variable']]
+    columns = [name] if name in DERIVED_QC else get_columns(config[data_product], name)
+
+    index = override['index']
+    if index is not None:
+        if not 1 <= index <= len(columns):
+            raise ValueError(f"Index {index} of {override['variable']} is out of range, must be from 1 to {len(columns)}")
+        columns = [columns[index - 1]]
+    return [c + '_qc' for c in columns]
+
+
+def create_override(data_product, variable, flag, periods, index=None, comment=''):
+    """
+    Create an override of a QC flag, setting the flag for a variable (or one index of a soil variable) in some time periods.
+
+    :param data_product: (str) 'soil' or 'radiation'.
+    :param variable: (str) The QC flag variable, see get_qc_variable_name.
+    :param flag: (int) The flag to set.
+    :param periods: (list) The periods, each as start/end, inclusive, e.g. 2021-07-30T10:00:00/2021-07-30T12:30:00
+    :param index: (int) Optional. The index (sensor) to set the flag for, from 1, for the soil variables. Default is all indexes.
+    :param comment: (str) Optional. The reason for the override.
+    :returns: (dict) The override.
+    """
+    if index is not None and data_product != 'soil':
+        raise ValueError(f"An index can only be set for the soil variables, not {data_product}")
+    for period in periods:
+        parse_period(period)
+
+    return {
+        'data_product': data_product,
+        'variable': get_qc_variable_name(data_product, variable),
+        'index': index,
+        'flag': flag,
+        'periods': list(periods),
+        'comment': comment,
+        'created': datetime.utcnow().isoformat(timespec='seconds'),
+    }
+
+
+def get_log_path(config=None):
+    """
+    Get the path of the QC override log, from qc_override_log in the config.
+
+    :param config: (energy_balance.Config) Optional. The config to use, the config from the config files if not provided.
+    :returns: (str) The path, or None if qc_override_log is not set.
+    """
+    config = config if config is not None else get_config()
+    path = config['common'].get('qc_override_log', '').strip()
+    return os.path.expanduser(path) if path else None
+
+
+def log_override(override, config=None):
+    """
+    Add an override to the end of the QC override log, so it is applied again whenever the files are created from the csv files.
+
+    :param override: (dict) The override, see create_override.
+    :param config: (energy_balance.Config) Optional. The config to use, the config from the config files if not provided.
+    :returns: None
+    """
+    log_path = get_log_path(config)
+    if log_path is None:
+        raise ValueError("qc_override_log is not set in the config")
+
+    os.makedirs(os.path.dirname(log_path) or '.', exist_ok=True)
+    with open(log_path, 'a') as f:
+        f.write(json.dumps(override) + '\n')
+
+
+def read_overrides(data_product, config=None):
+    """
+    Read the overrides of a data product from the QC override log, in the order they were made.
+
+    :param data_product: (str) 'soil' or 'radiation'.
+    :param config: (energy_balance.Config) Optional. The config to use, the config from the config files if not provided.
+    :returns: (list) The overrides, see create_override. Empty if there is no log.
+    """
+    log_path = get_log_path(config)
+    if log_path is None or not os.path.isfile(log_path):
+        return []
+
+    with open(log_path) as f:
+        overrides = [json.loads(line) for line in f if line.strip()]
+    return [o for o in overrides if o['data_product'] == data_product]
+
+
+def apply_overrides(qc, times, overrides, config=None):
+    """
+    Apply overrides to the QC flags of some records, in order, so a later override of the same records takes precedence.
+
+    :param qc: (pandas.DataFrame) The QC flags, with a column named <header>_qc for each header. Modified in place.
+    :param times: (numpy.ndarray) The time of each row of qc in seconds since 1970-01-01T00:00:00.
+    :param overrides: (list) The overrides, see read_overrides.
+    :param config: (energy_balance.Config) Optional. The config to use, the config from the config files if not provided.
+    :returns: (int) The number of flags set.
+    """
+    changed = 0
+    for override in overrides:
+        selected = in_periods(times, [parse_period(p) for p in override['periods']])
+        if not selected.any():
+            continue
+
+        for column in get_override_columns(override, config):
+            qc.loc[selected, column] = override['flag']
+            changed += int(selected.sum())
+
+    return changed
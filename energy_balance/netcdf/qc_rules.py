@@ -0,0 +1,177 @@
+import re
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+# one condition of a rule e.g. "nan:2", "<-35:2", ">max_expected_temp:3" or "soil_temperature >70:2"
+CONDITION = re.compile(r"^(?:(?P<column>[A-Za-z_]\w*)\s+)?(?P<op>nan|<=|>=|<|>)\s*(?P<value>[^:\s]*)\s*:\s*(?P<flag>\d+)$")
+
+# the function for each operator, nan is handled separately as it takes no value
+OPERATORS = {
+    'nan': None,
+    '<': np.less,
+    '>': np.greater,
+    '<=': np.less_equal,
+    '>=': np.greater_equal,
+}
+
+
+def get_columns(settings, name):
+    """
+    Get the columns for a name used in the QC rules, from the data product section of the config.
+    e.g. 'soil_temperature' is found from soil_temperature_headers, 'lwdn' from lwdn_header.
+
+    :param settings: (mapping) The data product section of the config e.g. config['soil']
+    :param name: (str) The name used in the rules e.g. soil_temperature
+    :returns: (list) The column names, excluding any set to null.
+    """
+    for option in (f"{name}_headers", f"{name}_header"):
+        if option in settings:
+            columns = settings[option]
+            columns = [columns] if isinstance(columns, str) else list(columns)
+            return [c for c in columns if c != 'null']
+
+    raise ValueError(f"QC rules refer to {name}, but neither {name}_headers nor {name}_header is set in the config")
+
+
+def parse_rule(text):
+    """
+    Parse a QC rule into its conditions.
+
+    :param text: (str) The rule, a comma separated list of conditions e.g. "nan:2, <-35:2, >50:2"
+    :returns: (list) A (column, operator, value, flag) tuple for each condition. column is None if the condition is on the column itself.
+    """
+    conditions = []
+    for condition in text.split(','):
+        match = CONDITION.match(condition.strip())
+        if not match or (match['op'] == 'nan') == bool(match['value']):
+            raise ValueError(f"Invalid QC condition '{condition.strip()}' in rule '{text}'")
+        conditions.append((match['column'], match['op'], match['value'], int(match['flag'])))
+    return conditions
+
+
+class QCRules:
+
+    """
+    QC rules for all the columns of a data product, compiled so that they are applied to all columns at once.
+    For each column, the flag of the first condition met is used, or 1 (good data) if none are met.
+
+    Each condition sets a bit, at its position in the rule, in an array of bits for each column. Each operator is applied to all the
+    columns it is used on at the same position in one step. The flag for each combination of bits is then found from a table.
+
+    :param targets: (list) The columns to quality control.
+    :param sources: (list) The columns used in the conditions.
+    :param steps: (list) Each is (position, operator function, target indexes, source indexes, values), the operator function is None for nan.
+                  The indexes are into targets and sources, and values is an array with one value per target index.
+    :param table: (numpy.ndarray) The flag for each target column (rows) and combination of bits (columns).
+    """
+
+    def __init__(self, targets, sources, steps, table):
+        self.targets = targets
+        self.sources = sources
+        self.steps = steps
+        self.table = table
+
+    def apply(self, df):
+        """
+        Apply the rules to the data in df.
+
+        :param df: (pandas.DataFrame) The data, containing all the columns in self.sources.
+        :returns: (pandas.DataFrame) The QC flags, with a column named <column>_qc for each of the target columns.
+        """
+        # one row per column, so the values of each column are contiguous
+        data = np.ascontiguousarray(df[self.sources].to_numpy(dtype=np.float64).T)
+        nan = np.isnan(data)
+        bits = np.zeros((len(self.targets), len(df)), dtype=np.uint8 if self.table.shape[1] <= 256 else np.uint16)
+
+        for position, operator, target_index, source_index, values in self.steps:
+            if operator is None:
+                met = nan[source_index]
+            else:
+                met = operator(data[source_index], values[:, None])
+            bits[target_index] |= met.astype(bits.dtype) << position
+
+        qc = self.table[np.arange(len(self.targets))[:, None], bits]
+        return pd.DataFrame(qc.T, columns=[t + '_qc' for t in self.targets], index=df.index)
+
+
+@lru_cache(maxsize=None)
+def _compile_rules(rules, settings):
+    settings = dict(settings)
+    conditions = {}
+
+    for name, text in rules:
+        rule = parse_rule(text)
+        for i, target in enumerate(get_columns(settings, name)):
+            target_conditions = []
+            for column, op, value, flag in rule:
+                if column:
+                    # conditions on other columns use the column at the same index e.g. the soil temperature sensor at the same depth
+                    columns = get_columns(settings, column)
+                    column = columns[0] if len(columns) == 1 else columns[i]
+                else:
+                    column = target
+
+                if op == 'nan':
+                    value = np.nan
+                else:
+                    value = float(settings.get(value, value))
+
+                target_conditions.append((column, op, value, flag))
+            conditions[target] = target_conditions
+
+    targets = list(conditions)
+    sources = list(dict.fromkeys(c[0] for cs in conditions.values() for c in cs))
+    length = max((len(cs) for cs in conditions.values()), default=0)
+
+    if length > 16:
+        raise ValueError("Rules can have at most 16 conditions")
+
+    # group the conditions at each position by operator, so each operator is applied to all its columns at once
+    steps = []
+    for i in range(length):
+        by_operator = {}
+        for j, target in enumerate(targets):
+            if i < len(conditions[target]):
+                column, op, value, flag = conditions[target][i]
+                by_operator.setdefault(op, []).append((j, sources.index(column), value))
+
+        for op, entries in by_operator.items():
+            target_index, source_index, values = (np.array(a) for a in zip(*entries))
+            steps.append((i, OPERATORS[op], target_index, source_index, values.astype(np.float64)))
+
+    # the flag for each combination of conditions met is the flag of the first condition met, 1 if none are met
+    combinations = 2 ** length
+    table = np.ones((len(targets), combinations), dtype=np.int64)
+    for j, target in enumerate(targets):
+        for bits in range(1, combinations):
+            first = (bits & -bits).bit_length() - 1
+            if first < len(conditions[target]):
+                table[j, bits] = conditions[target][first][3]
+
+    return QCRules(targets, sources, steps, table)
+
+
+def compile_rules(config, section):
+    """
+    Compile the QC rules for a data product from the config. The rules are read from the section named <section>_qc.
+    Each option in that section is the name of a set of columns (e.g. soil_temperature for soil_temperature_headers)
+    and its value is a comma separated list of conditions, see the config documentation.
+    Rules are only compiled once for the same settings.
+
+    :param config: (energy_balance.Config) The config.
+    :param section: (str) The data product section of the config e.g. soil
+    :returns: (QCRules) The compiled rules.
+    """
+    rules_section = f"{section}_qc"
+    if rules_section not in config:
+        raise ValueError(f"No QC rules found, the section [{rules_section}] is missing from the config")
+
+    rules = tuple(config[rules_section].items())
+    settings = tuple((k, v) for k, v in config[section].items() if isinstance(v, (str, int, float, tuple)))
+
+    try:
+        return _compile_rules(rules, settings)
+    except ValueError as exc:
+        raise ValueError(f"Invalid QC rules in section [{rules_section}] of the config: {exc}") from exc
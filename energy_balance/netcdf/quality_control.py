@@ -5,8 +5,14 @@ __contact__ = 'eleanor.smith@stfc.ac.uk'
 import pandas as pd
 import numpy as np
 import os
+import glob
 from datetime import datetime
-from energy_balance import CONFIG
+from energy_balance import get_config
+from .times import to_epoch_seconds
+from .csv_cache import read_csv
+from .qc_rules import compile_rules
+from .qc_overrides import read_overrides, apply_overrides
+from .masks import QCMask
 
 # make this more general
 
@@ -14,54 +20,196 @@ class QualityControl:
 
     """
     Base class used for apply quality control to data in pandas data frames.
-    Creates a quality control dataframe and a masked dataframe (the initial data with a quality control mask applied) from input csv files.
-    The input files and various options are taken from a config file.
+    Creates a quality control dataframe and a mask (to view the initial data with a quality control mask applied, at any qc flag level) from input csv files.
+    The input files, QC rules and various options are taken from a config file.
 
-    Constant values are taken from the config file, excluding 'headers' which must be set in each specific implementation.
+    Constant values are taken from the config in the configure method, excluding 'config_section' and 'input_file_keys' which must be set in each specific implementation.
+    'headers' must be set in each specific implementation of configure. 'common_headers' can be set to the headers of QC flags that apply to all columns.
 
     :param date: (datetime.datetime) The date to do the QC for. If frequency is monthly, only the year and month will be taken into account.
     :param frequency: (str) 'daily' or 'monthly'. Determines whether one days worth of data, or one months worth is taken from the csv files to create the dataframes.
+    :param after: (int) Optional. If provided, only records after this time (in seconds since 1970-01-01T00:00:00) are quality controlled, e.g. to append new records to an existing file.
+    :param files: (dict) Optional. The input csv files to use for each entry in input_file_keys, e.g. one chunk from chunk_input_files. If not provided, all the files for the date are used.
+    :param config: (energy_balance.Config) Optional. The config to use. If not provided, the config from the config files (see energy_balance.get_config) is used.
     """
 
-    dt_header = CONFIG['common']['datetime_header']
     headers = 'UNDEFINED'
-    qc_flag_level = CONFIG['common']['qc_flag_level']
+    # headers of qc flags that mask all the columns e.g. sensor cleaning
+    common_headers = []
+    # section of the config file with the input file settings, and the names of the input file options in that section
+    config_section = 'UNDEFINED'
+    input_file_keys = 'UNDEFINED'
+    # approximate memory used, during the qc, for each byte of input csv file
+    memory_per_csv_byte = 4
 
-    def __init__(self, date, frequency):
+    def __init__(self, date, frequency, after=None, files=None, config=None):
         self.date = date
         self.frequency = frequency
+        self.after = after
+        self.files = files
+        self.config = config if config is not None else get_config()
+        self.configure()
         self.execute_qc()
 
-    def prepare_date(self, input_date_format):
+    def configure(self):
         """
-        Prepares the input date format so it matches with the frequency requested.
+        Set the constant values used in the QC from self.config. Specific implementations should extend this to set self.headers.
+        """
+        self.dt_header = self.config['common']['datetime_header']
+        self.qc_flag_level = self.config['common']['qc_flag_level']
+        self.rules = compile_rules(self.config, self.config_section)
 
+    @staticmethod
+    def format_date(date, frequency, input_date_format):
+        """
+        Convert the date to a string matching the input date format and the frequency requested.
+
+        :param date: (datetime.datetime) The date to convert.
+        :param frequency: (str) 'daily' or 'monthly'.
         :param input_date_format: (str) The format in which the date is provided in the input csv files.
-        :returns: (str) The date now converted to string format.
+        :returns: (str) The date now converted to string format. For monthly, this includes a wildcard in place of the day.
         """
-        
-        if self.frequency == 'monthly' and 'd' in input_date_format:
+        if frequency == 'monthly' and 'd' in input_date_format:
             # remove day part from input date format
             input_date_format = input_date_format.replace('%d', '').rstrip('-/').lstrip('-/').replace('//', '/').replace('--', '-') + '*'
 
-        elif self.frequency == 'daily':
+        elif frequency == 'daily':
             if 'd' not in input_date_format:
                 raise ValueError(f'Input date format does not specify a day, so daily files can not be created.')
 
         else:
-            raise ValueError(f'Frequency {self.frequency} is not supported. Options are daily or monthly.')
+            raise ValueError(f'Frequency {frequency} is not supported. Options are daily or monthly.')
+
+        return date.strftime(input_date_format)
+
+    def prepare_date(self, input_date_format):
+        """
+        Prepares the input date format so it matches with the frequency requested.
+
+        :param input_date_format: (str) The format in which the date is provided in the input csv files.
+        :returns: (str) The date now converted to string format.
+        """
+        return self.format_date(self.date, self.frequency, input_date_format)
+
+    @classmethod
+    def get_input_files(cls, date, frequency, config=None):
+        """
+        Find the input csv files for the date and frequency, for each of the input_file_keys in the config file.
+
+        :param date: (datetime.datetime) The date to find files for.
+        :param frequency: (str) 'daily' or 'monthly'.
+        :param config: (energy_balance.Config) Optional. The config to use, the config from the config files if not provided.
+        :returns: (dict) The sorted list of file paths for each input file key.
+        """
+        settings = (config if config is not None else get_config())[cls.config_section]
+        date = cls.format_date(date, frequency, settings['input_date_format'])
+        input_file_path = os.path.expanduser(settings['input_file_path'])
+
+        return {key: sorted(glob.glob(os.path.join(input_file_path, settings[key].format(date=date))))
+                for key in cls.input_file_keys}
+
+    @classmethod
+    def chunk_input_files(cls, date, frequency, max_memory=None, config=None):
+        """
+        Split the input csv files for the date and frequency into chunks that can each be quality controlled within the memory limit.
+        The files for all input file keys from the same date in the file name are always kept in the same chunk,
+        and the chunks are in date order.
+
+        :param date: (datetime.datetime) The date to find files for.
+        :param frequency: (str) 'daily' or 'monthly'.
+        :param max_memory: (int) Approximate maximum memory to use for each chunk, in bytes. If None, all files are in one chunk.
+        :param config: (energy_balance.Config) Optional. The config to use, the config from the config files if not provided.
+        :returns: (list) A dictionary of file paths for each input file key (as for get_input_files) for each chunk.
+        """
+        config = config if config is not None else get_config()
+        files = cls.get_input_files(date, frequency, config)
+        if not max_memory:
+            return [files]
+
+        settings = config[cls.config_section]
+        input_file_path = os.path.expanduser(settings['input_file_path'])
+
+        # group the files by the date part of their file name
+        by_date = {}
+        for key, paths in files.items():
+            prefix, _, suffix = settings[key].partition('{date}')
+            for path in paths:
+                name = os.path.relpath(path, input_file_path)
+                if name.startswith(prefix) and name.endswith(suffix):
+                    name = name[len(prefix):len(name) - len(suffix)]
+                by_date.setdefault(name, {k: [] for k in files})[key].append(path)
+
+        chunks = []
+        chunk_memory = 0
+        for name in sorted(by_date):
+            group = by_date[name]
+            memory = sum(os.path.getsize(path) for paths in group.values() for path in paths) * cls.memory_per_csv_byte
+
+            if not chunks or chunk_memory + memory > max_memory:
+                chunks.append({k: [] for k in files})
+                chunk_memory = 0
 
-        date = self.date.strftime(input_date_format)
-        return date
+            for key, paths in group.items():
+                chunks[-1][key].extend(paths)
+            chunk_memory += memory
+
+        return chunks
+
+    def read_input_files(self):
+        """
+        Read the input csv files into one dataframe for each input file key.
+        Uses self.files if set, otherwise all files for self.date and self.frequency.
+        A key with no files gives an empty dataframe with the columns from get_input_columns. If no key has any files, FileNotFoundError is raised.
+
+        :returns: (dict) A pandas dataframe for each input file key.
+        """
+        files = self.files if self.files is not None else self.get_input_files(self.date, self.frequency, self.config)
+
+        if not any(files.values()):
+            date = self.prepare_date(self.config[self.config_section]['input_date_format'])
+            print(f"No files found for {date}, skipping")
+            raise FileNotFoundError
+
+        # a key with no files (e.g. a day missing from one table) has no records, so they are kept as missing when the tables are joined
+        return {key: pd.concat([read_csv(f, self.config) for f in paths], ignore_index=True) if paths
+                else pd.DataFrame(columns=self.get_input_columns(key))
+                for key, paths in files.items()}
+
+    def get_input_columns(self, key):
+        """
+        Class specific implementation to get the columns used from the input files of an input file key, with the date/time column first.
+
+        :param key: (str) The input file key e.g. soil_moisture_file
+        :returns: (list) The names of the columns.
+        """
+        raise NotImplementedError
 
     def create_dataframes(self):
         """
-        Class specific implementation to create pandas dataframe from input csv and empty QC dataframe other than column names.
-        Sets self._df and self._qc
+        Class specific implementation to create pandas dataframe from input csv.
+        Sets self._df and self._times, e.g. by finishing with a call to self.create_time_index()
         """
-        # set self._df and self._qc
+        # set self._df
         raise NotImplementedError
 
+    def create_time_index(self):
+        """
+        Parse the date/time column of self._df once, into seconds since 1970-01-01T00:00:00.
+        This is shared by the QC and the netCDF creation so the times are never parsed again.
+        Sets self._times
+        """
+        self._times = to_epoch_seconds(self._df[self.dt_header])
+
+    def select_new_records(self, after):
+        """
+        Keep only the records after the time provided in self._df and self._times.
+
+        :param after: (int) The time, in seconds since 1970-01-01T00:00:00, after which to keep records.
+        """
+        new = self._times > after
+        self._df = self._df[new].reset_index(drop=True)
+        self._times = self._times[new]
+
     def apply_qc(self, conditions, choices, col):
         """
         Generic method to apply QC to a column in a dataframe, new column is created in QC dataframe.
@@ -75,42 +223,65 @@ class QualityControl:
 
     def qc_variables(self):
         """
-        Class specific implementation to apply QC to all columns.
+        Apply the QC rules from the config to all columns in self.headers, at once.
+        Sets self._qc. Specific implementations can extend this with QC that can't be set in the rules, making use of apply_qc.
         """
-        # make use of apply_qc
-        raise NotImplementedError
+        qc = self.rules.apply(self._df)
+
+        missing = [h for h in self.headers if h + '_qc' not in qc.columns]
+        if missing:
+            raise ValueError(f"No QC rules in section [{self.config_section}_qc] of the config for columns: {', '.join(missing)}")
 
-    def create_masked_df(self, qc_flag):
+        self._qc = qc[[h + '_qc' for h in self.headers]]
+
+    def apply_overrides(self):
+        """
+        Apply the overrides of QC flags in the QC override log (qc_override_log in the config) for this data product to self._qc,
+        so flags set on existing netCDF files with override-qc are set again when the files are created from the csv files.
         """
-        Create masked pandas dataframe based on self._qc and the qc flag requested.
-        Sets self._df_masked.
+        overrides = read_overrides(self.config_section, self.config)
+        if overrides:
+            self._qc = self._qc.copy()
+            apply_overrides(self._qc, self._times, overrides, self.config)
 
-        :param qc_flag: (int) Max value of qc to show i.e. 1 will show only 'good data', 2 will show good data and data marked with a flag of 2.
+    def create_mask(self):
         """
-        self.mask = (self._qc <= qc_flag)
+        Create the mask from self._qc, from which the data can be viewed masked at any qc flag level.
+        Sets self.mask
+        """
+        self.mask = QCMask(self._df, self._qc, self.headers, self.dt_header, self.common_headers)
 
-        self._df_masked = pd.DataFrame(columns = [self.dt_header] + self.headers)
-        self._df_masked[self.dt_header] = self._df[self.dt_header]
+    def masked(self, qc_flag=None):
+        """
+        Get the data masked at a qc flag level, without copying it.
 
-        for col in self.headers:
-            mask_column = self.mask[col+'_qc']
-            self._df_masked[col] = self._df[col][mask_column]
+        :param qc_flag: (int) Optional. Max value of qc to show i.e. 1 will show only 'good data', 2 will show good data and data marked with a flag of 2.
+                        Default is qc_flag_level from the config.
+        :returns: (energy_balance.netcdf.masks.MaskedView) The masked data.
+        """
+        return self.mask.view(self.qc_flag_level if qc_flag is None else qc_flag)
 
     def execute_qc(self):
         """
-        Create the dataframes, apply the QC and create the masked dataframe.
+        Create the dataframes, apply the QC and any overrides, and create the mask.
         """
         self.create_dataframes()
+        if self.after is not None:
+            self.select_new_records(self.after)
         self.qc_variables()
-        self.create_masked_df(self.qc_flag_level)
+        self.apply_overrides()
+        self.create_mask()
 
-    def create_masked_csv(self, file_path):
+    def create_masked_csv(self, file_path, append=False, qc_flag=None):
         """
-        Create a csv file from the masked dataframe.
+        Create a csv file from the data masked at a qc flag level.
+        Call once for each level to create csv files for several levels from the same QC.
 
         :param file_path: (str) The path at which to create the csv file e.g. /path/to/my/file.csv
+        :param append: (bool) If True, add the rows to the end of an existing csv file, without the header. Default is False.
+        :param qc_flag: (int) Optional. Max value of qc to show, see masked. Default is qc_flag_level from the config.
         """
-        self._df_masked.to_csv(file_path, index=False)
+        self.masked(qc_flag).to_csv(file_path, append)
         self._masked_csv = file_path
 
     @property
@@ -118,10 +289,15 @@ class QualityControl:
         """ Returns the original dataframe created from the input csv files. All headers set in each class implementaiton of self.headers are included. """
         return self._df
 
+    @property
+    def times(self):
+        """ Returns the times of each row in self.df as an int64 array of seconds since 1970-01-01T00:00:00. """
+        return self._times
+
     @property
     def df_masked(self):
-        """ Returns the original dataframe masked following QC. """
-        return self._df_masked
+        """ Returns a copy of the original dataframe masked following QC, at qc_flag_level from the config. Use masked to avoid the copy or for other levels. """
+        return self.masked().to_frame()
 
     @property
     def qc(self):
@@ -5,23 +5,28 @@ __contact__ = 'eleanor.smith@stfc.ac.uk'
 import numpy as np
 from .base_netcdf import BaseNetCDF
 
-from energy_balance import CONFIG
-
 class RadiationNetCDF(BaseNetCDF):
 
-    lwdn_header = CONFIG['radiation']['lwdn_header']
-    lwup_header = CONFIG['radiation']['lwup_header']
-    swdn_header = CONFIG['radiation']['swdn_header']
-    swup_header = CONFIG['radiation']['swup_header']
-    body_temp_header = CONFIG['radiation']['body_temp_header']
-
     data_product = 'radiation'
 
-    def __init__(self, df, qc, date, frequency):
+    def configure(self):
+        """
+        RadiationNetCDF specific implementation to set the radiation headers from self.config.
+        """
+        super().configure()
+        settings = self.config['radiation']
+        self.lwdn_header = settings['lwdn_header']
+        self.lwup_header = settings['lwup_header']
+        self.swdn_header = settings['swdn_header']
+        self.swup_header = settings['swup_header']
+        self.body_temp_header = settings['body_temp_header']
+
         self.headers = [self.lwdn_header, self.lwup_header, self.swdn_header, self.swup_header]
+        # all variables are affected when the sensor is being cleaned or the body temperature is outside operational bounds
+        self.common_headers = ['cleaning']
         if not self.body_temp_header == 'null':
             self.headers.append(self.body_temp_header)
-        super().__init__(df, qc, date, frequency)
+            self.common_headers.append(self.body_temp_header)
 
     def create_specific_dimensions(self):
         """
@@ -2,112 +2,90 @@ __author__ = 'Elle Smith'
 __date__ = '09 Aug 2021'
 __contact__ = 'eleanor.smith@stfc.ac.uk'
 
-import numpy as np
-import pandas as pd
-import os
-import glob
-
 from .quality_control import QualityControl
-
-from energy_balance import CONFIG
+from .times import time_string_to_seconds, parse_time_window, parse_period, in_daily_windows, in_periods
 
 class RadiationQualityControl(QualityControl):
 
-    lwdn_header = CONFIG['radiation']['lwdn_header']
-    lwup_header = CONFIG['radiation']['lwup_header']
-    swdn_header = CONFIG['radiation']['swdn_header']
-    swup_header = CONFIG['radiation']['swup_header']
-    body_temp_header = CONFIG['radiation']['body_temp_header']
+    config_section = 'radiation'
+    input_file_keys = ['radiation_file']
+
+    def configure(self):
+        """
+        RadiationQualityControl specific implementation to set the radiation headers from self.config.
+        """
+        super().configure()
+        settings = self.config['radiation']
+        self.lwdn_header = settings['lwdn_header']
+        self.lwup_header = settings['lwup_header']
+        self.swdn_header = settings['swdn_header']
+        self.swup_header = settings['swup_header']
+        self.body_temp_header = settings['body_temp_header']
 
-    def __init__(self, date, frequency):
         self.headers = [self.lwdn_header, self.lwup_header, self.swdn_header, self.swup_header]
+        # all variables are affected when the sensor is being cleaned or the body temperature is outside operational bounds
+        self.common_headers = ['cleaning']
         if not self.body_temp_header == 'null':
             self.headers.append(self.body_temp_header)
-        super().__init__(date, frequency)
+            self.common_headers.append(self.body_temp_header)
 
-    def create_dataframes(self):
+        self.cleaning_windows, self.cleaning_periods = self.get_cleaning_times(settings)
+
+    def get_input_columns(self, key):
         """
-        RadiationQualityControl specific implementation to create pandas dataframe from input csvs and empty QC dataframe other than column names.
-        Sets self._df and self._qc
+        RadiationQualityControl specific implementation to get the columns used from the input files of an input file key.
+
+        :param key: (str) The input file key, radiation_file.
+        :returns: (list) The names of the columns, with the date/time column first.
         """
-        date = self.prepare_date(CONFIG['radiation']['input_date_format'])
-        input_file_path = CONFIG['radiation']['input_file_path']
-        
-        radiation_file = CONFIG['radiation']['radiation_file']
+        return [self.dt_header] + self.headers
 
-        full_input_glob = os.path.expanduser(os.path.join(input_file_path, radiation_file.format(date=date)))
-        try:
-            df_radiation = pd.concat([pd.read_csv(f) for f in glob.glob(full_input_glob)],ignore_index=True)
-        except ValueError:
-            print(f"No files found for {date} in {full_input_glob}, skipping")
-            raise FileNotFoundError
+    def create_dataframes(self):
+        """
+        RadiationQualityControl specific implementation to create pandas dataframe from input csvs.
+        Sets self._df
+        """
+        df_radiation = self.read_input_files()['radiation_file']
 
         # all data needed is selected using column headers
-        self._df = df_radiation[[self.dt_header] + self.headers]
+        self._df = df_radiation[self.get_input_columns('radiation_file')]
 
-        # np.select(conditions, choices, default='1')
-        self._qc = pd.DataFrame(columns = [h+ '_qc' for h in self.headers])
+        self.create_time_index()
 
-    def qc_variables(self):
+    @staticmethod
+    def get_cleaning_times(settings):
         """
-        RadiationQualityControl specific implementation to set QC conditions and flags and record in QC dataframe.
+        Get the times to qc as 'sensor being cleaned' from the radiation settings in the config.
+
+        :param settings: (mapping) The radiation section of the config.
+        :returns: (tuple) The daily windows as (start, end) seconds since midnight, from cleaning_time_lower/upper and cleaning_windows,
+                  and the one-off periods as (start, end) seconds since 1970-01-01T00:00:00, from cleaning_periods.
         """
-        # downwelling longwave
-        lwdn_conditions = [np.isnan(self._df[self.lwdn_header]), self._df[self.lwdn_header] < 0, self._df[self.lwdn_header] > 1000]
-        lwdn_choices = [2, 3, 4]
-        self.apply_qc(lwdn_conditions, lwdn_choices, self.lwdn_header)
-
-        # upwelling longwave
-        lwup_conditions = [np.isnan(self._df[self.lwup_header]), self._df[self.lwup_header] < 0, self._df[self.lwup_header] > 1000]
-        lwup_choices = [2, 3, 4]
-        self.apply_qc(lwup_conditions, lwup_choices, self.lwup_header)
-
-        # downwelling shortwave
-        swdn_conditions = [np.isnan(self._df[self.swdn_header]), self._df[self.swdn_header] < 0, self._df[self.swdn_header] > 2000]
-        swdn_choices = [2, 3, 4]
-        self.apply_qc(swdn_conditions, swdn_choices, self.swdn_header)
-
-        # upwelling shortwave
-        swup_conditions = [np.isnan(self._df[self.swup_header]), self._df[self.swup_header] < 0, self._df[self.swup_header] > 2000]
-        swup_choices = [2, 3, 4]
-        self.apply_qc(swup_conditions, swup_choices, self.swup_header)
-
-        # body temperature
-        if not self.body_temp_header == 'null':
-            body_temp_conditions = [np.isnan(self._df[self.body_temp_header]), self._df[self.body_temp_header] < -233.15, self._df[self.body_temp_header] > 353.15]
-            body_temp_choices = [2, 2, 2]
-            self.apply_qc(lwdn_conditions, lwdn_choices, self.body_temp_header)
+        windows = []
+        if settings.get('cleaning_time_lower', '').strip():
+            windows.append((time_string_to_seconds(settings['cleaning_time_lower']), time_string_to_seconds(settings['cleaning_time_upper'])))
 
-        # sensor cleaning
-        # create using datetime column
-        self._df['timestamp'] = pd.to_datetime((self._df[self.dt_header]))
+        try:
+            windows += [parse_time_window(w) for w in settings.get('cleaning_windows', ())]
+        except ValueError:
+            raise ValueError(f"Invalid cleaning_windows {' '.join(settings['cleaning_windows'])}, each should be hh:mm:ss-hh:mm:ss")
 
-        cleaning_time_lower = CONFIG['radiation']['cleaning_time_lower']
-        cleaning_time_upper = CONFIG['radiation']['cleaning_time_upper']
+        try:
+            periods = [parse_period(p) for p in settings.get('cleaning_periods', ())]
+        except ValueError:
+            raise ValueError(f"Invalid cleaning_periods {' '.join(settings['cleaning_periods'])}, each should be YYYY-MM-DDThh:mm:ss/YYYY-MM-DDThh:mm:ss")
 
-        cleaning_conditions = [self._df['timestamp'].dt.strftime('%H:%M:%S').between(cleaning_time_lower,cleaning_time_upper)]
-        # cleaning_conditions = [self._df[self._df[self.dt_header].dt.time < cleaning_time_upper]]
-        cleaning_choices = [2]
-        self.apply_qc(cleaning_conditions, cleaning_choices, 'cleaning')
+        return windows, periods
 
-    def apply_cleaning_and_temp_masks(self):
+    def qc_variables(self):
         """
-        Apply cleaning QC and body temperature QC to all columns in the dataframe.
+        RadiationQualityControl specific implementation to apply the QC rules from the config and the sensor cleaning QC.
         """
-        # apply cleaning mask to all variables
-        for col in self.headers:
-            mask_column = self.mask['cleaning_qc']
-            self._df_masked[col] = self._df_masked[col][mask_column]
-
-        # apply temp mask to all variables
-        if not self.body_temp_header == 'null':
-            for col in self.headers:
-                mask_column = self.mask[self.body_temp_header+'_qc']
-                self._df_masked[col] = self._df_masked[col][mask_column]
+        # radiation and body temperature, from the rules in the config
+        super().qc_variables()
 
-    def create_masked_df(self, qc_flag):
-        """
-        RadiationQualityControl specific implementation to create the masked dataframe.
-        """
-        super().create_masked_df(qc_flag)
-        self.apply_cleaning_and_temp_masks()
+        # sensor cleaning, in any of the daily windows or one-off periods (inclusive), from the parsed times
+        cleaning = in_daily_windows(self._times, self.cleaning_windows) | in_periods(self._times, self.cleaning_periods)
+        cleaning_conditions = [cleaning]
+        cleaning_choices = [2]
+        self.apply_qc(cleaning_conditions, cleaning_choices, 'cleaning')
@@ -3,7 +3,6 @@ __date__ = '09 Aug 2021'
 __contact__ = 'eleanor.smith@stfc.ac.uk'
 
 import numpy as np
-from energy_balance import CONFIG
 from .base_netcdf import BaseNetCDF
 
 
@@ -15,12 +14,18 @@ class SoilNetCDF(BaseNetCDF):
 
     """
 
-    soil_moisture_headers = CONFIG['soil']['soil_moisture_headers']
-    soil_temperature_headers = CONFIG['soil']['soil_temperature_headers']
-    soil_heat_flux_headers = CONFIG['soil']['soil_heat_flux_headers']
-    headers = soil_moisture_headers + soil_temperature_headers + soil_heat_flux_headers
     data_product = 'soil'
-    index_length = CONFIG['soil']['index_length']
+
+    def configure(self):
+        """
+        SoilNetCDF specific implementation to set the soil headers and number of sensors from self.config.
+        """
+        super().configure()
+        self.soil_moisture_headers = list(self.config['soil']['soil_moisture_headers'])
+        self.soil_temperature_headers = list(self.config['soil']['soil_temperature_headers'])
+        self.soil_heat_flux_headers = list(self.config['soil']['soil_heat_flux_headers'])
+        self.headers = self.soil_moisture_headers + self.soil_temperature_headers + self.soil_heat_flux_headers
+        self.index_length = self.config['soil']['index_length']
 
     @staticmethod
     def convert_temps_to_kelvin(temps):
@@ -52,21 +57,20 @@ class SoilNetCDF(BaseNetCDF):
         :param kwargs: (dict) Dictionary of attributes {'attr_name': 'attr_value'} to set on the variable e.g. {'standard_name': 'soil_temperature'}
 
         """
-        var = self.dataset.createVariable(name, data_type, ("time","index"), fill_value=-1e+20)
+        var = self.get_variable(name, data_type, ("time","index"), fill_value=-1e+20, **self.get_storage_options(("time","index")))
 
         # get the values
         values = np.transpose(np.array([self.df[headers[n]] for n in range(self.index_length)]))
 
         # convert any nan values to fill values
         values[np.isnan(values)] = self.fill_value
-        var[:] = values
+        self.write_values(var, values)
 
         # mask the data according to the qc
         var_masked = np.transpose(np.array([self.df_masked[headers[n]].astype(data_type) for n in range(self.index_length)]))
         
         # Set variable attributes
-        var.valid_min = np.nanmin(var_masked) # get from valid values
-        var.valid_max = np.nanmax(var_masked)
+        self.set_valid_range(var, var_masked) # get from valid values
 
         for k, v in kwargs.items():
             setattr(var, k, v)
@@ -76,13 +80,10 @@ class SoilNetCDF(BaseNetCDF):
         Create soil temperature variable on the netCDF dataset.
         """
         # Create the soil temp variable - convert to kelvin
+        # the masked values are read from self.df when written, so are converted too
         for col in self.soil_temperature_headers:
             self.df[col] = self.convert_temps_to_kelvin(self.df[col])
 
-        # convert the masked values to kelvin    
-        for col in self.soil_temperature_headers:
-            self.df_masked[col] = self.convert_temps_to_kelvin(self.df_masked[col])
-
         attrs = {"cell_methods": "time:mean",
                  "long_name": "Soil Temperature",
                  "units": "K",
@@ -125,9 +126,9 @@ class SoilNetCDF(BaseNetCDF):
         :param kwargs: (dict) Dictionary of attributes {'attr_name': 'attr_value'} to set on the variable e.g. {'standard_name': 'soil_temperature'}
 
         """
-        var = self.dataset.createVariable(name, np.byte, ("time","index"))
+        var = self.get_variable(name, np.byte, ("time","index"), **self.get_storage_options(("time","index"), qc=True))
         qc_headers = [h + '_qc' for h in headers]
-        var[:] = np.transpose(np.array([self.qc[qc_headers[n]] for n in range(self.index_length)]))
+        self.write_values(var, np.transpose(np.array([self.qc[qc_headers[n]] for n in range(self.index_length)])))
         var.units = "1"
         for k, v in kwargs.items():
             setattr(var, k, v)
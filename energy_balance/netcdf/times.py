@@ -0,0 +1,156 @@
+import numpy as np
+import pandas as pd
+
+# format of the date/time column in the logger csv files
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+SECONDS_PER_DAY = 86400
+NANOSECONDS_PER_SECOND = 10**9
+
+
+def to_epoch_seconds(times):
+    """
+    Convert times from strings to total seconds since 1970-01-01T00:00:00 in one vectorised pass.
+
+    :param times: (sequence) Times to convert, in format Y-m-d H:M:S.
+    :returns: (numpy.ndarray) int64 array of seconds since 1970-01-01T00:00:00.
+    """
+    datetimes = pd.to_datetime(pd.Series(times, dtype=object), format=DATETIME_FORMAT)
+    return datetimes.to_numpy().astype('datetime64[s]').astype(np.int64)
+
+
+def to_epoch_nanoseconds(times):
+    """
+    Convert times from strings to total nanoseconds since 1970-01-01T00:00:00, keeping any fraction of a second.
+
+    :param times: (sequence) Times to convert, in ISO 8601 format e.g. 2021-07-30 00:05:00 or 2021-07-30 00:05:00.25
+    :returns: (numpy.ndarray) int64 array of nanoseconds since 1970-01-01T00:00:00.
+    """
+    datetimes = pd.to_datetime(pd.Series(times, dtype=object), format='ISO8601')
+    return datetimes.to_numpy().astype('datetime64[ns]').astype(np.int64)
+
+
+def to_isoformat(epoch_second):
+    """
+    Convert a single time in seconds since 1970-01-01T00:00:00 to an ISO 8601 string.
+
+    :param epoch_second: (int) Seconds since 1970-01-01T00:00:00.
+    :returns: (str) The time in ISO 8601 format e.g. 2021-07-30T00:00:00
+    """
+    return str(np.datetime64(int(epoch_second), 's'))
+
+
+def seconds_of_day(epoch):
+    """
+    Get the number of seconds since midnight for each time.
+
+    :param epoch: (numpy.ndarray) Times in seconds since 1970-01-01T00:00:00.
+    :returns: (numpy.ndarray) int64 array of seconds since midnight.
+    """
+    return np.asarray(epoch, dtype=np.int64) % SECONDS_PER_DAY
+
+
+def time_string_to_seconds(time_string):
+    """
+    Convert a time of day string to seconds since midnight.
+
+    :param time_string: (str) Time of day in format H:M:S e.g. 05:55:00
+    :returns: (int) Seconds since midnight.
+    """
+    hours, minutes, seconds = (int(t) for t in time_string.split(':'))
+    return hours * 3600 + minutes * 60 + seconds
+
+
+def calendar_fields(epoch):
+    """
+    Derive the calendar fields used for the time related netCDF variables.
+
+    :param epoch: (numpy.ndarray) Times in seconds since 1970-01-01T00:00:00.
+    :returns: (dict) Arrays for 'day_of_year', 'year', 'month', 'day', 'hour', 'minute' and 'second'.
+    """
+    datetimes = np.asarray(epoch, dtype=np.int64).astype('datetime64[s]')
+    days = datetimes.astype('datetime64[D]')
+    months = datetimes.astype('datetime64[M]')
+    years = datetimes.astype('datetime64[Y]')
+    sod = seconds_of_day(epoch)
+
+    return {
+        'day_of_year': (days - years.astype('datetime64[D]')).astype(np.int64) + 1,
+        'year': years.astype(np.int64) + 1970,
+        'month': months.astype(np.int64) % 12 + 1,
+        'day': (days - months.astype('datetime64[D]')).astype(np.int64) + 1,
+        'hour': sod // 3600,
+        'minute': sod % 3600 // 60,
+        'second': sod % 60,
+    }
+
+
+def parse_time_window(window):
+    """
+    Parse a daily time window.
+
+    :param window: (str) The start and end times of day, inclusive, in format H:M:S-H:M:S e.g. 05:55:00-06:05:00
+    :returns: (tuple) The start and end as seconds since midnight.
+    """
+    lower, _, upper = window.partition('-')
+    lower, upper = time_string_to_seconds(lower), time_string_to_seconds(upper)
+
+    if not (0 <= lower < SECONDS_PER_DAY and 0 <= upper < SECONDS_PER_DAY):
+        raise ValueError(f"Times in window {window} must be between 00:00:00 and 23:59:59")
+    return lower, upper
+
+
+def parse_period(period):
+    """
+    Parse a period between two dates/times.
+
+    :param period: (str) The start and end, inclusive, in ISO 8601 format separated by / e.g. 2021-07-30T10:00:00/2021-07-30T12:30:00
+    :returns: (tuple) The start and end as seconds since 1970-01-01T00:00:00.
+    """
+    start, _, end = period.partition('/')
+    start, end = (np.datetime64(t.strip(), 's') for t in (start, end))
+
+    if np.isnat(start) or np.isnat(end):
+        raise ValueError(f"Period {period} must have a start and an end")
+    return int(start.astype(np.int64)), int(end.astype(np.int64))
+
+
+def in_daily_windows(epoch, windows):
+    """
+    Find which times are in any of the daily time windows.
+    A window can cross midnight e.g. 23:55:00-00:05:00. Each second of the day is looked up in a table, so any number of windows takes one pass.
+
+    :param epoch: (numpy.ndarray) Times in seconds since 1970-01-01T00:00:00.
+    :param windows: (list) The (start, end) of each window in seconds since midnight, inclusive, e.g. from parse_time_window.
+    :returns: (numpy.ndarray) Boolean array, True where the time is in a window.
+    """
+    in_window = np.zeros(SECONDS_PER_DAY, dtype=bool)
+    for lower, upper in windows:
+        if lower <= upper:
+            in_window[lower:upper + 1] = True
+        else:
+            in_window[lower:] = True
+            in_window[:upper + 1] = True
+
+    return in_window[seconds_of_day(epoch)]
+
+
+def in_periods(epoch, periods):
+    """
+    Find which times are in any of the periods.
+
+    :param epoch: (numpy.ndarray) Times in seconds since 1970-01-01T00:00:00.
+    :param periods: (list) The (start, end) of each period in seconds since 1970-01-01T00:00:00, inclusive, e.g. from parse_period.
+    :returns: (numpy.ndarray) Boolean array, True where the time is in a period.
+    """
+    epoch = np.asarray(epoch, dtype=np.int64)
+    if not periods:
+        return np.zeros(len(epoch), dtype=bool)
+
+    periods = sorted(periods)
+    starts = np.array([start for start, _ in periods], dtype=np.int64)
+    # the latest end of any period started so far, so overlapping periods are handled
+    ends = np.maximum.accumulate(np.array([end for _, end in periods], dtype=np.int64))
+
+    # the last period starting at or before each time
+    i = np.searchsorted(starts, epoch, side='right') - 1
+    return (i >= 0) & (epoch <= ends[np.maximum(i, 0)])
@@ -5,11 +5,17 @@ __date__ = '22  Jul 2021'
 __contact__ = 'eleanor.smith@stfc.ac.uk'
 
 import os
-from datetime import datetime
-import mysql.connector
+import csv
+from datetime import datetime, timedelta
 import argparse
-import subprocess
-from energy_balance import CONFIG
+from energy_balance import get_config
+from energy_balance.logger.csv_files import NULL_VALUES, get_csv_path, get_last_time
+from energy_balance.logger.rollups import Rollups, create_rollup_tables
+from energy_balance.logger.sinks import get_insert_query, create_state_table, get_high_water_mark, set_high_water_mark
+
+# number of rows inserted with each query
+BATCH_SIZE = 1000
+
 
 def arg_parse():
     parser = argparse.ArgumentParser()
@@ -32,55 +38,189 @@ def arg_parse():
         required=True,
         help="Database name")
 
+    parser.add_argument("-m",
+        "--mode",
+        type=str,
+        required=False,
+        default='insert',
+        choices=['insert', 'upsert'],
+        help="insert adds the new rows. upsert replaces any row with the same unique key (e.g. a primary key on Datetime) instead, "
+             "so rows can be loaded again safely, the column names of the MySQL tables must match the csv headers. Default is insert.")
+
+    parser.add_argument("-b",
+        "--batch-size",
+        type=int,
+        required=False,
+        default=BATCH_SIZE,
+        help=f"The number of rows inserted with each query. Default is {BATCH_SIZE}.")
+
     return parser.parse_args()
 
 
+def read_new_rows(dir_path, table, dt_header, after, date):
+    """
+    Read the rows of a logger table's daily csv files that are after a time, up to and including the file for date.
+    Files from the date of after onwards are read, so a table that is behind (e.g. after midnight) catches up.
+    Files with no records after the time are skipped without being read.
+
+    :param dir_path: (str) The path to the top level directory in which the csv files and folders were created.
+    :param table: (str) The name of the logger table.
+    :param dt_header: (str) The name of the date/time column.
+    :param after: (datetime.datetime) The time after which to read rows. If None, all rows in the file for date are read.
+    :param date: (datetime.date) The date of the last file to read.
+    :returns: (generator) The header of each file, as a list, followed by its new rows as (time, list of values) tuples.
+    """
+    day = after.date() if after is not None else date
+
+    while day <= date:
+        csv_path = get_csv_path(dir_path, table, day)
+        last = get_last_time(csv_path, dt_header)
+
+        if last is not None and (after is None or last > after):
+            with open(csv_path, newline='') as f:
+                reader = csv.reader(f)
+                header = next(reader)
+                yield header
+
+                i = header.index(dt_header)
+                for row in reader:
+                    if not row:
+                        continue
+                    time = datetime.fromisoformat(row[i])
+                    if after is None or time > after:
+                        yield time, [None if v in NULL_VALUES else v for v in row]
 
-def insert_into_tables(user, password, database, dir_path):
+        day += timedelta(days=1)
+
+
+def load_table(cnx, table, name, dir_path, dt_header, date, mode='insert', batch_size=BATCH_SIZE, rollups=None):
+    """
+    Insert the rows of a logger table newer than the last loaded into its table in the database, in batches.
+    The rows, the updates to the rollup tables and the new high water mark are committed once, together, so if loading fails
+    nothing is committed and the next run loads the same rows again.
+
+    :param cnx: The open database connection.
+    :param table: (str) The name of the logger table.
+    :param name: (str) The name of the table in the database.
+    :param dir_path: (str) The path to the top level directory in which the csv files and folders were created.
+    :param dt_header: (str) The name of the date/time column.
+    :param date: (datetime.date) The date of the last file to load.
+    :param mode: (str) 'insert' or 'upsert', see energy_balance.logger.sinks.get_insert_query. Default is 'insert'.
+    :param batch_size: (int) The number of rows inserted with each query. Default is BATCH_SIZE.
+    :param rollups: (energy_balance.logger.rollups.Rollups) Optional. The rollups of the table, updated from the rows loaded.
+    :returns: (int) The number of rows loaded.
+    """
+    cur = cnx.cursor()
+    try:
+        after = get_high_water_mark(cur, name, dt_header)
+
+        loaded = 0
+        last_loaded = None
+        query = None
+        header = None
+        batch = []
+
+        for item in read_new_rows(dir_path, table, dt_header, after, date):
+            if isinstance(item, list):
+                # the header of the next file
+                if batch:
+                    cur.executemany(query, batch)
+                    batch = []
+                header = item
+                query = get_insert_query(name, header, mode)
+                continue
+
+            last_loaded, values = item
+            batch.append(values)
+            loaded += 1
+
+            if rollups is not None:
+                rollups.add(last_loaded, header, values)
+
+            if len(batch) == batch_size:
+                cur.executemany(query, batch)
+                batch = []
+
+        if batch:
+            cur.executemany(query, batch)
+
+        if last_loaded is not None:
+            if rollups is not None:
+                rollups.write(cur)
+            set_high_water_mark(cur, name, last_loaded)
+            cnx.commit()
+    except Exception:
+        cnx.rollback()
+        raise
+    finally:
+        cur.close()
+
+    return loaded
+
+
+def insert_into_tables(user, password, database, dir_path, date=None, connection=None, config=None, mode='insert', batch_size=BATCH_SIZE):
     """
     Gets data from the csv files found in the specified directory path and inserts it into MySQL tables.
+    Only rows newer than those already loaded are inserted: the time of the last row loaded into each table (the high water mark)
+    is kept in the database in the table energy_balance_load_state, so this is safe to run every few minutes.
+    The rollup tables of each table (e.g. soil_temp_hourly, for each of rollup_periods in the config) are created if needed
+    and updated from the new rows, see energy_balance.logger.rollups.Rollups.
+    All the tables are loaded over one connection, and each table is committed once.
     The MySQL tables must have been created proir to running this.
     The default names used to map the logger tables to MySQL tables are:
     {'Housekeeping': 'housekeeping', 'GPS_datetime': 'gps', 'SoilTemperature': 'soil_temp', 'SoilMoisture': 'soil_moisture', 'SoilHeatFlux': 'soil_heat_flux', 'Radiation': 'radiation'}
-    
+
     :param user: (str) The username for connecting to MySQL.
     :param password: (str) The password for connecting to MySQL.
     :param database: (str) The names of the database in which the tables exist.
     :param dir_path: (str) The path to the top level directory in which the csv files and folders were created.
-    :returns: None
+    :param date: (datetime.datetime) Optional. The date of the last csv files to insert. Default is today (utc).
+    :param connection: Optional. An open connection to use instead of connecting to MySQL, e.g. energy_balance.logger.simulated.SimulatedDatabase.
+    :param config: (energy_balance.Config) Optional. The config to use, the config from the config files if not provided.
+    :param mode: (str) 'insert' to add the new rows, or 'upsert' to replace any rows with the same unique key. Default is 'insert'.
+    :param batch_size: (int) The number of rows inserted with each query. Default is BATCH_SIZE.
+    :returns: (int) The number of tables that could not be loaded.
     """
-    # Connect to server
-    cnx = mysql.connector.connect(user=user, password=user, database=user, allow_local_infile=True)
-
-    # Get a cursor
-    cur = cnx.cursor()
-
-    logger_tables = CONFIG['common']['logger_tables']
-    mysql_tables = CONFIG['common']['mysql_tables']
+    if connection is None:
+        # imported here so that other commands (and --help) don't have to load it
+        import mysql.connector
+
+        # Connect to server
+        cnx = mysql.connector.connect(user=user, password=password, database=database)
+    else:
+        cnx = connection
+
+    config = config if config is not None else get_config()
+    logger_tables = config['common']['logger_tables']
+    mysql_tables = config['common']['mysql_tables']
+    dt_header = config['common']['datetime_header']
+    periods = config['common'].get('rollup_periods', ())
     tables = dict(zip(logger_tables, mysql_tables))
-    date = datetime.utcnow().strftime("%Y-%m-%d")
-
-    for table, name in tables.items():
-        datadir = os.path.join(dir_path, table)
-        latestfile = os.path.join(datadir, f"{table}_{date}.csv")
-        tempfile = os.path.join(datadir, "temp.csv")
-
-        # remove header and save as temp file
-        cmd = f"sed '1d' {latestfile} > {tempfile}"
-        subprocess.call(cmd, shell=True)
-
-        # Execute a query
-        cmd = f"LOAD DATA LOCAL INFILE '{tempfile}' INTO TABLE {name} COLUMNS TERMINATED BY ',' ;"
-        cur.execute(cmd)
-
-        # commit the change
+    date = (date or datetime.utcnow()).date()
+
+    failed = 0
+    try:
+        cur = cnx.cursor()
+        create_state_table(cur)
+        for name in tables.values():
+            create_rollup_tables(cur, name, periods)
+        cur.close()
         cnx.commit()
 
-        # remove temp file
-        os.remove(tempfile)
-
-    # close the connection
-    cnx.close()
+        for table, name in tables.items():
+            try:
+                rollups = Rollups(name, dt_header, periods, config) if periods else None
+                rows = load_table(cnx, table, name, dir_path, dt_header, date, mode, batch_size, rollups)
+                print(f"{rows} new rows were inserted into {name}")
+            except Exception as exc:
+                # carry on with the other tables, this one is loaded from where it stopped on the next run
+                print(f"Could not insert into {name}: {exc}")
+                failed += 1
+    finally:
+        # close the connection
+        cnx.close()
+
+    return failed
 
 def main():
     args = arg_parse()
@@ -88,10 +228,13 @@ def main():
     user = args.user
     password = args.password
     database = args.database
-    dir_path = os.path.expanduser(CONFIG['common']['logger_csv_path'])
+    dir_path = os.path.expanduser(get_config()['common']['logger_csv_path'])
 
-    insert_into_tables(user, password, database, dir_path)
-    print('Inserted data into MySQL tables')
+    failed = insert_into_tables(user, password, database, dir_path, mode=args.mode, batch_size=args.batch_size)
+    if failed:
+        print(f'Could not insert data into {failed} MySQL tables')
+    else:
+        print('Inserted data into MySQL tables')
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
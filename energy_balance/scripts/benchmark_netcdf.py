@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+from datetime import datetime
+from energy_balance import get_config
+
+# number of 5 minute records in each synthetic data set
+PERIODS = {
+    'month': 31 * 288,
+    'year': 365 * 288,
+}
+
+# storage settings to compare, (data_zlib, complevel, shuffle, chunk_size), used for both data and qc variables
+SETTINGS = {
+    'none': (False, 4, True, 0),
+    'chunk8928': (False, 4, True, 8928),
+    'zlib1': (True, 1, False, 0),
+    'zlib4': (True, 4, False, 0),
+    'zlib4_shuffle': (True, 4, True, 0),
+    'zlib9_shuffle': (True, 9, True, 0),
+    'zlib1_shuffle_chunk8928': (True, 1, True, 8928),
+    'zlib4_shuffle_chunk288': (True, 4, True, 288),
+    'zlib4_shuffle_chunk8928': (True, 4, True, 8928),
+}
+
+def arg_parse():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('-p', '--periods',
+                        type=str,
+                        nargs='+',
+                        required=False,
+                        default=list(PERIODS),
+                        choices=list(PERIODS),
+                        help="The lengths of synthetic data to benchmark, month and/or year. Default is both.")
+
+    parser.add_argument('-s', '--settings',
+                        type=str,
+                        nargs='+',
+                        required=False,
+                        default=list(SETTINGS),
+                        choices=list(SETTINGS),
+                        help="The storage settings to benchmark. Default is all.")
+
+    parser.add_argument('-r', '--repeats',
+                        type=int,
+                        required=False,
+                        default=3,
+                        help="The number of times to write and read each file, the fastest time is reported. Default is 3.")
+
+    parser.add_argument('-c', '--config',
+                        type=str,
+                        required=False,
+                        help="Path to a config file to use instead of the one set in the CONFIG environment variable. It is read on top of the default config file.")
+
+    return parser.parse_args()
+
+def create_synthetic_data(length, config, seed=0):
+    """
+    Create synthetic 5 minute soil data and quality control flags, in the form produced by SoilQualityControl.
+
+    :param length: (int) The number of records to create.
+    :param config: (energy_balance.Config) The config with the soil headers to use.
+    :param seed: (int) Seed for the random number generator, so each run uses the same data.
+    :returns: (tuple) The data dataframe, the qc dataframe and the times in seconds since 1970-01-01T00:00:00.
+    """
+    # imported here so that other commands (and --help) don't have to load them
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    times = pd.date_range('2021-01-01', periods=length, freq='5min')
+    hours = np.arange(length) / 12.
+    soil = config['soil']
+
+    df = pd.DataFrame({config['common']['datetime_header']: times.strftime('%Y-%m-%d %H:%M:%S')})
+    qc = pd.DataFrame()
+
+    for i in range(soil['index_length']):
+        # smooth, sensor-like signals with some noise and missing values
+        df[soil['soil_moisture_headers'][i]] = 40 + 10 * np.sin(hours / 240.) + rng.normal(0, 0.5, length)
+        df[soil['soil_temperature_headers'][i]] = 20 + 5 * np.sin(2 * np.pi * hours / 24.) + rng.normal(0, 0.1, length)
+        df[soil['soil_heat_flux_headers'][i]] = 10 * np.sin(2 * np.pi * hours / 24.) + rng.normal(0, 1, length)
+
+    for col in df.columns[1:]:
+        df.loc[rng.random(length) < 0.01, col] = np.nan
+        qc[col + '_qc'] = np.where(np.isnan(df[col]), 2, np.where(rng.random(length) < 0.05, 3, 1))
+
+    return df, qc, (times.asi8 // 10**9).astype(np.int64)
+
+def create_benchmark_config(config, setting, output_dir):
+    """
+    Create a config that writes netCDF files to output_dir using the storage setting provided.
+
+    :param config: (energy_balance.Config) The config to base the new config on.
+    :param setting: (tuple) The storage setting (zlib, complevel, shuffle, chunk_size).
+    :param output_dir: (str) The directory in which to write the netCDF file.
+    :returns: (energy_balance.Config) The new config.
+    """
+    storage = {}
+    for prefix in ('data', 'qc'):
+        storage.update(zip((f'{prefix}_zlib', f'{prefix}_complevel', f'{prefix}_shuffle', f'{prefix}_chunk_size'), setting))
+
+    return config.replace('netcdf', **storage).replace('common', netcdf_path=output_dir)
+
+def read_netcdf(file_path):
+    """
+    Read all the variables in a netCDF file into memory.
+
+    :param file_path: (str) The path of the netCDF file to read.
+    """
+    from netCDF4 import Dataset
+
+    dataset = Dataset(file_path, "r")
+    for var in dataset.variables.values():
+        var[:]
+    dataset.close()
+
+def benchmark(period, name, repeats, output_dir, config):
+    """
+    Time writing and reading a soil netCDF file of synthetic data with the storage setting provided.
+
+    :param period: (str) The length of synthetic data, a key of PERIODS.
+    :param name: (str) The name of the storage setting, a key of SETTINGS.
+    :param repeats: (int) The number of times to write and read the file, the fastest time is reported.
+    :param output_dir: (str) The directory in which to write the netCDF file.
+    :param config: (energy_balance.Config) The config to base the settings on.
+    :returns: (tuple) The write time (s), read time (s) and file size (MB).
+    """
+    from energy_balance.netcdf.soil_netcdf import SoilNetCDF
+
+    df, qc, times = create_synthetic_data(PERIODS[period], config)
+    config = create_benchmark_config(config, SETTINGS[name], output_dir)
+    date = datetime(2021, 1, 1)
+    file_path = SoilNetCDF.get_output_file(SoilNetCDF.convert_date_to_string(date, 'monthly'), SoilNetCDF.data_product, config)
+
+    def write():
+        # the data is converted in place (e.g. to kelvin), so use a new copy each time, and hide the output of SoilNetCDF
+        data = df.copy()
+        with contextlib.redirect_stdout(io.StringIO()):
+            SoilNetCDF(data, qc, date, 'monthly', times=times, config=config)
+
+    # write and read once without timing, so the first setting doesn't also pay for loading modules and opening the first files
+    write()
+    read_netcdf(file_path)
+
+    write_times = []
+    read_times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        write()
+        write_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        read_netcdf(file_path)
+        read_times.append(time.perf_counter() - start)
+
+    size = os.path.getsize(file_path) / 1024**2
+    os.remove(file_path)
+    return min(write_times), min(read_times), size
+
+def main():
+    args = arg_parse()
+    config = get_config(config_file=args.config)
+
+    rows = []
+    with tempfile.TemporaryDirectory() as output_dir:
+        for period in args.periods:
+            for name in args.settings:
+                write_time, read_time, size = benchmark(period, name, args.repeats, output_dir, config)
+                rows.append((period, name, write_time, read_time, size))
+
+    print(f"{'period':<8}{'setting':<26}{'write (s)':>10}{'read (s)':>10}{'size (MB)':>11}")
+    for period, name, write_time, read_time, size in rows:
+        print(f"{period:<8}{name:<26}{write_time:>10.3f}{read_time:>10.3f}{size:>11.2f}")
+
+if __name__ == '__main__':
+    main()
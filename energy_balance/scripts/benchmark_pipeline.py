@@ -0,0 +1,433 @@
+#!/usr/bin/env python
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from energy_balance import get_config
+
+# the data products that can be benchmarked, logger is the download from the logger and loading into MySQL
+PRODUCTS = ['soil', 'radiation', 'logger']
+
+# the stages timed for each data product, in the order they are run
+STAGES = {
+    'soil': ['create_dataframes', 'qc_variables', 'create_mask', 'create_masked_csv', 'create_netcdf', 'calculate_valid_min_max'],
+    'radiation': ['create_dataframes', 'qc_variables', 'create_mask', 'create_masked_csv', 'create_netcdf', 'calculate_valid_min_max'],
+    'logger': ['download', 'add_to_mysql'],
+}
+
+# the variable and qc variable used to benchmark calculate_valid_min_max
+VALID_MIN_MAX_VARIABLES = {
+    'soil': ('soil_temperature', 'qc_flag_soil_temperature'),
+    'radiation': ('downwelling_shortwave_flux_in_air', 'qc_flag_downwelling_shortwave'),
+}
+
+# the first day of the synthetic data, a month with 31 days
+START_DATE = datetime(2021, 7, 1)
+
+def arg_parse():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('-d', '--days',
+                        type=int,
+                        required=False,
+                        default=31,
+                        help="The number of days of synthetic data, from 1 to 31. A daily file is created for 1 day, otherwise a monthly file. Default is 31.")
+
+    parser.add_argument('-i', '--interval',
+                        type=int,
+                        required=False,
+                        default=300,
+                        help="The sampling interval of the synthetic data in seconds. Default is 300.")
+
+    parser.add_argument('-g', '--gap-rate',
+                        type=float,
+                        required=False,
+                        default=0.001,
+                        help="The fraction of records missing from each input table, at random. Default is 0.001.")
+
+    parser.add_argument('-n', '--nan-rate',
+                        type=float,
+                        required=False,
+                        default=0.01,
+                        help="The fraction of values that are nan in each column, at random. Default is 0.01.")
+
+    parser.add_argument('-p', '--products',
+                        type=str,
+                        nargs='+',
+                        required=False,
+                        default=PRODUCTS,
+                        choices=PRODUCTS,
+                        help="The data products to benchmark, logger is the download from a simulated logger and loading into a stand-in database. Default is all.")
+
+    parser.add_argument('-r', '--repeats',
+                        type=int,
+                        required=False,
+                        default=3,
+                        help="The number of times to run each stage, the fastest time is reported. Memory is measured in one more run. Default is 3.")
+
+    parser.add_argument('-o', '--output',
+                        type=str,
+                        required=False,
+                        help="Path of a json file to save the results to, to compare with later using --baseline.")
+
+    parser.add_argument('-b', '--baseline',
+                        type=str,
+                        required=False,
+                        help="Path of a json file of results saved with --output e.g. from another commit, to compare these results with.")
+
+    parser.add_argument('-c', '--config',
+                        type=str,
+                        required=False,
+                        help="Path to a config file to use instead of the one set in the CONFIG environment variable. It is read on top of the default config file.")
+
+    args = parser.parse_args()
+    if not 1 <= args.days <= 31:
+        parser.error("--days must be from 1 to 31")
+
+    return args
+
+def get_input_columns(data_product, config):
+    """
+    Get the columns of each input csv file of a data product, from the config.
+
+    :param data_product: (str) 'soil' or 'radiation'.
+    :param config: (energy_balance.Config) The config.
+    :returns: (dict) The list of data columns for each input file key e.g. {'soil_moisture_file': ['WP_kPa_1', ...], ...}
+    """
+    settings = config[data_product]
+
+    if data_product == 'soil':
+        return {f'{name}_file': list(settings[f'{name}_headers']) for name in ('soil_moisture', 'soil_temperature', 'soil_heat_flux')}
+
+    headers = [settings[h] for h in ('lwdn_header', 'lwup_header', 'swdn_header', 'swup_header', 'body_temp_header') if settings[h] != 'null']
+    return {'radiation_file': headers}
+
+def create_values(column, hours, rng):
+    """
+    Create realistic values for a column, with a daily cycle and noise, that mostly pass the default QC rules.
+
+    :param column: (str) The kind of column e.g. soil_temperature_file or lwdn_header.
+    :param hours: (numpy.ndarray) The time of each record in hours since the start.
+    :param rng: (numpy.random.Generator) The random number generator.
+    :returns: (numpy.ndarray) The values.
+    """
+    import numpy as np
+
+    day = np.sin(2 * np.pi * (hours - 9) / 24.)
+    noise = rng.normal(0, 1, len(hours))
+
+    if column == 'soil_moisture_file':
+        # kPa, drying slowly over weeks
+        return 20 + 10 * np.sin(hours / 240.) + 0.5 * noise
+    if column == 'soil_temperature_file':
+        # degrees C
+        return 23 + 3 * day + 0.1 * noise
+    if column == 'soil_heat_flux_file':
+        # W m-2
+        return 10 * day + noise
+    if column == 'swdn_header':
+        # W m-2, only in the day
+        return np.maximum(0, 800 * day + 20 * noise)
+    if column == 'swup_header':
+        return np.maximum(0, 160 * day + 5 * noise)
+    if column == 'lwdn_header':
+        return 320 + 20 * day + 2 * noise
+    if column == 'lwup_header':
+        return 400 + 30 * day + 2 * noise
+    # body temperature in kelvin
+    return 293 + 5 * day + 0.1 * noise
+
+def write_synthetic_csvs(data_product, days, interval, gap_rate, nan_rate, config, seed=0):
+    """
+    Write daily input csv files of synthetic data for a data product, where the config expects to find them.
+    Records are missing from each table independently, so the tables have to be aligned, and values are nan at random.
+
+    :param data_product: (str) 'soil' or 'radiation'.
+    :param days: (int) The number of days of data, from START_DATE.
+    :param interval: (int) The sampling interval in seconds.
+    :param gap_rate: (float) The fraction of records missing from each table.
+    :param nan_rate: (float) The fraction of values that are nan.
+    :param config: (energy_balance.Config) The config, input_file_path and the file names are used to name the files.
+    :param seed: (int) Seed for the random number generator, so each run uses the same data. Default is 0.
+    :returns: (int) The total size of the files written in bytes.
+    """
+    # imported here so that other commands (and --help) don't have to load them
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    settings = config[data_product]
+    input_file_path = os.path.expanduser(settings['input_file_path'])
+    dt_header = config['common']['datetime_header']
+    per_day = 86400 // interval
+    size = 0
+
+    for key, headers in get_input_columns(data_product, config).items():
+        for day in range(days):
+            date = START_DATE + timedelta(days=day)
+            times = pd.date_range(date, periods=per_day, freq=f'{interval}s')
+            hours = (np.arange(per_day) + day * per_day) * interval / 3600.
+
+            df = pd.DataFrame({dt_header: times.strftime('%Y-%m-%d %H:%M:%S'), 'RecNbr': np.arange(per_day) + day * per_day})
+            for i, header in enumerate(headers):
+                kind = key if data_product == 'soil' else next(h for h in ('lwdn_header', 'lwup_header', 'swdn_header', 'swup_header', 'body_temp_header')
+                                                               if settings[h] == header)
+                values = create_values(kind, hours + i, rng)
+                values[rng.random(per_day) < nan_rate] = np.nan
+                df[header] = values
+
+            df = df[rng.random(per_day) >= gap_rate]
+
+            file_path = os.path.join(input_file_path, settings[key].format(date=date.strftime(settings['input_date_format'])))
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            df.to_csv(file_path, index=False)
+            size += os.path.getsize(file_path)
+
+    return size
+
+def create_benchmark_config(config, output_dir):
+    """
+    Create a config that reads and writes all files in output_dir, with caching of the input files turned off.
+
+    :param config: (energy_balance.Config) The config to base the new config on.
+    :param output_dir: (str) The directory for the input and output files.
+    :returns: (energy_balance.Config) The new config.
+    """
+    input_dir = os.path.join(output_dir, 'input')
+    config = config.replace('common', netcdf_path=output_dir, qc_csv_path=output_dir, logger_csv_path=os.path.join(output_dir, 'logger'),
+                            csv_cache_path='')
+    return config.replace('soil', input_file_path=input_dir).replace('radiation', input_file_path=input_dir)
+
+class StageRecorder:
+
+    """
+    Runs the stages of a benchmark, recording the time taken by each, or the peak memory allocated if trace is True.
+    Memory is measured with tracemalloc, which slows the code down, so time and memory are measured in separate runs.
+    Memory allocated by C libraries other than numpy (e.g. netCDF4) is not included.
+
+    :param trace: (bool) If True, record the peak memory of each stage instead of the time. Default is False.
+    """
+
+    def __init__(self, trace=False):
+        self.trace = trace
+        self.results = {}
+
+    def __call__(self, stage, func, *args, **kwargs):
+        """
+        Run one stage, recording its time or peak memory in self.results.
+
+        :param stage: (str) The name of the stage.
+        :param func: (callable) The function to run.
+        :returns: The return value of func.
+        """
+        if self.trace:
+            tracemalloc.start()
+
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+
+        if self.trace:
+            self.results[stage] = tracemalloc.get_traced_memory()[1] / 1024**2
+            tracemalloc.stop()
+        else:
+            self.results[stage] = elapsed
+
+        return result
+
+def run_product(data_product, days, config, output_dir, record):
+    """
+    Run the stages of creating a netCDF file and a masked csv file for a data product, from the synthetic csv files.
+
+    :param data_product: (str) 'soil' or 'radiation'.
+    :param days: (int) The number of days of data.
+    :param config: (energy_balance.Config) The benchmark config.
+    :param output_dir: (str) The directory of the output files.
+    :param record: (StageRecorder) Runs and records each stage.
+    """
+    # imported here so that other commands (and --help) don't have to load pandas and netCDF4
+    from energy_balance.scripts.calculate_valid_min_max import calculate_valid_min_max
+    if data_product == 'soil':
+        from energy_balance.netcdf.soil_quality_control import SoilQualityControl as qc_class
+        from energy_balance.netcdf.soil_netcdf import SoilNetCDF as netcdf_class
+    else:
+        from energy_balance.netcdf.radiation_quality_control import RadiationQualityControl as qc_class
+        from energy_balance.netcdf.radiation_netcdf import RadiationNetCDF as netcdf_class
+
+    class StagedQualityControl(qc_class):
+        # run each stage of the QC on its own
+        def execute_qc(self):
+            record('create_dataframes', self.create_dataframes)
+            record('qc_variables', self.qc_variables)
+            self.apply_overrides()
+            record('create_mask', self.create_mask)
+
+    frequency = 'daily' if days == 1 else 'monthly'
+    date_string = netcdf_class.convert_date_to_string(START_DATE, frequency)
+
+    qc = StagedQualityControl(START_DATE, frequency, config=config)
+    record('create_masked_csv', qc.create_masked_csv, os.path.join(output_dir, f"{data_product}_qc_{date_string}.csv"))
+    record('create_netcdf', netcdf_class, qc.df, qc.qc, START_DATE, frequency, times=qc.times, mask=qc.mask, config=config)
+
+    file_path = netcdf_class.get_output_file(date_string, netcdf_class.data_product, config)
+    var_name, qc_var_name = VALID_MIN_MAX_VARIABLES[data_product]
+    record('calculate_valid_min_max', calculate_valid_min_max, file_path, var_name, qc_var_name, config['common']['qc_flag_level'])
+
+def run_logger(days, interval, config, output_dir, record):
+    """
+    Run the stages of downloading the data from a simulated logger to daily csv files, and loading a day into a stand-in database.
+
+    :param days: (int) The number of days of data to download.
+    :param interval: (int) The time between records on the simulated logger, in seconds.
+    :param config: (energy_balance.Config) The benchmark config.
+    :param output_dir: (str) The directory of the output files.
+    :param record: (StageRecorder) Runs and records each stage.
+    """
+    from energy_balance.logger.backfill import backfill_table
+    from energy_balance.logger.simulated import SimulatedDatabase, SimulatedLogger
+    from energy_balance.scripts.add_to_mysql import insert_into_tables
+
+    common = config['common']
+    dir_path = common['logger_csv_path']
+    # start again each time, otherwise nothing new is downloaded
+    shutil.rmtree(dir_path, ignore_errors=True)
+
+    device = SimulatedLogger(interval, config=config)
+    end = START_DATE + timedelta(days=days) - timedelta(microseconds=1)
+
+    def download():
+        for table in common['logger_tables']:
+            backfill_table(device, table, START_DATE, end, dir_path, common['datetime_header'])
+
+    record('download', download)
+
+    db = SimulatedDatabase()
+    for table, name in zip(common['logger_tables'], common['mysql_tables']):
+        db.create_table(name, [common['datetime_header'], 'RecNbr'] + device.columns[table])
+
+    record('add_to_mysql', insert_into_tables, None, None, None, dir_path, date=START_DATE, connection=db, config=config)
+
+def run_benchmarks(products, args, config, output_dir, trace=False):
+    """
+    Run the stages of each data product once.
+
+    :param products: (list) The data products to run.
+    :param args: (argparse.Namespace) The command line arguments.
+    :param config: (energy_balance.Config) The benchmark config.
+    :param output_dir: (str) The directory of the input and output files.
+    :param trace: (bool) If True, record peak memory instead of time. Default is False.
+    :returns: (dict) The time or peak memory of each stage, keyed by data product then stage.
+    """
+    results = {}
+    for product in products:
+        record = StageRecorder(trace)
+        # the netCDF classes print as they go, which would split up the results table
+        with contextlib.redirect_stdout(io.StringIO()):
+            if product == 'logger':
+                run_logger(args.days, args.interval, config, output_dir, record)
+            else:
+                run_product(product, args.days, config, output_dir, record)
+        results[product] = record.results
+
+    return results
+
+def get_environment():
+    """
+    Get the commit of the code and the versions of python and the main dependencies, so results from different runs can be compared.
+
+    :returns: (dict) The environment.
+    """
+    import numpy as np
+    import pandas as pd
+    import netCDF4
+
+    try:
+        package_dir = os.path.dirname(os.path.abspath(__file__))
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=package_dir, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        'commit': commit,
+        'date': datetime.utcnow().isoformat(timespec='seconds'),
+        'machine': platform.node(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'netCDF4': netCDF4.__version__,
+    }
+
+def print_results(results, baseline=None):
+    """
+    Print a table of the results, and the change from the baseline results if provided.
+
+    :param results: (dict) The results, as saved with --output.
+    :param baseline: (dict) Optional. Results to compare with, as saved with --output.
+    """
+    header = f"\n{'product':<11}{'stage':<25}{'time (s)':>10}{'memory (MB)':>13}"
+    if baseline:
+        header += f"{'time change':>13}{'memory change':>15}"
+    print(header)
+
+    for product, stages in results['stages'].items():
+        for stage, values in stages.items():
+            line = f"{product:<11}{stage:<25}{values['time']:>10.3f}{values['memory']:>13.1f}"
+
+            old = (baseline or {}).get('stages', {}).get(product, {}).get(stage)
+            if old:
+                for key, width in (('time', 13), ('memory', 15)):
+                    change = f"{100 * (values[key] / old[key] - 1):+.0f}%" if old[key] else '-'
+                    line += f"{change:>{width}}"
+            print(line)
+
+def main():
+    args = arg_parse()
+    config = get_config(config_file=args.config)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    parameters = {'days': args.days, 'interval': args.interval, 'gap_rate': args.gap_rate, 'nan_rate': args.nan_rate}
+    if baseline and baseline['parameters'] != parameters:
+        print(f"Warning: the baseline was run with different parameters {baseline['parameters']}, so the results are not comparable", file=sys.stderr)
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        config = create_benchmark_config(config, output_dir)
+
+        for product in args.products:
+            if product != 'logger':
+                size = write_synthetic_csvs(product, args.days, args.interval, args.gap_rate, args.nan_rate, config)
+                print(f"Created {size / 1024**2:.1f} MB of {product} csv files")
+
+        times = [run_benchmarks(args.products, args, config, output_dir) for _ in range(args.repeats)]
+        memory = run_benchmarks(args.products, args, config, output_dir, trace=True)
+
+    results = {
+        'environment': get_environment(),
+        'parameters': parameters,
+        'stages': {product: {stage: {'time': min(t[product][stage] for t in times), 'memory': memory[product][stage]}
+                             for stage in STAGES[product]}
+                   for product in args.products},
+    }
+
+    print_results(results, baseline)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults saved to {args.output}")
+
+if __name__ == '__main__':
+    main()
@@ -4,72 +4,254 @@ __author__ = 'Elle Smith'
 __date__ = '23 Aug 2021'
 __contact__ = 'eleanor.smith@stfc.ac.uk'
 
-import pandas as pd
-from netCDF4 import Dataset
 import argparse
+import glob
 import os
-import numpy as np
-from energy_balance import CONFIG
+import sys
+from energy_balance import get_config
 
 def arg_parse():
     parser = argparse.ArgumentParser()
 
     parser.add_argument('-v', '--var-name',
                         type=str,
-                        required=True,
-                        help="The name of the variable to update the min/max on. e.g. 'soil_temperature'")
+                        required=False,
+                        help="The name of the variable to update the min/max on. e.g. 'soil_temperature'. "
+                             "Default is every variable with a quality control variable.")
 
     parser.add_argument('-qc', '--qc-var-name',
                         type=str,
-                        required=True,
-                        help="The name of the quality control variable to use as a mask for retrieving valid values. e.g. 'qc_flag_soil_temperature'")
+                        required=False,
+                        help="The name of the quality control variable to use as a mask for retrieving valid values. e.g. 'qc_flag_soil_temperature'. "
+                             "Default is the quality control variable found for the variable.")
 
-    parser.add_argument('-fp', '--file-path',
-                        type=str,
-                        required=True,
-                        help="The path to netCDF file on which to recalculate the min/max e.g. /path/to/my/file.nc")
+    files = parser.add_mutually_exclusive_group(required=True)
+
+    files.add_argument('-fp', '--file-path',
+                       type=str,
+                       help="The path to netCDF file on which to recalculate the min/max e.g. /path/to/my/file.nc")
+
+    files.add_argument('-b', '--batch',
+                       type=str,
+                       help="A directory, searched recursively for netCDF files, or a glob pattern e.g. '/path/to/files/*_soil_*.nc' "
+                            "(quote it so the shell doesn't expand it), to recalculate the min/max on every file found.")
+
+    parser.add_argument('-w', '--workers',
+                        type=int,
+                        required=False,
+                        default=1,
+                        help="The number of processes to use with --batch, each file is updated in its own process. Default is 1.")
 
     return parser.parse_args()
 
 
+def get_valid_range(var, qc_vars, qc_value):
+    """
+    Calculate the minimum and maximum of the valid values of a variable, those with all their quality control flags no higher than qc_value.
+    Values are masked, not copied, and the minimum and maximum are found with NumPy masked reductions along time, so a 2-D
+    (time, index) variable e.g. soil_temperature has a range for each index.
+
+    :param var: (netCDF4.Variable) The data variable.
+    :param qc_vars: (list) The quality control variables to mask it with. Each has the same dimensions as var, or only time, in which case
+                    it applies to every index.
+    :param qc_value: (int) Max value of qc to use, see calculate_valid_min_max.
+    :returns: (tuple) The minimum and maximum, each an array with a value for each index (a single value for 1-D variables),
+              masked where an index has no valid values.
+    """
+    # imported here so that other commands (and --help) don't have to load it
+    import numpy as np
+
+    # read as the values in the file, so fill values are masked here once
+    var.set_auto_mask(False)
+    values = var[:]
+    invalid = np.isnan(values)
+    if hasattr(var, '_FillValue'):
+        invalid |= values == var._FillValue
+
+    for qc_var in qc_vars:
+        qc_var.set_auto_mask(False)
+        flags = qc_var[:]
+        if hasattr(qc_var, '_FillValue'):
+            invalid_flags = (flags > qc_value) | (flags == qc_var._FillValue)
+        else:
+            invalid_flags = flags > qc_value
+
+        if flags.ndim < values.ndim:
+            invalid_flags = invalid_flags.reshape(flags.shape + (1,) * (values.ndim - flags.ndim))
+        invalid |= invalid_flags
+
+    masked = np.ma.MaskedArray(values, mask=invalid)
+    return masked.min(axis=0), masked.max(axis=0)
+
+
+def set_valid_range(var, valid_min, valid_max):
+    """
+    Set valid_min and valid_max on a variable, as the overall range of each index, in the type of the variable.
+
+    :param var: (netCDF4.Variable) The variable.
+    :param valid_min: (numpy.ma.MaskedArray) The minimum of each index, see get_valid_range.
+    :param valid_max: (numpy.ma.MaskedArray) The maximum of each index.
+    :returns: (bool) True if the range was set, False if there are no valid values, in which case the attributes are not changed.
+    """
+    # imported here so that other commands (and --help) don't have to load it
+    import numpy as np
+
+    if np.ma.count(valid_min) == 0:
+        return False
+
+    var.valid_min = np.array(valid_min.min()).astype(var.dtype)
+    var.valid_max = np.array(valid_max.max()).astype(var.dtype)
+    return True
+
+
+def update_dataset(dataset, qc_value, var_names=None):
+    """
+    Recalculate valid_min and valid_max of every data variable in an open netCDF file that has a quality control variable, or only some of them.
+    Each variable is masked with its own quality control variable and any of energy_balance.netcdf.masks.COMMON_QC_VARIABLES in the file e.g. qc_flag_cleaning,
+    as when the file was created.
+
+    :param dataset: (netCDF4.Dataset) The netCDF file, open for writing.
+    :param qc_value: (int) Max value of qc to use, see calculate_valid_min_max.
+    :param var_names: (dict) Optional. The quality control variable to use for each variable to update, None to find it.
+                      Default is every variable found with energy_balance.netcdf.masks.get_qc_pairs.
+    :returns: (list) The (name, valid_min, valid_max) of each variable, valid_min and valid_max are None if it has no valid values.
+    """
+    # imported here so that other commands (and --help) don't have to load numpy
+    from energy_balance.netcdf.masks import COMMON_QC_VARIABLES, get_qc_pairs
+
+    pairs = get_qc_pairs(dataset)
+    if var_names is None:
+        var_names = pairs
+
+    common = [dataset[name] for name in COMMON_QC_VARIABLES if name in dataset.variables]
+
+    updated = []
+    for var_name, qc_var_name in var_names.items():
+        qc_var_name = qc_var_name or pairs.get(var_name)
+        if qc_var_name is None:
+            raise ValueError(f"No quality control variable found for {var_name} in {dataset.filepath()}")
+
+        var = dataset[var_name]
+        qc_vars = [dataset[qc_var_name]] + [c for c in common if c.name != qc_var_name and set(c.dimensions) <= set(var.dimensions)]
+        valid_min, valid_max = get_valid_range(var, qc_vars, qc_value)
+
+        if set_valid_range(var, valid_min, valid_max):
+            updated.append((var_name, var.valid_min, var.valid_max))
+        else:
+            updated.append((var_name, None, None))
+
+    return updated
+
+
+def update_file(fpath, qc_value, var_names=None):
+    """
+    Recalculate valid_min and valid_max of every data variable in a netCDF file that has a quality control variable, or only some of them.
+    See update_dataset.
+
+    :param fpath: (str) Path to netCDF file on which to calculate the min/max.
+    :param qc_value: (int) Max value of qc to use, see calculate_valid_min_max.
+    :param var_names: (dict) Optional. The quality control variable to use for each variable to update, None to find it.
+                      Default is every variable found with energy_balance.netcdf.masks.get_qc_pairs.
+    :returns: (list) The (name, valid_min, valid_max) of each variable, valid_min and valid_max are None if it has no valid values.
+    """
+    # imported here so that other commands (and --help) don't have to load it
+    from netCDF4 import Dataset
+
+    with Dataset(fpath, 'r+') as dataset:
+        return update_dataset(dataset, qc_value, var_names)
+
+
 def calculate_valid_min_max(fpath, var_name, qc_var_name, qc_value):
     """
     Re calculate valid min and valid max for a variable, given the quality control variable and maximum desired quality control value.
-    Useful after quality control variable has been changed manually. 
+    Useful after quality control variable has been changed manually.
 
     :param fpath: (str) Path to netCDF file on which to calculate the min/max
     :param var_name: (str) The name of the variable to update the min/max on.
     :param qc_var_name: (str) The name of the quality control variable to use as a mask for retrieving valid values.
     :param qc_value: (int) Max value of qc to use i.e. 1 will calculate min/max on only 'good data', 2 will calculate it on good data and data marked with a flag of 2.
     """
-    dataset = Dataset(fpath, 'r+')
+    update_file(fpath, qc_value, {var_name: qc_var_name})
 
-    var = dataset[var_name]
-    qc_var = dataset[qc_var_name]
 
-    data = pd.DataFrame(var[:])
-    qc = pd.DataFrame(qc_var[:])
+def find_files(path):
+    """
+    Find the netCDF files to update.
 
-    mask = (qc <= qc_value) 
-    data_masked = data[mask]
+    :param path: (str) A netCDF file, a directory, which is searched recursively for .nc files, or a glob pattern.
+    :returns: (list) The paths of the files, sorted.
+    """
+    path = os.path.expanduser(path)
+    if os.path.isdir(path):
+        return sorted(glob.glob(os.path.join(path, '**', '*.nc'), recursive=True))
+    return sorted(glob.glob(path, recursive=True))
 
-    var.valid_min = np.nanmin(data_masked)
-    var.valid_max = np.nanmax(data_masked)
 
-    dataset.close()
+def _update_file(fpath, qc_value, var_names):
+    # run in each worker, so one file failing doesn't stop the others
+    try:
+        return fpath, update_file(fpath, qc_value, var_names), None
+    except Exception as exc:
+        return fpath, [], f"{type(exc).__name__}: {exc}"
+
+
+def update_files(fpaths, qc_value, var_names=None, workers=1):
+    """
+    Recalculate valid_min and valid_max on many netCDF files, in a pool of processes if more than one worker is requested.
+
+    :param fpaths: (list) The paths of the netCDF files.
+    :param qc_value: (int) Max value of qc to use, see calculate_valid_min_max.
+    :param var_names: (dict) Optional. The variables to update, see update_file. Default is every variable with a quality control variable.
+    :param workers: (int) The number of processes to use. Default is 1.
+    :returns: (list) A (path, updated variables, error message or None) tuple for each file, in the order of fpaths.
+    """
+    if workers <= 1 or len(fpaths) <= 1:
+        return [_update_file(fpath, qc_value, var_names) for fpath in fpaths]
+
+    # only imported when needed, as it is slow to import
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_update_file, fpath, qc_value, var_names) for fpath in fpaths]
+        return [future.result() for future in futures]
 
 
 def main():
     args = arg_parse()
 
-    fpath = os.path.expanduser(args.file_path)
     var_name = args.var_name
     qc_var_name = args.qc_var_name
+    qc_value = get_config()['common']['qc_flag_level']
+
+    if qc_var_name and not var_name:
+        raise ValueError("--qc-var-name can only be used with --var-name.")
+
+    var_names = {var_name: qc_var_name} if var_name else None
+
+    if args.file_path:
+        fpaths = [os.path.expanduser(args.file_path)]
+    else:
+        fpaths = find_files(args.batch)
+        if not fpaths:
+            raise FileNotFoundError(f"No netCDF files found for {args.batch}")
+
+    failed = 0
+    for fpath, updated, message in update_files(fpaths, qc_value, var_names, args.workers):
+        if message:
+            failed += 1
+            print(f"{fpath}: failed ({message})")
+            continue
+
+        for name, valid_min, valid_max in updated:
+            if valid_min is None:
+                print(f"{fpath}: {name} has no valid values, valid min and valid max not changed")
+            else:
+                print(f"{fpath}: {name} valid min {valid_min}, valid max {valid_max}")
 
-    qc_value = CONFIG['common']['qc_flag_level']
+    print(f"Recalculated valid min and valid max for {len(fpaths) - failed} of {len(fpaths)} files, with qc flag value of {qc_value}.")
 
-    calculate_valid_min_max(fpath, var_name, qc_var_name, qc_value)
-    print(f"Recalculated valid min and valid max for {var_name}, using {qc_var_name} as a mask, with qc flag value of {qc_value}.")
+    if failed:
+        sys.exit(1)
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
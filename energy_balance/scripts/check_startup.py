@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+
+import argparse
+import json
+import pickle
+import subprocess
+import sys
+import time
+from energy_balance import get_config
+from energy_balance.cli import SUBCOMMANDS
+
+# dependencies that are slow to import, none of which should be loaded just to show the help of a subcommand
+HEAVY_MODULES = ['pandas', 'numpy', 'netCDF4', 'matplotlib', 'mysql', 'pycampbellcr1000', 'ntplib']
+
+# run in a new interpreter: show the help of a subcommand, then report which heavy modules were loaded
+CHILD = """
+import json, sys
+from energy_balance.cli import main
+try:
+    main([{subcommand!r}, '--help'])
+except SystemExit:
+    pass
+print(json.dumps([m for m in {heavy!r} if m in sys.modules]))
+"""
+
+def arg_parse():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('-s', '--subcommands',
+                        type=str,
+                        nargs='+',
+                        required=False,
+                        default=list(SUBCOMMANDS),
+                        choices=list(SUBCOMMANDS),
+                        help="The subcommands to check. Default is all.")
+
+    parser.add_argument('-b', '--budget',
+                        type=float,
+                        required=False,
+                        default=1.0,
+                        help="The maximum time in seconds, including starting python, to show the help of a subcommand. Default is 1.0.")
+
+    return parser.parse_args()
+
+def check_subcommand(subcommand):
+    """
+    Time showing the help of a subcommand in a new python process, and find which heavy modules it loaded.
+
+    :param subcommand: (str) The name of the subcommand e.g. create-files
+    :returns: (tuple) The time taken in seconds and the list of heavy modules that were loaded.
+    """
+    code = CHILD.format(subcommand=subcommand, heavy=HEAVY_MODULES)
+
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    elapsed = time.perf_counter() - start
+
+    loaded = json.loads(result.stdout.strip().splitlines()[-1])
+    return elapsed, loaded
+
+def check_startup(subcommands, budget):
+    """
+    Check that the help of each subcommand is shown within the time budget, without loading any heavy modules.
+
+    :param subcommands: (list) The names of the subcommands to check.
+    :param budget: (float) The maximum time in seconds for each subcommand.
+    :returns: (int) The number of subcommands that failed the check.
+    """
+    failed = 0
+    for subcommand in subcommands:
+        elapsed, loaded = check_subcommand(subcommand)
+        ok = elapsed <= budget and not loaded
+
+        message = f"{subcommand:<25}{elapsed:>7.3f}s"
+        if loaded:
+            message += f"  loaded: {', '.join(loaded)}"
+        print(f"{message}  {'ok' if ok else 'FAILED'}")
+
+        if not ok:
+            failed += 1
+
+    return failed
+
+def check_config_pickle(config=None):
+    """
+    Check that the config can be pickled and unpickled unchanged, as it is passed to the worker processes of the scripts run with --workers.
+
+    :param config: (energy_balance.Config) Optional. The config to check, the config from the config files if not provided.
+    :returns: (bool) True if the config passed the check.
+    """
+    config = config if config is not None else get_config()
+    try:
+        copy = pickle.loads(pickle.dumps(config))
+        ok = list(copy) == list(config) and all(dict(copy[s]) == dict(config[s]) for s in config)
+    except Exception as exc:
+        print(f"{'config pickle':<25}FAILED ({type(exc).__name__}: {exc})")
+        return False
+
+    print(f"{'config pickle':<25}{'ok' if ok else 'FAILED'}")
+    return ok
+
+def main():
+    args = arg_parse()
+
+    failed = check_startup(args.subcommands, args.budget)
+    print(f"{len(args.subcommands) - failed} passed, {failed} failed (budget {args.budget}s)")
+
+    if not check_config_pickle():
+        failed += 1
+
+    if failed:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
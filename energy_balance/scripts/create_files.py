@@ -6,13 +6,11 @@ __contact__ = 'eleanor.smith@stfc.ac.uk'
 
 import argparse
 import os
-import pandas as pd
+import sys
 from datetime import datetime
-from dateutil.relativedelta import relativedelta
-from energy_balance.netcdf.soil_netcdf import SoilNetCDF
-from energy_balance.netcdf.soil_quality_control import SoilQualityControl
-from energy_balance.netcdf.radiation_netcdf import RadiationNetCDF
-from energy_balance.netcdf.radiation_quality_control import RadiationQualityControl
+from energy_balance import get_config
+from energy_balance.netcdf.chunked import get_max_memory, process_in_chunks
+from energy_balance.scripts.periods import get_periods, run_periods, report_periods
 
 def arg_parse():
     parser = argparse.ArgumentParser()
@@ -40,29 +38,72 @@ def arg_parse():
                         choices=['soil', 'radiation'],
                         help="The data product to create files for.")
 
+    parser.add_argument('--from-daily',
+                        action='store_true',
+                        help="Only for monthly files. If set, monthly files are created by joining the daily netCDF files already created for that month, instead of from the csv files.")
+
+    parser.add_argument('-a', '--append',
+                        action='store_true',
+                        help="Only for daily files. If set and the file already exists, only records newer than the last record in the file are quality controlled and appended to it.")
+
+    parser.add_argument('-w', '--workers',
+                        type=int,
+                        required=False,
+                        default=1,
+                        help="The number of processes to use, each day or month is created in its own process. Default is 1.")
+
+    parser.add_argument('-c', '--config',
+                        type=str,
+                        required=False,
+                        help="Path to a config file to use instead of the one set in the CONFIG environment variable. It is read on top of the default config file.")
+
     return parser.parse_args()
 
-def create_soil_files(date, frequency):
+def create_soil_files(date, frequency, append=False, config=None):
     """
     Create soil netcdf.
     
     :param date: (datetime.datetime) The date for which to create the file.
     :param frequency: (str) The frequency for files - daily or monthly.
+    :param append: (bool) If True, only records newer than the last record in an existing file are quality controlled and appended to it. Default is False.
+    :param config: (energy_balance.Config) Optional. The config to use, the config from the config files if not provided.
     :returns: None
     """
-    sqc = SoilQualityControl(date, frequency)
-    SoilNetCDF(sqc.df, sqc.qc, date, frequency)
+    # imported here so that other commands (and --help) don't have to load pandas and netCDF4
+    from energy_balance.netcdf.soil_netcdf import SoilNetCDF
+    from energy_balance.netcdf.soil_quality_control import SoilQualityControl
+
+    max_memory = get_max_memory(config)
+    if max_memory and not append:
+        process_in_chunks(SoilQualityControl, date, frequency, max_memory, netcdf_class=SoilNetCDF, config=config)
+        return
 
-def create_radiation_files(date, frequency):
+    after = SoilNetCDF.get_last_time(date, frequency, config) if append else None
+    sqc = SoilQualityControl(date, frequency, after=after, config=config)
+    SoilNetCDF(sqc.df, sqc.qc, date, frequency, times=sqc.times, append=append, mask=sqc.mask, config=config)
+
+def create_radiation_files(date, frequency, append=False, config=None):
     """
     Create radiation netcdf.
     
     :param date: (datetime.datetime) The date for which to create the file.
     :param frequency: (str) The frequency for files - daily or monthly.
+    :param append: (bool) If True, only records newer than the last record in an existing file are quality controlled and appended to it. Default is False.
+    :param config: (energy_balance.Config) Optional. The config to use, the config from the config files if not provided.
     :returns: None
     """
-    rqc = RadiationQualityControl(date, frequency)
-    RadiationNetCDF(rqc.df, rqc.qc, date, frequency)
+    # imported here so that other commands (and --help) don't have to load pandas and netCDF4
+    from energy_balance.netcdf.radiation_netcdf import RadiationNetCDF
+    from energy_balance.netcdf.radiation_quality_control import RadiationQualityControl
+
+    max_memory = get_max_memory(config)
+    if max_memory and not append:
+        process_in_chunks(RadiationQualityControl, date, frequency, max_memory, netcdf_class=RadiationNetCDF, config=config)
+        return
+
+    after = RadiationNetCDF.get_last_time(date, frequency, config) if append else None
+    rqc = RadiationQualityControl(date, frequency, after=after, config=config)
+    RadiationNetCDF(rqc.df, rqc.qc, date, frequency, times=rqc.times, append=append, mask=rqc.mask, config=config)
 
 def get_create_file(data_product):
     """Get the function for creating files for the specified data product."""
@@ -71,32 +112,36 @@ def get_create_file(data_product):
     elif data_product == "soil":
         return create_soil_files
     
-def create_files(start_date, end_date, frequency, data_product):
+def create_files(start_date, end_date, frequency, data_product, workers=1, from_daily=False, append=False, config=None):
     """
     Create netcdf files for the specified data product in the time range provided.
-    If no data product is provided, netcdf files are created for soil and radiation.
+    Each day or month is independent, so they can be created in parallel by setting workers.
+    If from_daily is True, monthly files are created from the daily netCDF files for that month, without repeating the quality control.
+    If append is True, new records are appended to existing daily files instead of the files being rewritten.
     
     :param start_date: (datetime.datetime) The start date for which to create the files.
     :param end_date: (datetime.datetime) The end date for which to create the files.
     :param frequency: (str) The frequency for files - daily or monthly.
     :param data_product: (str) The data product to create the netcdf files for e.g. radiation or soil
-    :returns: None
+    :param workers: (int) The number of processes to use. Default is 1.
+    :param from_daily: (bool) If True, create monthly files from the daily netCDF files. Default is False.
+    :param append: (bool) If True, append new records to existing daily files. Default is False.
+    :param config: (energy_balance.Config) Optional. The config to use, the config from the config files if not provided.
+    :returns: (list) A (date, status, message) tuple for each day or month, status is one of success, skipped or failed.
     """
-    while start_date <= end_date:
-
-        if frequency == 'daily':
-            delta = relativedelta(days=1)
-        else:
-            delta = relativedelta(months=1)
-
-        try:
-            func = get_create_file(data_product)
-            func(start_date, frequency)
-        except FileNotFoundError:
-            start_date += delta
-            continue
-    
-        start_date += delta
+    periods = get_periods(start_date, end_date, frequency)
+
+    if from_daily:
+        if frequency != 'monthly':
+            raise ValueError('Files can only be created from daily files when the frequency is monthly.')
+        from energy_balance.netcdf.monthly_netcdf import create_monthly_from_daily
+        func = create_monthly_from_daily
+        tasks = [(date, data_product, config) for date in periods]
+    else:
+        func = get_create_file(data_product)
+        tasks = [(date, frequency, append, config) for date in periods]
+
+    return run_periods(func, tasks, workers)
 
 
 def main():
@@ -124,8 +169,20 @@ def main():
 
     data_product = args.data_product
 
-    create_files(start_date, end_date, freq, data_product)
+    if args.from_daily and freq != 'monthly':
+        raise ValueError("--from-daily can only be used when creating monthly files.")
+
+    if args.append and freq != 'daily':
+        raise ValueError("--append can only be used when creating daily files.")
+
+    config = get_config(config_file=args.config)
+
+    results = create_files(start_date, end_date, freq, data_product, args.workers, args.from_daily, args.append, config)
+    failed = report_periods(results, freq)
     print(complete_stmnt)
 
+    if failed:
+        sys.exit(1)
+
 if __name__ == '__main__':
     main()
@@ -6,14 +6,11 @@ __contact__ = 'eleanor.smith@stfc.ac.uk'
 
 import argparse
 import os
-import pandas as pd
+import sys
 from datetime import datetime
-from dateutil.relativedelta import relativedelta
-from energy_balance import CONFIG
-from energy_balance.netcdf.soil_netcdf import SoilNetCDF
-from energy_balance.netcdf.soil_quality_control import SoilQualityControl
-from energy_balance.netcdf.radiation_netcdf import RadiationNetCDF
-from energy_balance.netcdf.radiation_quality_control import RadiationQualityControl
+from energy_balance import get_config
+from energy_balance.netcdf.chunked import get_max_memory, process_in_chunks
+from energy_balance.scripts.periods import get_periods, run_periods, report_periods
 
 def arg_parse():
     parser = argparse.ArgumentParser()
@@ -40,30 +37,72 @@ def arg_parse():
                         required=True,
                         choices=['soil', 'radiation'],
                         help="The data product to create files for.")
+
+    parser.add_argument('-l', '--qc-flag-levels',
+                        type=int,
+                        nargs='+',
+                        required=False,
+                        help="The qc flag levels to create masked csvs for, all from one quality control run e.g. -l 1 2 3. "
+                             "The level is added to the file names. Default is qc_flag_level in the config file.")
+
+    parser.add_argument('-w', '--workers',
+                        type=int,
+                        required=False,
+                        default=1,
+                        help="The number of processes to use, each day or month is created in its own process. Default is 1.")
+
+    parser.add_argument('-c', '--config',
+                        type=str,
+                        required=False,
+                        help="Path to a config file to use instead of the one set in the CONFIG environment variable. It is read on top of the default config file.")
     
     return parser.parse_args()
 
-def create_soil_files(date, frequency, path):
+def create_soil_files(date, frequency, paths, config=None):
     """
-    Create soil masked csv.
+    Create soil masked csvs.
     
     :param date: (datetime.datetime) The date for which to create the file. 
     :param frequency: (str) The frequency for files - daily or monthly.
+    :param paths: (dict) The path at which to create the masked csv for each qc flag level, see get_csv_paths.
+    :param config: (energy_balance.Config) Optional. The config to use, the config from the config files if not provided.
     :returns: None
     """
-    sqc = SoilQualityControl(date, frequency)
-    sqc.create_masked_csv(path)
+    # imported here so that other commands (and --help) don't have to load pandas and netCDF4
+    from energy_balance.netcdf.soil_quality_control import SoilQualityControl
+
+    max_memory = get_max_memory(config)
+    if max_memory:
+        process_in_chunks(SoilQualityControl, date, frequency, max_memory, csv_paths=paths, config=config)
+        return
+
+    # each level is masked from the same quality control
+    sqc = SoilQualityControl(date, frequency, config=config)
+    for qc_flag, path in paths.items():
+        sqc.create_masked_csv(path, qc_flag=qc_flag)
 
-def create_radiation_files(date, frequency, path):
+def create_radiation_files(date, frequency, paths, config=None):
     """
-    Create radiation masked csv.
+    Create radiation masked csvs.
     
     :param date: (datetime.datetime) The date for which to create the file.
     :param frequency: (str) The frequency for files - daily or monthly.
+    :param paths: (dict) The path at which to create the masked csv for each qc flag level, see get_csv_paths.
+    :param config: (energy_balance.Config) Optional. The config to use, the config from the config files if not provided.
     :returns: None
     """
-    rqc = RadiationQualityControl(date, frequency)
-    rqc.create_masked_csv(path)
+    # imported here so that other commands (and --help) don't have to load pandas and netCDF4
+    from energy_balance.netcdf.radiation_quality_control import RadiationQualityControl
+
+    max_memory = get_max_memory(config)
+    if max_memory:
+        process_in_chunks(RadiationQualityControl, date, frequency, max_memory, csv_paths=paths, config=config)
+        return
+
+    # each level is masked from the same quality control
+    rqc = RadiationQualityControl(date, frequency, config=config)
+    for qc_flag, path in paths.items():
+        rqc.create_masked_csv(path, qc_flag=qc_flag)
 
 def get_create_file(data_product):
     """Get the function for creating files for the specified data product."""
@@ -89,36 +128,46 @@ def prepare_date(date, frequency):
 
     return date
     
-def create_files(start_date, end_date, frequency, data_product, fpath):
+def get_csv_paths(fpath, data_product, date, frequency, qc_flag_levels=None):
+    """
+    Get the path of the masked csv for each qc flag level.
+
+    :param fpath: (str) The directory path at which to create the masked csvs.
+    :param data_product: (str) The data product e.g. radiation or soil
+    :param date: (datetime.datetime) The date for which the files are being created.
+    :param frequency: (str) The frequency for files - daily or monthly.
+    :param qc_flag_levels: (list) Optional. The qc flag levels, each is added to its file name e.g. soil_qc_202107_level2.csv.
+                           If not provided, there is one file, e.g. soil_qc_202107.csv, for qc_flag_level in the config file.
+    :returns: (dict) The path for each qc flag level, the level is None for qc_flag_level in the config file.
+    """
+    date = prepare_date(date, frequency)
+    if not qc_flag_levels:
+        return {None: os.path.join(fpath, f"{data_product}_qc_{date}.csv")}
+
+    return {level: os.path.join(fpath, f"{data_product}_qc_{date}_level{level}.csv") for level in qc_flag_levels}
+
+def create_files(start_date, end_date, frequency, data_product, fpath, workers=1, config=None, qc_flag_levels=None):
     """
     Create masked csvs for the specified data product in the time range provided.
+    Each day or month is independent, so they can be created in parallel by setting workers.
     
     :param start_date: (datetime.datetime) The start date for which to create the files.
     :param end_date: (datetime.datetime) The end date for which to create the files.
     :param frequency: (str) The frequency for files - daily or monthly.
     :param data_product: (str) The data product to create the csvs for e.g. radiation or soil
     :param fpath: (str) The directory path at which to create the output file.
-    :returns: None
+    :param workers: (int) The number of processes to use. Default is 1.
+    :param config: (energy_balance.Config) Optional. The config to use, the config from the config files if not provided.
+    :param qc_flag_levels: (list) Optional. The qc flag levels to create masked csvs for. Default is qc_flag_level in the config file.
+    :returns: (list) A (date, status, message) tuple for each day or month, status is one of success, skipped or failed.
     """
-    while start_date <= end_date:
-
-        date = prepare_date(start_date, frequency)
-        fname = f"{data_product}_qc_{date}.csv"
-        path = os.path.join(fpath, fname)
-
-        if frequency == 'daily':
-            delta = relativedelta(days=1)
-        else:
-            delta = relativedelta(months=1)
-
-        try:
-            func = get_create_file(data_product)
-            func(start_date, frequency, path)
-        except FileNotFoundError:
-            start_date += delta
-            continue
-    
-        start_date += delta
+    func = get_create_file(data_product)
+    tasks = []
+
+    for date in get_periods(start_date, end_date, frequency):
+        tasks.append((date, frequency, get_csv_paths(fpath, data_product, date, frequency, qc_flag_levels), config))
+
+    return run_periods(func, tasks, workers)
 
 
 def main():
@@ -145,10 +194,15 @@ def main():
         complete_stmnt = f'File created for {args.start_date}'
 
     data_product = args.data_product
-    fpath = os.path.expanduser(CONFIG['common']['qc_csv_path'])
+    config = get_config(config_file=args.config)
+    fpath = os.path.expanduser(config['common']['qc_csv_path'])
 
-    create_files(start_date, end_date, freq, data_product, fpath)
+    results = create_files(start_date, end_date, freq, data_product, fpath, args.workers, config, args.qc_flag_levels)
+    failed = report_periods(results, freq)
     print(complete_stmnt)
 
+    if failed:
+        sys.exit(1)
+
 if __name__ == '__main__':
     main()
@@ -5,14 +5,11 @@ __date__ = '15 Jul 2021'
 __contact__ = 'eleanor.smith@stfc.ac.uk'
 
 
-import os
-import subprocess
-import pandas as pd
-import ntplib
 import argparse
-from datetime import datetime, date
-from pycampbellcr1000 import CR1000
-from energy_balance import CONFIG
+from datetime import datetime, timedelta
+from energy_balance import get_config
+from energy_balance.logger.connection import connect
+from energy_balance.logger.sinks import SINK_NAMES, create_sinks
 
 
 def arg_parse():
@@ -25,99 +22,107 @@ def arg_parse():
         action="store_true",
         help=f"If set then the logger time will be updated when the script runs at midnight. If not specified, set_time=False."
     )
+
+    parser.add_argument(
+        "-s",
+        "--sinks",
+        type=str,
+        nargs="+",
+        choices=SINK_NAMES,
+        help="Where to write the records, any of csv (the daily csv files), sqlite and mysql. Default is download_sinks in the config."
+    )
                         
     return parser.parse_args()
 
 
-def log(url, dir_path, set_time=False):
+def log(url, sinks, set_time=False):
     """
-    Extract the data from the campbell data logger for each specified table and save to a daily csv file.
-    This will backfill the file to get all data from the start of the day or update from the latest data entry if data already exists in the file.
+    Extract the data from the campbell data logger for each specified table and write it to the sinks e.g. a daily csv file.
+    This will backfill the sinks to get all data from the start of the day or update from the latest data entry if data already exists in them.
+    One connection to the logger is used for all the tables. The sinks are written to in the background, and are closed once all the records are written.
     Default tables are: Housekeeping, GPS_datetime, SoilTemperature, SoilMoisture, SoilHeatFlux and Radiation
     If set_time=True the logger time will be updated when the script runs at midnight. Default is False.
     
-    :param url: (str) URL for connection with logger in format 'tcp:iphost:port' or 'serial:/dev/ttyUSB0:19200:8N1'
-    :param dir_path: (str) The path to the top level directory in which to create the csv files and folders.
+    :param url: (str) URL for connection with logger in format 'tcp:iphost:port' or 'serial:/dev/ttyUSB0:19200:8N1' ('sim:' for a simulated logger)
+    :param sinks: (energy_balance.logger.sinks.Sinks) Where to write the records, see energy_balance.logger.sinks.create_sinks.
     :param set_time: (boolean) If True, the logger time will be updated when the script runs at midnight. Default is False.
     :returns: None
     """
-    device = CR1000.from_url(url)
-
-    # first check if it's midnight (utc) & sync time, if set_time=True
-    if set_time:
-        try:
-            c = ntplib.NTPClient()
-            start_time = datetime.utcfromtimestamp(c.request('pool.ntp.org').tx_time)
-
-            if start_time.hour == "0" and start_time.minute == "0":
-                device.set_time(datetime.utcfromtimestamp(c.request('pool.ntp.org').tx_time))
-                
-        except:
-            print("Could not sync with time server.")
-
-    # device.list_tables():
-    # ['Status', 'Housekeeping', 'GPS_datetime', 'SoilTemperature', 'SoilMoisture', 'SoilHeatFlux', 'Radiation', 'DataTableInfo', 'Public']
-    tables = CONFIG['common']['logger_tables']
-    date = datetime.utcnow().strftime("%Y-%m-%d")
-
-    for table in tables:
-
-        csv_dirs = os.path.join(dir_path, table)
-        csv_name = f"{table}_{date}.csv"
-        csv_path = os.path.join(csv_dirs, csv_name)
-
-
-        # create csv path
-        if not os.path.exists(csv_dirs):
-            os.makedirs(csv_dirs)
+    device = connect(url)
+
+    try:
+        # first check if it's midnight (utc) & sync time, if set_time=True
+        if set_time:
+            sync_time(device)
+
+        # device.list_tables():
+        # ['Status', 'Housekeeping', 'GPS_datetime', 'SoilTemperature', 'SoilMoisture', 'SoilHeatFlux', 'Radiation', 'DataTableInfo', 'Public']
+        tables = get_config()['common']['logger_tables']
+
+        for table in tables:
+            try:
+                records = update_table(device, table, sinks)
+                print(f"{records} new records were found for {table}")
+            except Exception as exc:
+                # carry on with the other tables, they will be updated from where they stopped on the next run
+                print(f"Could not update {table}: {exc}")
+    finally:
+        device.bye()
+        sinks.close()
+
+
+def sync_time(device):
+    """
+    Set the logger time from a time server, if it is midnight (utc).
 
-        # if file doesn't exist - make it
-        if not os.path.isfile(csv_path):
-            open(csv_path, 'w').close()
+    :param device: (pycampbellcr1000.CR1000) The open connection to the logger.
+    :returns: None
+    """
+    import ntplib
 
-        # open the csv file
-        try:
-            df = pd.read_csv(csv_path)
-        except pd.errors.EmptyDataError:
-            get_todays_data(url, table, csv_path)
-            continue
+    try:
+        c = ntplib.NTPClient()
+        start_time = datetime.utcfromtimestamp(c.request('pool.ntp.org').tx_time)
 
-        if df.empty:
-            get_todays_data(url, table, csv_path)
+        if start_time.hour == 0 and start_time.minute == 0:
+            device.set_time(datetime.utcfromtimestamp(c.request('pool.ntp.org').tx_time))
 
-        else:
-            cmd = f"pycr1000 update {url} {table} {csv_path}"
-            subprocess.call(cmd, shell=True)
+    except:
+        print("Could not sync with time server.")
 
 
-def get_todays_data(url, table, csv_path):
+def update_table(device, table, sinks, start=None, end=None):
     """
-    Gets all the data for the specified table from the start of the day i.e. 00:00
+    Write the records after the last one saved for the table, or from start if none are saved, to the sinks.
+    Records are downloaded from the earliest of the last records in each sink, and each sink only writes those it doesn't have yet.
+    For the daily csv files, the last record is looked for in today's (utc) file and then yesterday's, so records logged just before midnight aren't missed.
 
-    :param url: (str) URL for connection with logger in format 'tcp:iphost:port' or 'serial:/dev/ttyUSB0:19200:8N1'
+    :param device: (pycampbellcr1000.CR1000) The open connection to the logger.
     :param table: (str) The name of the table on the logger from which the data is being extracted.
-    :param csv_path: (str) The path to the csv file to back fill with todays data.
-    :returns: None
+    :param sinks: (energy_balance.logger.sinks.Sinks) Where to write the records.
+    :param start: (datetime.datetime) Optional. The time from which to get data if no records are saved. Default is the start of today (utc).
+    :param end: (datetime.datetime) Optional. The time after which to stop getting data, inclusive. Default is the latest data on the logger.
+    :returns: (int) The number of records downloaded.
     """
-    # check if there is any data - if not, get since start of day (get data command is inclusive)
-    # otherwise update command would just get all data
-    # create a start time of midnight of todays date so update doesn't back-fill all data
-    today = datetime.utcnow().date()
-    midnight = datetime.combine(today, datetime.min.time())
-    start_time = midnight.strftime("%Y-%m-%d %H:%M")
+    latest = sinks.get_last_time(table)
+    if latest is not None:
+        # add a microsecond on, so the last record isn't duplicated
+        start = latest + timedelta(microseconds=1)
+    elif start is None:
+        start = datetime.combine(datetime.utcnow().date(), datetime.min.time())
 
-    cmd = f"pycr1000 getdata {url} {table} --start '{start_time}' {csv_path}"
-    subprocess.call(cmd, shell=True)
+    data = device.get_data(table, start, end)
+    return sinks.write(table, data)
 
 
 def main():
     args = arg_parse()
     set_time = args.set_time
 
-    url = CONFIG['common']['logger_url']
-    dir_path = os.path.expanduser(CONFIG['common']['logger_csv_path'])
+    url = get_config()['common']['logger_url']
+    sinks = create_sinks(args.sinks)
 
-    log(url, dir_path, set_time)
+    log(url, sinks, set_time)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -7,11 +7,10 @@ __contact__ = 'eleanor.smith@stfc.ac.uk'
 
 import argparse
 import os
-import pandas as pd
 from datetime import datetime, timedelta
-from pycampbellcr1000 import CR1000
-from energy_balance import CONFIG
-import time
+from energy_balance import get_config
+from energy_balance.logger.backfill import backfill_table
+from energy_balance.logger.connection import connect
 
 
 def arg_parse():
@@ -26,83 +25,48 @@ def arg_parse():
                         type=str,
                         required=False,
                         help="The end date to extract data for, in the format YYYY-MM-DD.")
+
+    parser.add_argument('-r', '--retries',
+                        type=int,
+                        required=False,
+                        default=5,
+                        help="The number of times to retry a failed request in a row, waiting longer each time, before stopping. "
+                             "Run again with the same dates to resume. Default is 5.")
                         
     return parser.parse_args()
 
 
-def get_data(url, start_date, end_date, dir_path):
+def get_data(url, start_date, end_date, dir_path, retries=5):
     """
     Extract data from the campbell data logger for each specified table and save to a daily csv file between the date ranges specified.
+    Each table is backfilled in turn over one connection, see energy_balance.logger.backfill.backfill_table.
+    If the script is interrupted, running it again for the same dates resumes each table from where it stopped.
     Default tables are: Housekeeping, GPS_datetime, SoilTemperature, SoilMoisture, SoilHeatFlux and Radiation
     
-    :param url: (str) URL for connection with logger in format 'tcp:iphost:port' or 'serial:/dev/ttyUSB0:19200:8N1'
+    :param url: (str) URL for connection with logger in format 'tcp:iphost:port' or 'serial:/dev/ttyUSB0:19200:8N1' ('sim:' for a simulated logger)
     :param start_date: (datetime.datetime) The start date from which to collect data
     :param end_date: (datetime.datetime) The end date after which to stop collecting data. (the end date will be included in the data.) 
     :param dir_path: (str) The path to the top level directory in which to create the csv files and folders.
+    :param retries: (int) The number of times to retry a failed request in a row before giving up. Default is 5.
     :returns: None
     """
-    device = CR1000.from_url(url)
+    device = connect(url)
 
     # device.list_tables():
     # ['Status', 'Housekeeping', 'GPS_datetime', 'SoilTemperature', 'SoilMoisture', 'SoilHeatFlux', 'Radiation', 'DataTableInfo', 'Public']
-    tables = CONFIG['common']['logger_tables']
+    config = get_config()
+    tables = config['common']['logger_tables']
+    dt_header = config['common']['datetime_header']
 
-    while start_date <= end_date:
+    # include all of the end date
+    end = end_date + timedelta(days=1) - timedelta(microseconds=1)
 
+    try:
         for table in tables:
-
-            end_of_day = start_date + timedelta(hours=23, minutes=59, seconds=59, microseconds=59)
-
-            csv_dirs = os.path.join(dir_path, table)
-            csv_name = f"{table}_{start_date.strftime('%Y-%m-%d')}.csv"
-            csv_path = os.path.join(csv_dirs, csv_name)
-
-            # create csv path
-            if not os.path.exists(csv_dirs):
-                os.makedirs(csv_dirs)
-
-            # if file doesn't exist - make it
-            if not os.path.isfile(csv_path):
-                open(csv_path, 'w').close()
-
-            # open the csv file
-            try:
-                df = pd.read_csv(csv_path)
-            except pd.errors.EmptyDataError:
-                get_data_from_range(device, table, csv_path, start_date, end_of_day, header=True)
-                continue
-
-            if df.empty:
-                get_data_from_range(device, table, csv_path, start_date, end_of_day, header=False)
-
-            else:
-                # if the file already has data in it, it will just update the existing data from latest entry onwards
-                # get lastest date before updating - add a microsecond on, so no issues with duplication of record
-                latest = datetime.strptime(df['Datetime'].iloc[-1], "%Y-%m-%d %H:%M:%S") + timedelta(microseconds=1)
-                get_data_from_range(device, table, csv_path, latest, end_of_day, header=False)
-
-            print(f"Completed for {table} for {start_date.strftime('%Y-%m-%d')}")
-            time.sleep(3)
-
-        start_date = start_date + timedelta(1)
-
-
-def get_data_from_range(device, table, csv_path, start, end, header):
-    """ 
-    Gets range of data specified by start and end dates and saves to csv at the path specified.
-
-    :param device: (pycampbellcr1000.CR1000 object) URL for connection with logger in format 'tcp:iphost:port' or 'serial:/dev/ttyUSB0:19200:8N1'
-    :param table: (str) The name of the table on the logger from which the data is being extracted.
-    :param csv_path: (str) The path to the csv file to back fill with todays data.
-    :param start: (datetime.datetime) The start datetime from which to collect data
-    :param end: (datetime.datetime) The end datetime after which to stop collecting data. (end will be included in the data.) 
-    :returns: None
-    """
-    data = device.get_data(table, start, end)
-    content = data.to_csv(header=header)
-
-    with open(csv_path, "a") as f:
-        f.write(content)
+            records = backfill_table(device, table, start_date, end, dir_path, dt_header, retries=retries)
+            print(f"Completed for {table}, {records} records downloaded")
+    finally:
+        device.bye()
 
 
 def main():
@@ -117,10 +81,11 @@ def main():
         end_date = start_date
         complete_stmnt = f'Data downloaded for {args.start_date}'
 
-    url = CONFIG['common']['logger_url']
-    dir_path = os.path.expanduser(CONFIG['common']['logger_csv_path'])
+    config = get_config()
+    url = config['common']['logger_url']
+    dir_path = os.path.expanduser(config['common']['logger_csv_path'])
 
-    get_data(url, start_date, end_date, dir_path)
+    get_data(url, start_date, end_date, dir_path, args.retries)
     print(complete_stmnt)
 
 if __name__ == '__main__':
@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+
+import argparse
+import asyncio
+import signal
+import time
+from datetime import datetime, timedelta
+from energy_balance import get_config
+from energy_balance.logger.connection import connect, get_backoff
+from energy_balance.logger.sinks import SINK_NAMES, create_sinks
+
+# seconds to wait after each interval before polling, so the logger has time to write the record for that interval
+POLL_LAG = 5
+
+
+def arg_parse():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('-u', '--url',
+                        type=str,
+                        required=False,
+                        help="URL for connection with the logger, to use instead of logger_url in the config. "
+                             "Use 'sim:' to poll a simulated logger e.g. 'sim:60:0.1' for a record every 60 seconds and 10%% of requests failing.")
+
+    parser.add_argument('-i', '--interval',
+                        type=float,
+                        required=False,
+                        help="Seconds between polls of every table, to use instead of poll_interval and poll_intervals in the config.")
+
+    parser.add_argument('-s', '--sinks',
+                        type=str,
+                        nargs='+',
+                        choices=SINK_NAMES,
+                        help="Where to write the records, any of csv (the daily csv files), sqlite and mysql. Default is download_sinks in the config.")
+
+    parser.add_argument('-n', '--polls',
+                        type=int,
+                        required=False,
+                        help="Stop after polling each table this many times. Default is to run until stopped.")
+
+    return parser.parse_args()
+
+
+class LoggerDaemon:
+
+    """
+    Polls each logger table at its own interval over one long-lived connection, writing new records to the sinks e.g. the daily csv files.
+    Requests to the logger are made one at a time, in a worker thread, so the connection is shared safely between the tables.
+    If a request fails the connection is closed, then opened again when next needed, waiting longer after each failure.
+
+    :param url: (str) URL for connection with logger in format 'tcp:iphost:port' or 'serial:/dev/ttyUSB0:19200:8N1' ('sim:' for a simulated logger)
+    :param sinks: (energy_balance.logger.sinks.Sinks) Where to write the records, see energy_balance.logger.sinks.create_sinks.
+    :param intervals: (dict) The seconds between polls for each table name.
+    :param delay: (float) The time in seconds to wait after the first failure, doubling with each further failure. Default is 1.
+    :param max_delay: (float) The longest time in seconds to wait after a failure. Default is 300.
+    """
+
+    def __init__(self, url, sinks, intervals, delay=1, max_delay=300):
+        self.url = url
+        self.sinks = sinks
+        self.intervals = intervals
+        self.delay = delay
+        self.max_delay = max_delay
+
+        self.device = None
+        self.failures = 0
+        self._lock = None
+
+    def _close(self):
+        device, self.device = self.device, None
+        if device is not None:
+            try:
+                device.bye()
+            except Exception:
+                pass
+
+    async def request(self, method, *args):
+        """
+        Call a method of the logger connection in a worker thread, connecting first if needed.
+        Only one request is made at a time. If the request fails the connection is closed and the exception is raised.
+
+        :param method: (str) The name of the method e.g. get_data
+        :param args: The arguments of the method.
+        :returns: The return value of the method.
+        """
+        loop = asyncio.get_running_loop()
+
+        async with self._lock:
+            try:
+                if self.device is None:
+                    self.device = await loop.run_in_executor(None, connect, self.url)
+                    print(f"Connected to logger at {self.url}")
+
+                result = await loop.run_in_executor(None, getattr(self.device, method), *args)
+            except Exception:
+                self._close()
+                raise
+
+        self.failures = 0
+        return result
+
+    async def poll_table(self, table, interval, polls=None):
+        """
+        Poll a table for new records until cancelled, or for a number of polls.
+        Records are fetched from just after the last record saved to the sinks, so none are missed or duplicated, including across midnight.
+
+        :param table: (str) The name of the table on the logger.
+        :param interval: (float) The seconds between polls. Polls are made just after each multiple of the interval.
+        :param polls: (int) Optional. The number of polls to make. Default is to poll until cancelled.
+        :returns: None
+        """
+        loop = asyncio.get_running_loop()
+        made = 0
+
+        while polls is None or made < polls:
+            try:
+                # reading the last time can fail too e.g. if the database is down, so is retried in the same way as the download
+                latest = await loop.run_in_executor(None, self.sinks.get_last_time, table)
+                if latest is not None:
+                    # add a microsecond on, so the last record isn't duplicated
+                    start = latest + timedelta(microseconds=1)
+                else:
+                    start = datetime.combine(datetime.utcnow().date(), datetime.min.time())
+
+                data = await self.request('get_data', table, start)
+            except Exception as exc:
+                self.failures += 1
+                wait = get_backoff(self.failures, self.delay, self.max_delay)
+                print(f"Could not poll {table} ({exc}), retrying in {wait}s")
+                await asyncio.sleep(wait)
+                continue
+
+            # the sinks write in the background, this only waits if their queues are full
+            records = await loop.run_in_executor(None, self.sinks.write, table, data)
+            made += 1
+            print(f"{records} new records were found for {table}")
+
+            if polls is None or made < polls:
+                await asyncio.sleep(interval - time.time() % interval + POLL_LAG)
+
+    async def run(self, polls=None):
+        """
+        Poll all the tables until stopped (with SIGINT or SIGTERM), or for a number of polls of each table.
+
+        :param polls: (int) Optional. The number of polls of each table. Default is to poll until stopped.
+        :returns: None
+        """
+        self._lock = asyncio.Lock()
+        loop = asyncio.get_running_loop()
+
+        tasks = [asyncio.create_task(self.poll_table(table, interval, polls)) for table, interval in self.intervals.items()]
+        poller = asyncio.gather(*tasks)
+
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, poller.cancel)
+
+        try:
+            await poller
+        except asyncio.CancelledError:
+            print("Stopping")
+        finally:
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                loop.remove_signal_handler(sig)
+            self._close()
+            # finish writing the records downloaded
+            await loop.run_in_executor(None, self.sinks.close)
+
+
+def get_intervals(config, interval=None):
+    """
+    Get the seconds between polls of each logger table, from poll_interval and poll_intervals in the config.
+
+    :param config: (energy_balance.Config) The config.
+    :param interval: (float) Optional. The interval to use for every table instead of the config.
+    :returns: (dict) The interval for each table in logger_tables.
+    """
+    common = config['common']
+    if interval is not None:
+        return {table: interval for table in common['logger_tables']}
+
+    intervals = common.get('poll_intervals', {})
+    return {table: float(intervals.get(table, common['poll_interval'])) for table in common['logger_tables']}
+
+
+def main():
+    args = arg_parse()
+
+    config = get_config()
+    url = args.url or config['common']['logger_url']
+    intervals = get_intervals(config, args.interval)
+
+    daemon = LoggerDaemon(url, create_sinks(args.sinks, config), intervals)
+    asyncio.run(daemon.run(args.polls))
+
+if __name__ == '__main__':
+    main()
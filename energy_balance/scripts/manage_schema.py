@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+
+import os
+import argparse
+import sqlite3
+from datetime import date, datetime
+from energy_balance import get_config
+from energy_balance.logger.rollups import create_rollup_tables
+from energy_balance.logger.schema import (get_csv_columns, get_logger_columns, get_first_csv_date, get_month_starts,
+                                          get_create_table_query, get_partitions, get_add_partitions_query)
+
+
+def arg_parse():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('-s', '--source',
+                        type=str,
+                        required=False,
+                        default='csv',
+                        choices=['csv', 'logger'],
+                        help="Where to find the columns of the tables: csv uses the header of the latest daily csv file of each table "
+                             "in logger_csv_path, logger uses the table definitions on the logger. Default is csv.")
+
+    parser.add_argument('--url',
+                        type=str,
+                        required=False,
+                        help="URL for connection with the logger, with -s logger, to use instead of logger_url in the config. "
+                             "Use 'sim:' for a simulated logger.")
+
+    parser.add_argument('-l', '--local',
+                        type=str,
+                        required=False,
+                        help="Create the tables in a local sqlite database at this path instead of MySQL, e.g. for testing. "
+                             "These tables are not partitioned.")
+
+    parser.add_argument('-f', '--from',
+                        dest='from_month',
+                        type=str,
+                        required=False,
+                        help="The first month to create a partition for when creating a table, in the format YYYY-MM e.g. 2021-07. "
+                             "Default is the month of the oldest daily csv file in logger_csv_path, or this month if there are none.")
+
+    parser.add_argument('-a', '--months-ahead',
+                        type=int,
+                        required=False,
+                        help="The number of months after this one to create partitions for. Default is partition_months_ahead in the config.")
+
+    parser.add_argument('-u', '--user',
+                        type=str,
+                        required=False,
+                        help="User for mysql database, to use instead of user in the [mysql] section of the config.")
+
+    parser.add_argument('-p', '--password',
+                        type=str,
+                        required=False,
+                        help="Password for mysql database, to use instead of password in the [mysql] section of the config.")
+
+    parser.add_argument('-d', '--database',
+                        type=str,
+                        required=False,
+                        help="Database name, to use instead of database in the [mysql] section of the config.")
+
+    parser.add_argument('-n', '--dry-run',
+                        action='store_true',
+                        help="Print the queries that would be run to create the tables, without connecting to the database.")
+
+    return parser.parse_args()
+
+
+def get_table_columns(source, config, url=None):
+    """
+    Get the columns of each logger table, from the csv files or the logger.
+
+    :param source: (str) 'csv' to use the header of the latest daily csv file of each table, or 'logger' to use the table definitions on the logger.
+    :param config: (energy_balance.Config) The config.
+    :param url: (str) Optional. URL for connection with the logger, with source 'logger'. Default is logger_url in the config.
+    :returns: (dict) The (name, type) of each column for each logger table in logger_tables.
+    """
+    common = config['common']
+    dt_header = common['datetime_header']
+
+    if source == 'csv':
+        dir_path = os.path.expanduser(common['logger_csv_path'])
+        return {table: get_csv_columns(dir_path, table, dt_header) for table in common['logger_tables']}
+
+    # imported here so that other commands (and --help) don't have to load it
+    from energy_balance.logger.connection import connect
+
+    device = connect(url or common['logger_url'])
+    try:
+        return {table: get_logger_columns(device, table, dt_header) for table in common['logger_tables']}
+    finally:
+        device.bye()
+
+
+def get_first_month(config, from_month=None):
+    """
+    Get the first month to create a partition for, so the records already downloaded are spread across monthly partitions.
+
+    :param config: (energy_balance.Config) The config.
+    :param from_month: (str) Optional. The month in the format YYYY-MM e.g. 2021-07. Default is the month of the oldest daily csv file
+                       of the logger tables in logger_csv_path, or this month if there are none.
+    :returns: (datetime.date) The first day of the month.
+    """
+    if from_month is not None:
+        return datetime.strptime(from_month, '%Y-%m').date()
+
+    common = config['common']
+    first = get_first_csv_date(os.path.expanduser(common['logger_csv_path']), common['logger_tables'])
+    first = first if first is not None else datetime.utcnow().date()
+    return first.replace(day=1)
+
+
+def create_tables(cnx, columns, config, dialect='mysql', months_ahead=None, start=None, dry_run=False):
+    """
+    Create the database table of each logger table that doesn't exist yet, with the date/time column as the primary key, and its rollup tables.
+    For MySQL, the tables are partitioned by month from the month of start, and partitions are added to existing tables so there is always one for each of the
+    next months_ahead months. Running this every month (e.g. from cron) keeps the partitions ahead of the data.
+    Records later than the last monthly partition are kept in the partition pmax, so loading never fails for want of a partition.
+
+    :param cnx: The open database connection, or None if dry_run is True.
+    :param columns: (dict) The (name, type) of each column for each logger table, see get_table_columns.
+    :param config: (energy_balance.Config) The config.
+    :param dialect: (str) 'mysql', or 'sqlite' for a local database. Default is 'mysql'.
+    :param months_ahead: (int) Optional. The number of months after this one to create partitions for. Default is partition_months_ahead in the config.
+    :param start: (datetime.date) Optional. A date in the first month to create a partition for when creating a table, see get_first_month.
+                  Default is this month.
+    :param dry_run: (bool) If True the queries are printed instead of run. Default is False.
+    :returns: None
+    """
+    common = config['common']
+    dt_header = common['datetime_header']
+    tables = dict(zip(common['logger_tables'], common['mysql_tables']))
+    months_ahead = common['partition_months_ahead'] if months_ahead is None else months_ahead
+
+    today = datetime.utcnow().date()
+    month = today.year * 12 + today.month - 1 + months_ahead
+    until = date(month // 12, month % 12 + 1, 1)
+    months = get_month_starts(min(start, today) if start is not None else today, until)
+
+    cur = cnx.cursor() if not dry_run else None
+    try:
+        for table, name in tables.items():
+            query = get_create_table_query(name, columns[table], dt_header, dialect, months)
+            if dry_run:
+                print(f"{query};\n")
+                continue
+
+            cur.execute(query)
+            create_rollup_tables(cur, name, common.get('rollup_periods', ()))
+
+            if dialect == 'mysql':
+                partitions = get_partitions(cur, name)
+                if not partitions:
+                    print(f"{name} already exists and is not partitioned, so no partitions were added")
+                    continue
+
+                query, added = get_add_partitions_query(name, partitions, until)
+                if query is not None:
+                    cur.execute(query)
+                print(f"{name} is partitioned up to {until.strftime('%Y-%m')}, {len(added)} partitions added")
+            else:
+                print(f"{name} is ready")
+
+        if not dry_run:
+            cnx.commit()
+    finally:
+        if cur is not None:
+            cur.close()
+
+
+def main():
+    args = arg_parse()
+
+    config = get_config()
+    columns = get_table_columns(args.source, config, args.url)
+    dialect = 'sqlite' if args.local else 'mysql'
+    start = get_first_month(config, args.from_month)
+
+    if args.dry_run:
+        create_tables(None, columns, config, dialect, args.months_ahead, start, dry_run=True)
+        return
+
+    if args.local:
+        cnx = sqlite3.connect(os.path.expanduser(args.local))
+    else:
+        # imported here so that other commands (and --help) don't have to load it
+        import mysql.connector
+
+        mysql_config = config['mysql']
+        cnx = mysql.connector.connect(host=mysql_config['host'],
+                                      user=args.user or mysql_config['user'],
+                                      password=args.password or mysql_config['password'],
+                                      database=args.database or mysql_config['database'])
+
+    try:
+        create_tables(cnx, columns, config, dialect, args.months_ahead, start)
+    finally:
+        cnx.close()
+
+if __name__ == '__main__':
+    main()
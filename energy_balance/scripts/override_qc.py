@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+
+import argparse
+import os
+import sys
+from datetime import datetime
+from energy_balance import get_config
+
+
+def arg_parse():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('-d', '--data-product',
+                        type=str,
+                        required=True,
+                        choices=['soil', 'radiation'],
+                        help="The data product of the files to override the QC flags of.")
+
+    parser.add_argument('-v', '--variable',
+                        type=str,
+                        required=True,
+                        help="The QC flag variable to set, with or without the qc_flag_ prefix e.g. 'qc_flag_soil_temperature' or 'soil_temperature'.")
+
+    parser.add_argument('-i', '--index',
+                        type=int,
+                        required=False,
+                        help="Only for soil variables. The index (sensor) to set the flag for, from 1, e.g. 2 for the second soil temperature sensor. "
+                             "Default is all indexes.")
+
+    parser.add_argument('-f', '--flag',
+                        type=int,
+                        required=True,
+                        help="The flag to set e.g. 3 for suspect data, see the flag_meanings of the QC flag variable.")
+
+    parser.add_argument('-p', '--periods',
+                        type=str,
+                        nargs='+',
+                        required=True,
+                        help="The periods to set the flag in, each as start/end, inclusive, "
+                             "e.g. 2021-07-30T10:00:00/2021-07-30T12:30:00 2021-08-02T09:00:00/2021-08-04T17:00:00")
+
+    parser.add_argument('-m', '--comment',
+                        type=str,
+                        required=False,
+                        default='',
+                        help="The reason for the override, kept in the QC override log.")
+
+    parser.add_argument('--no-log',
+                        action='store_true',
+                        help="If set, the override is not added to the QC override log, so it is not applied when the files are created again from the csv files.")
+
+    parser.add_argument('-c', '--config',
+                        type=str,
+                        required=False,
+                        help="Path to a config file to use instead of the one set in the CONFIG environment variable. It is read on top of the default config file.")
+
+    return parser.parse_args()
+
+
+def get_override_files(override, config=None):
+    """
+    Find the existing daily and monthly netCDF files with records in the periods of an override.
+
+    :param override: (dict) The override, see energy_balance.netcdf.qc_overrides.create_override.
+    :param config: (energy_balance.Config) Optional. The config to use, the config from the config files if not provided.
+    :returns: (list) The paths of the files, daily files first, in date order.
+    """
+    # imported here so that other commands (and --help) don't have to load them
+    import numpy as np
+    from energy_balance.netcdf.base_netcdf import BaseNetCDF
+    from energy_balance.netcdf.times import parse_period
+
+    days = set()
+    for period in override['periods']:
+        start, end = (np.datetime64(t, 's').astype('datetime64[D]') for t in parse_period(period))
+        days.update(np.arange(start, end + 1))
+
+    months = {day.astype('datetime64[M]') for day in days}
+    dates = [str(d).replace('-', '') for d in sorted(days)] + [str(m).replace('-', '') for m in sorted(months)]
+
+    fpaths = [BaseNetCDF.get_output_file(d, override['data_product'], config) for d in dates]
+    return [fpath for fpath in fpaths if os.path.isfile(fpath)]
+
+
+def get_flag_values(qc_var):
+    """
+    Get the flags allowed in a QC flag variable, from its flag_values attribute e.g. "0b,1b,2b,3b,4b".
+
+    :param qc_var: (netCDF4.Variable) The QC flag variable.
+    :returns: (list) The flags, or None if the variable has no flag_values.
+    """
+    if 'flag_values' not in qc_var.ncattrs():
+        return None
+    return [int(v.strip().rstrip('b')) for v in qc_var.flag_values.split(',') if v.strip()]
+
+
+def get_slabs(selected):
+    """
+    Get the contiguous runs of selected records, so only those slabs of a variable are written.
+
+    :param selected: (numpy.ndarray) Boolean array, True for each record to write.
+    :returns: (list) The (start, stop) index of each run, stop is exclusive.
+    """
+    # imported here so that other commands (and --help) don't have to load it
+    import numpy as np
+
+    indexes = np.flatnonzero(selected)
+    if len(indexes) == 0:
+        return []
+
+    breaks = np.flatnonzero(np.diff(indexes) > 1)
+    starts = indexes[np.concatenate(([0], breaks + 1))]
+    stops = indexes[np.concatenate((breaks, [len(indexes) - 1]))] + 1
+    return list(zip(starts.tolist(), stops.tolist()))
+
+
+def override_file(fpath, override, qc_value):
+    """
+    Set the QC flags of an override in a netCDF file in place, writing only the slabs of records in the override's periods,
+    then recalculate valid_min and valid_max of the variables masked by the QC flag variable and set last_revised_date, in the same pass.
+
+    :param fpath: (str) Path to the netCDF file.
+    :param override: (dict) The override, see energy_balance.netcdf.qc_overrides.create_override.
+    :param qc_value: (int) Max value of qc to use for valid_min and valid_max, see calculate_valid_min_max.
+    :returns: (tuple) The number of records set and the (name, valid_min, valid_max) of each variable updated, see update_dataset.
+    """
+    # imported here so that other commands (and --help) don't have to load them
+    import numpy as np
+    from netCDF4 import Dataset
+    from energy_balance.netcdf.times import parse_period, in_periods
+    from energy_balance.netcdf.masks import COMMON_QC_VARIABLES, get_qc_pairs
+    from energy_balance.scripts.calculate_valid_min_max import update_dataset
+
+    name = override['variable']
+    index = override['index']
+
+    with Dataset(fpath, 'r+') as dataset:
+        if name not in dataset.variables:
+            raise ValueError(f"{name} is not in {fpath}")
+
+        qc_var = dataset[name]
+        flag_values = get_flag_values(qc_var)
+        if flag_values is not None and override['flag'] not in flag_values:
+            raise ValueError(f"Flag {override['flag']} is not one of the flag_values of {name}: {qc_var.flag_values}")
+        if index is not None and 'index' not in qc_var.dimensions:
+            raise ValueError(f"{name} has no index dimension, so an index can't be set")
+
+        time_var = dataset['time']
+        time_var.set_auto_mask(False)
+        times = np.rint(time_var[:]).astype(np.int64)
+        selected = in_periods(times, [parse_period(p) for p in override['periods']])
+        slabs = get_slabs(selected)
+        if not slabs:
+            return 0, []
+
+        for start, stop in slabs:
+            if index is None:
+                qc_var[start:stop] = override['flag']
+            else:
+                qc_var[start:stop, index - 1] = override['flag']
+
+        # the variables masked by this QC flag variable, which is every variable with its dimensions for a common one e.g. qc_flag_cleaning
+        var_names = {var_name: qc_name for var_name, qc_name in get_qc_pairs(dataset).items()
+                     if qc_name == name or (name in COMMON_QC_VARIABLES and set(qc_var.dimensions) <= set(dataset[var_name].dimensions))}
+        updated = update_dataset(dataset, qc_value, var_names)
+        dataset.last_revised_date = datetime.utcnow().isoformat()
+
+    return int(selected.sum()), updated
+
+
+def main():
+    args = arg_parse()
+
+    # imported here so that other commands (and --help) don't have to load numpy and pandas
+    from energy_balance.netcdf.qc_overrides import create_override, get_override_columns, get_log_path, log_override
+
+    config = get_config(config_file=args.config)
+    qc_value = config['common']['qc_flag_level']
+
+    override = create_override(args.data_product, args.variable, args.flag, args.periods, args.index, args.comment)
+    # checks the index against the headers in the config, before any file is changed
+    get_override_columns(override, config)
+
+    if not args.no_log and get_log_path(config) is None:
+        raise ValueError("qc_override_log is not set in the config, set it so the override is applied when the files are created again, or use --no-log")
+
+    fpaths = get_override_files(override, config)
+    if not fpaths:
+        print(f"No {args.data_product} netCDF files found for {' '.join(args.periods)}")
+
+    failed = 0
+    for fpath in fpaths:
+        try:
+            count, updated = override_file(fpath, override, qc_value)
+        except Exception as exc:
+            failed += 1
+            print(f"{fpath}: failed ({type(exc).__name__}: {exc})")
+            continue
+
+        print(f"{fpath}: {override['variable']} set to {override['flag']} for {count} records")
+        for name, valid_min, valid_max in updated:
+            if valid_min is None:
+                print(f"{fpath}: {name} has no valid values, valid min and valid max not changed")
+            else:
+                print(f"{fpath}: {name} valid min {valid_min}, valid max {valid_max}")
+
+    if failed:
+        print(f"Override failed for {failed} of {len(fpaths)} files, so it was not added to the QC override log")
+        sys.exit(1)
+
+    if not args.no_log:
+        log_override(override, config)
+        print(f"Override added to {get_log_path(config)}")
+
+if __name__ == '__main__':
+    main()
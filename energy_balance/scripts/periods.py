@@ -0,0 +1,98 @@
+from dateutil.relativedelta import relativedelta
+
+SUCCESS = 'success'
+SKIPPED = 'skipped'
+FAILED = 'failed'
+
+
+def get_periods(start_date, end_date, frequency):
+    """
+    Get the date of each period (day or month) between the start and end dates.
+
+    :param start_date: (datetime.datetime) The first date.
+    :param end_date: (datetime.datetime) The last date. This is inclusive.
+    :param frequency: (str) The frequency of the periods - daily or monthly.
+    :returns: (list) The datetime.datetime for the start of each period.
+    """
+    if frequency == 'daily':
+        delta = relativedelta(days=1)
+    else:
+        delta = relativedelta(months=1)
+
+    periods = []
+    while start_date <= end_date:
+        periods.append(start_date)
+        start_date += delta
+
+    return periods
+
+
+def run_period(func, *args):
+    """
+    Run the function for one period and record the outcome instead of raising.
+    A FileNotFoundError means there was no input data, so the period is reported as skipped.
+
+    :param func: (function) The function to run, the first argument must be the date of the period.
+    :param args: The arguments to pass to func.
+    :returns: (tuple) The date of the period, the status (success, skipped or failed) and an error message or None.
+    """
+    date = args[0]
+    try:
+        func(*args)
+    except FileNotFoundError:
+        return date, SKIPPED, None
+    except Exception as exc:
+        return date, FAILED, f"{type(exc).__name__}: {exc}"
+
+    return date, SUCCESS, None
+
+
+def run_periods(func, tasks, workers=1):
+    """
+    Run the function for each period, in a pool of processes if more than one worker is requested.
+    Each period must be independent i.e. read its own input files and write its own output file.
+
+    :param func: (function) The function to run for each period, must be defined at module level so it can be sent to worker processes.
+    :param tasks: (list) A tuple of arguments to pass to func for each period, the first argument must be the date of the period.
+    :param workers: (int) The number of processes to use. Default is 1, which runs each period in this process.
+    :returns: (list) A (date, status, message) tuple for each period, in date order.
+    """
+    if workers <= 1 or len(tasks) <= 1:
+        return [run_period(func, *task) for task in tasks]
+
+    # only imported when needed, as it is slow to import
+    from concurrent.futures import ProcessPoolExecutor
+
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(run_period, func, *task) for task in tasks]
+        for task, future in zip(tasks, futures):
+            try:
+                results.append(future.result())
+            except Exception as exc:
+                # the period couldn't be run at all e.g. its worker process died (BrokenProcessPool) or its arguments couldn't be pickled
+                results.append((task[0], FAILED, f"{type(exc).__name__}: {exc}"))
+
+    return results
+
+
+def report_periods(results, frequency):
+    """
+    Print the outcome for each period and a summary of the run.
+
+    :param results: (list) A (date, status, message) tuple for each period, as returned by run_periods.
+    :param frequency: (str) The frequency of the periods - daily or monthly.
+    :returns: (int) The number of periods that failed.
+    """
+    date_format = "%Y-%m-%d" if frequency == 'daily' else "%Y-%m"
+    counts = {SUCCESS: 0, SKIPPED: 0, FAILED: 0}
+
+    for date, status, message in results:
+        counts[status] += 1
+        line = f"{date.strftime(date_format)}: {status}"
+        if message:
+            line += f" ({message})"
+        print(line)
+
+    print(f"{counts[SUCCESS]} succeeded, {counts[SKIPPED]} skipped, {counts[FAILED]} failed")
+    return counts[FAILED]
@@ -4,12 +4,14 @@ __author__ = 'Elle Smith'
 __date__ = '12 Aug 2021'
 __contact__ = 'eleanor.smith@stfc.ac.uk'
 
-import pandas as pd
 import argparse
-import matplotlib.pyplot as plt
+import glob
 import os
-from datetime import datetime
-from energy_balance import CONFIG
+from datetime import datetime, timedelta
+from energy_balance import get_config
+
+# points drawn for each pixel of the width of the plot, the minimum and the maximum of the values in that pixel
+POINTS_PER_PIXEL = 2
 
 def arg_parse():
     parser = argparse.ArgumentParser()
@@ -17,50 +19,329 @@ def arg_parse():
     parser.add_argument('-s', '--start',
                         type=str,
                         required=False,
-                        help="The start date/time for the plot in 'YYYY-MM-dd HH:MM:SS' format. e.g. '2021-07-10 04:00:00'.")
+                        help="The start date/time for the plot in 'YYYY-MM-dd HH:MM:SS' format. e.g. '2021-07-10 04:00:00'. "
+                             "Required with --table and --netcdf.")
 
     parser.add_argument('-e', '--end',
                         type=str,
                         required=False,
-                        help="The end date/time for the plot in 'YYYY-MM-dd HH:MM:SS' format. e.g. '2021-07-10 16:00:00'.")
+                        help="The end date/time for the plot in 'YYYY-MM-dd HH:MM:SS' format. e.g. '2021-07-10 16:00:00'. "
+                             "Default is the end of the data, or the end of the start day with --table and --netcdf.")
+
+    source = parser.add_mutually_exclusive_group(required=True)
 
-    parser.add_argument('-fp', '--file-path',
+    source.add_argument('-fp', '--file-path',
                         type=str,
-                        required=True,
-                        help="The path to the csv file to plot. e.g. /path/to/file.csv")
+                        nargs='+',
+                        help="The path to the csv file to plot. e.g. /path/to/file.csv. "
+                             "Several files, or a glob pattern (quoted), can be given to plot them together e.g. '/path/to/soil_qc_202107*.csv'")
+
+    source.add_argument('-t', '--table',
+                        type=str,
+                        help="The logger table to plot, from the daily csv files in logger_csv_path from start to end e.g. 'SoilTemperature'.")
+
+    source.add_argument('-n', '--netcdf',
+                        type=str,
+                        choices=['soil', 'radiation'],
+                        help="The data product to plot, from the netCDF files in netcdf_path from start to end. "
+                             "The columns are then netCDF variables e.g. 'soil_temperature', with a line for each index.")
+
+    parser.add_argument('-f', '--frequency',
+                        type=str,
+                        required=False,
+                        default='daily',
+                        choices=['daily', 'monthly'],
+                        help="Only with --netcdf. Whether to read the daily or monthly netCDF files. Default is daily.")
 
     parser.add_argument('-c', '--columns',
                         type=str,
                         required=True,
                         help="The columns from the csv to plot against datetime, provide as comma separated list if more than one e.g. 'IR01Dn,IR01Up'.")
 
+    parser.add_argument('-r', '--resolution',
+                        type=int,
+                        required=False,
+                        help="The number of pixels across the plot to reduce the data to, keeping the minimum and maximum in each. "
+                             "Default is the width of the plot on screen. Use 0 to plot every point.")
+
+    parser.add_argument('-o', '--output',
+                        type=str,
+                        required=False,
+                        help="Save the plot to this file e.g. plot.png instead of showing it.")
+
     return parser.parse_args()
 
 
-def plot(start, end, columns, fpath):
+def to_epoch(time):
+    """
+    Convert a date/time string to seconds since 1970-01-01T00:00:00.
+
+    :param time: (str) The date/time in 'YYYY-MM-dd HH:MM:SS' format, or None.
+    :returns: (int) Seconds since 1970-01-01T00:00:00, or None if time is None.
+    """
+    if time is None:
+        return None
+    return int((datetime.strptime(time, "%Y-%m-%d %H:%M:%S") - datetime(1970, 1, 1)).total_seconds())
+
+
+def get_days(start, end):
+    """
+    Get each day from the day of start to the day of end.
+
+    :param start: (str) The start date/time in 'YYYY-MM-dd HH:MM:SS' format.
+    :param end: (str) The end date/time in 'YYYY-MM-dd HH:MM:SS' format.
+    :returns: (list) The days, as datetime.date.
+    """
+    day = datetime.strptime(start, "%Y-%m-%d %H:%M:%S").date()
+    last = datetime.strptime(end, "%Y-%m-%d %H:%M:%S").date()
+
+    days = []
+    while day <= last:
+        days.append(day)
+        day += timedelta(days=1)
+    return days
+
+
+def get_table_files(table, start, end, config=None):
+    """
+    Find the daily csv files of a logger table from start to end.
+
+    :param table: (str) The name of the logger table e.g. SoilTemperature
+    :param start: (str) The start date/time in 'YYYY-MM-dd HH:MM:SS' format.
+    :param end: (str) The end date/time in 'YYYY-MM-dd HH:MM:SS' format.
+    :param config: (energy_balance.Config) Optional. The config to use, the config from the config files if not provided.
+    :returns: (list) The paths of the csv files that exist, in date order.
+    """
+    # imported here so that other commands (and --help) don't have to load it
+    from energy_balance.logger.csv_files import get_csv_path
+
+    config = config if config is not None else get_config()
+    dir_path = os.path.expanduser(config['common']['logger_csv_path'])
+
+    fpaths = [get_csv_path(dir_path, table, day) for day in get_days(start, end)]
+    return [fpath for fpath in fpaths if os.path.isfile(fpath)]
+
+
+def get_netcdf_files(data_product, start, end, frequency='daily', config=None):
+    """
+    Find the daily or monthly netCDF files of a data product from start to end.
+
+    :param data_product: (str) The data product e.g. soil or radiation.
+    :param start: (str) The start date/time in 'YYYY-MM-dd HH:MM:SS' format.
+    :param end: (str) The end date/time in 'YYYY-MM-dd HH:MM:SS' format.
+    :param frequency: (str) 'daily' or 'monthly'. Default is daily.
+    :param config: (energy_balance.Config) Optional. The config to use, the config from the config files if not provided.
+    :returns: (list) The paths of the netCDF files that exist, in date order.
+    """
+    # imported here so that other commands (and --help) don't have to load it
+    from energy_balance.netcdf.base_netcdf import BaseNetCDF
+
+    dates = []
+    for day in get_days(start, end):
+        date = BaseNetCDF.convert_date_to_string(day, frequency)
+        if date not in dates:
+            dates.append(date)
+
+    fpaths = [BaseNetCDF.get_output_file(date, data_product, config) for date in dates]
+    return [fpath for fpath in fpaths if os.path.isfile(fpath)]
+
+
+def read_csv_range(fpaths, columns, dt_header, start=None, end=None):
+    """
+    Read some columns of csv files, keeping only the rows from start to end (inclusive).
+    Only the date/time column and the columns requested are parsed.
+
+    :param fpaths: (list) The paths of the csv files.
+    :param columns: (list) The columns to read.
+    :param dt_header: (str) The name of the date/time column.
+    :param start: (int) Optional. The start time in seconds since 1970-01-01T00:00:00. Default is the start of the data.
+    :param end: (int) Optional. The end time in seconds since 1970-01-01T00:00:00. Default is the end of the data.
+    :returns: (tuple) The times, as an int64 array of seconds since 1970-01-01T00:00:00 in time order,
+              and the values of each column at those times, as float arrays.
     """
-    Plot the columns from the csv specified.
-    
+    # imported here so that other commands (and --help) don't have to load them
+    import numpy as np
+    import pandas as pd
+    from energy_balance.netcdf.times import to_epoch_seconds
+
+    times = []
+    values = {column: [] for column in columns}
+    for fpath in fpaths:
+        df = pd.read_csv(fpath, usecols=[dt_header] + columns)
+        file_times = to_epoch_seconds(df[dt_header])
+
+        selected = np.ones(len(file_times), dtype=bool)
+        if start is not None:
+            selected &= file_times >= start
+        if end is not None:
+            selected &= file_times <= end
+
+        times.append(file_times[selected])
+        for column in columns:
+            values[column].append(pd.to_numeric(df[column], errors='coerce').to_numpy(dtype=float)[selected])
+
+    if not times:
+        return np.array([], dtype=np.int64), {column: np.array([]) for column in columns}
+
+    times = np.concatenate(times)
+    order = np.argsort(times, kind='stable')
+    return times[order], {column: np.concatenate(v)[order] for column, v in values.items()}
+
+
+def read_netcdf_range(fpaths, variables, start=None, end=None):
+    """
+    Read some variables of netCDF files, reading only the records from start to end (inclusive).
+    Variables with an index dimension e.g. soil_temperature are split into a column for each index e.g. soil_temperature_1.
+    Fill values are read as nan.
+
+    :param fpaths: (list) The paths of the netCDF files, in time order.
+    :param variables: (list) The names of the variables to read.
+    :param start: (int) Optional. The start time in seconds since 1970-01-01T00:00:00. Default is the start of the data.
+    :param end: (int) Optional. The end time in seconds since 1970-01-01T00:00:00. Default is the end of the data.
+    :returns: (tuple) The times, as an int64 array of seconds since 1970-01-01T00:00:00, and the values of each column, as float arrays.
+    """
+    # imported here so that other commands (and --help) don't have to load them
+    import numpy as np
+    from netCDF4 import Dataset
+
+    times = []
+    values = {}
+    for fpath in fpaths:
+        with Dataset(fpath, 'r') as dataset:
+            time_var = dataset['time']
+            time_var.set_auto_mask(False)
+            file_times = np.rint(time_var[:]).astype(np.int64)
+
+            first = 0 if start is None else np.searchsorted(file_times, start, side='left')
+            last = len(file_times) if end is None else np.searchsorted(file_times, end, side='right')
+            if first >= last:
+                continue
+            times.append(file_times[first:last])
+
+            for name in variables:
+                var = dataset[name]
+                var.set_auto_mask(False)
+                data = var[first:last].astype(float)
+                if '_FillValue' in var.ncattrs():
+                    data[data == var._FillValue] = np.nan
+
+                if data.ndim == 1:
+                    values.setdefault(name, []).append(data)
+                else:
+                    for i in range(data.shape[1]):
+                        values.setdefault(f"{name}_{i + 1}", []).append(data[:, i])
+
+    if not times:
+        return np.array([], dtype=np.int64), {}
+    return np.concatenate(times), {column: np.concatenate(v) for column, v in values.items()}
+
+
+def decimate(x, y, bins):
+    """
+    Reduce a line to the minimum and maximum of its values in each of a number of equal bins along x, e.g. one for each pixel across
+    the plot, so it looks the same when drawn but with far fewer points. Peaks are never lost, and a bin with only missing values
+    keeps one, so gaps in the data are still shown.
+
+    :param x: (numpy.ndarray) The x values, in ascending order.
+    :param y: (numpy.ndarray) The y values, nan if missing.
+    :param bins: (int) The number of bins. If there are no more than POINTS_PER_PIXEL points per bin, the line is not changed.
+    :returns: (tuple) The x and y values of the points kept, in the order of x.
+    """
+    # imported here so that other commands (and --help) don't have to load it
+    import numpy as np
+
+    if bins <= 0 or len(x) <= bins * POINTS_PER_PIXEL:
+        return x, y
+
+    edges = np.linspace(x[0], x[-1], bins + 1)
+    ids = np.clip(np.searchsorted(edges, x, side='right') - 1, 0, bins - 1)
+
+    def first_of_each_bin(order):
+        sorted_ids = ids[order]
+        return order[np.concatenate(([True], sorted_ids[1:] != sorted_ids[:-1]))]
+
+    # nan is sorted last, so sorting each bin by y gives its minimum first, and by -y its maximum first
+    keep = np.union1d(first_of_each_bin(np.lexsort((y, ids))), first_of_each_bin(np.lexsort((-y, ids))))
+    return x[keep], y[keep]
+
+
+def plot(start, end, columns, fpath=None, table=None, data_product=None, frequency='daily', resolution=None, output=None, config=None):
+    """
+    Plot columns from csv files, the daily csv files of a logger table or netCDF files, against datetime.
+    Only the columns and rows needed are read, and each line is reduced to the minimum and maximum in each pixel across the plot
+    (see decimate), so long time ranges can be plotted quickly. The lines are reduced again from all the data when zooming in.
+
     :param start: (str) The start date/time from which to plot.
     :param end: (str) The end date/time for the plot.
     :param columns: (list) List of columns to plot.
-    :param fpath: (str) File path of csv file.
+    :param fpath: (str or list) File path of csv file, or a list of them.
+    :param table: (str) Optional. The logger table to plot from the daily csv files, instead of fpath.
+    :param data_product: (str) Optional. The data product to plot from the netCDF files, instead of fpath.
+    :param frequency: (str) Optional. 'daily' or 'monthly', the netCDF files to read with data_product. Default is daily.
+    :param resolution: (int) Optional. The number of pixels to reduce the lines to. Default is the width of the plot, 0 plots every point.
+    :param output: (str) Optional. Save the plot to this file instead of showing it.
+    :param config: (energy_balance.Config) Optional. The config to use, the config from the config files if not provided.
     :returns: None
     """
-    dt_header = CONFIG['common']['datetime_header']
-    df = pd.read_csv(fpath)
+    # imported here so that other commands (and --help) don't have to load them
+    import matplotlib.dates as mdates
+    import matplotlib.pyplot as plt
+    import numpy as np
+
+    config = config if config is not None else get_config()
+    dt_header = config['common']['datetime_header']
+
+    if fpath is not None:
+        fpaths = [fpath] if isinstance(fpath, str) else list(fpath)
+    else:
+        if not start:
+            raise ValueError("A start date/time is required to plot a logger table or netCDF files")
+        end = end or f"{start[:10]} 23:59:59"
+
+        if table is not None:
+            fpaths = get_table_files(table, start, end, config)
+        else:
+            fpaths = get_netcdf_files(data_product, start, end, frequency, config)
 
-    if not start:
-        start = df[dt_header][0]
-    
-    if not end:
-        end = df[dt_header].iloc[-1]
-    
-    df['TIMESTAMP'] = pd.to_datetime((df[dt_header]))
-    df = df[(df['TIMESTAMP'] > start) & (df['TIMESTAMP'] < end)]
-    
-    df.plot(x="TIMESTAMP", y=columns)
-    plt.show()
+    if not fpaths:
+        raise FileNotFoundError(f"No files found to plot from {start} to {end}")
+
+    if data_product is not None:
+        times, values = read_netcdf_range(fpaths, columns, to_epoch(start), to_epoch(end))
+    else:
+        times, values = read_csv_range(fpaths, columns, dt_header, to_epoch(start), to_epoch(end))
+
+    if len(times) == 0:
+        raise ValueError(f"No data found to plot from {start or 'the start'} to {end or 'the end'}")
+
+    x = mdates.date2num(times.astype('datetime64[s]'))
+
+    fig, ax = plt.subplots()
+    bins = resolution if resolution is not None else int(ax.get_window_extent().width)
+
+    lines = {}
+    for column, y in values.items():
+        line, = ax.plot(*decimate(x, y, bins), label=column)
+        lines[line] = y
+
+    def redraw(ax):
+        # reduce the lines again from all the points in view, so zooming in shows the detail
+        lower, upper = ax.get_xlim()
+        first = max(np.searchsorted(x, lower, side='left') - 1, 0)
+        last = np.searchsorted(x, upper, side='right') + 1
+        for line, y in lines.items():
+            line.set_data(*decimate(x[first:last], y[first:last], bins))
+
+    ax.callbacks.connect('xlim_changed', redraw)
+    ax.xaxis_date()
+    ax.set_xlabel(dt_header)
+    ax.legend()
+    fig.autofmt_xdate()
+
+    if output:
+        fig.savefig(os.path.expanduser(output))
+    else:
+        plt.show()
 
 
 def validate_time(time):
@@ -84,14 +365,20 @@ def main():
 
     if start:
         start = validate_time(start)
-    
+
     if end:
         end = validate_time(end)
 
-    fpath = os.path.expanduser(args.file_path)
-    columns = args.columns.strip(' ').split(',')
+    fpaths = None
+    if args.file_path:
+        fpaths = [p for fpath in args.file_path for p in sorted(glob.glob(os.path.expanduser(fpath)))]
+        if not fpaths:
+            raise FileNotFoundError(f"No csv files found for {' '.join(args.file_path)}")
+
+    columns = [c.strip() for c in args.columns.split(',')]
 
-    plot(start, end, columns, fpath)
+    plot(start, end, columns, fpaths, table=args.table, data_product=args.netcdf, frequency=args.frequency,
+         resolution=args.resolution, output=args.output)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+
+import argparse
+import os
+import sys
+from datetime import datetime
+from energy_balance import get_config
+from energy_balance.netcdf.chunked import get_max_memory, process_in_chunks
+from energy_balance.scripts.create_qc_csvs import get_csv_paths
+from energy_balance.scripts.periods import get_periods, run_periods, report_periods
+
+DATA_PRODUCTS = ['soil', 'radiation']
+
+def get_classes(data_product):
+    """
+    Get the quality control and netCDF classes for the data product.
+    They are imported here so that --help, and other commands, don't have to load pandas and netCDF4.
+
+    :param data_product: (str) The data product e.g. radiation or soil
+    :returns: (tuple) The QualityControl and BaseNetCDF classes for the data product.
+    """
+    if data_product == 'soil':
+        from energy_balance.netcdf.soil_quality_control import SoilQualityControl
+        from energy_balance.netcdf.soil_netcdf import SoilNetCDF
+        return SoilQualityControl, SoilNetCDF
+    elif data_product == 'radiation':
+        from energy_balance.netcdf.radiation_quality_control import RadiationQualityControl
+        from energy_balance.netcdf.radiation_netcdf import RadiationNetCDF
+        return RadiationQualityControl, RadiationNetCDF
+
+def arg_parse():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('-s', '--start-date',
+                        type=str,
+                        required=True,
+                        help="The start date to create files for. e.g. '2021-07-30' when creating daily files, '2021-07' when creating monthly files.")
+
+    parser.add_argument('-e', '--end-date',
+                        type=str,
+                        required=False,
+                        help="The end date to create files for. e.g. '2021-07-30' when creating daily files, '2021-07' when creating monthly files. This is inclusive.")
+
+    parser.add_argument('-f', '--frequency',
+                        type=str,
+                        required=True,
+                        default='monthly',
+                        choices=['daily', 'monthly'],
+                        help="The frequency for creating the files, options are daily or monthly.")
+
+    parser.add_argument('-d', '--data-products',
+                        type=str,
+                        nargs='+',
+                        required=True,
+                        choices=DATA_PRODUCTS,
+                        help="The data products to create files for, provide both separated by a space to process soil and radiation e.g. -d soil radiation.")
+
+    parser.add_argument('-p', '--products',
+                        type=str,
+                        nargs='+',
+                        required=False,
+                        default=['netcdf', 'csv'],
+                        choices=['netcdf', 'csv'],
+                        help="The files to create from the quality control, netcdf and/or csv (the masked qc csv). Default is both.")
+
+    parser.add_argument('-l', '--qc-flag-levels',
+                        type=int,
+                        nargs='+',
+                        required=False,
+                        help="The qc flag levels to create masked csvs for, all from one quality control run e.g. -l 1 2 3. "
+                             "The level is added to the file names. Default is qc_flag_level in the config file, which is always used for the netCDF files.")
+
+    parser.add_argument('-w', '--workers',
+                        type=int,
+                        required=False,
+                        default=1,
+                        help="The number of processes to use, each day or month is processed in its own process. Default is 1.")
+
+    parser.add_argument('-c', '--config',
+                        type=str,
+                        required=False,
+                        help="Path to a config file to use instead of the one set in the CONFIG environment variable. It is read on top of the default config file.")
+
+    return parser.parse_args()
+
+def process(date, frequency, data_product, products, fpath, config=None, qc_flag_levels=None):
+    """
+    Run the quality control once for the data product and create the requested files from the same dataframes.
+
+    :param date: (datetime.datetime) The date for which to create the files.
+    :param frequency: (str) The frequency for files - daily or monthly.
+    :param data_product: (str) The data product to create the files for e.g. radiation or soil
+    :param products: (list) The files to create, 'csv' for the masked qc csv and/or 'netcdf'.
+    :param fpath: (str) The directory path at which to create the masked qc csvs.
+    :param config: (energy_balance.Config) Optional. The config to use, the config from the config files if not provided.
+    :param qc_flag_levels: (list) Optional. The qc flag levels to create masked qc csvs for. Default is qc_flag_level in the config file.
+    :returns: None
+    """
+    qc_class, netcdf_class = get_classes(data_product)
+    csv_paths = get_csv_paths(fpath, data_product, date, frequency, qc_flag_levels)
+
+    max_memory = get_max_memory(config)
+    if max_memory:
+        process_in_chunks(qc_class, date, frequency, max_memory,
+                          netcdf_class=netcdf_class if 'netcdf' in products else None,
+                          csv_paths=csv_paths if 'csv' in products else None,
+                          config=config)
+        return
+
+    qc = qc_class(date, frequency, config=config)
+
+    # the csv is written first, as the netCDF classes convert values (e.g. to kelvin) in place
+    if 'csv' in products:
+        for qc_flag, csv_path in csv_paths.items():
+            qc.create_masked_csv(csv_path, qc_flag=qc_flag)
+
+    # the netCDF file reuses the mask from the quality control
+    if 'netcdf' in products:
+        netcdf_class(qc.df, qc.qc, date, frequency, times=qc.times, mask=qc.mask, config=config)
+
+def process_files(start_date, end_date, frequency, data_products, products, fpath, workers=1, config=None, qc_flag_levels=None):
+    """
+    Create the requested files for each data product in the time range provided, running the quality control once for each day or month.
+
+    :param start_date: (datetime.datetime) The start date for which to create the files.
+    :param end_date: (datetime.datetime) The end date for which to create the files.
+    :param frequency: (str) The frequency for files - daily or monthly.
+    :param data_products: (list) The data products to create the files for e.g. ['soil', 'radiation']
+    :param products: (list) The files to create, 'csv' for the masked qc csv and/or 'netcdf'.
+    :param fpath: (str) The directory path at which to create the masked qc csvs.
+    :param workers: (int) The number of processes to use. Default is 1.
+    :param config: (energy_balance.Config) Optional. The config to use, the config from the config files if not provided.
+    :param qc_flag_levels: (list) Optional. The qc flag levels to create masked qc csvs for. Default is qc_flag_level in the config file.
+    :returns: (dict) For each data product, a (date, status, message) tuple for each day or month.
+    """
+    periods = get_periods(start_date, end_date, frequency)
+    tasks = [(date, frequency, data_product, products, fpath, config, qc_flag_levels) for data_product in data_products for date in periods]
+
+    results = run_periods(process, tasks, workers)
+
+    return {data_product: results[i * len(periods): (i + 1) * len(periods)] for i, data_product in enumerate(data_products)}
+
+
+def main():
+    args = arg_parse()
+
+    freq = args.frequency
+
+    if freq == 'daily':
+        date_format = "%Y-%m-%d"
+    else:
+        date_format = "%Y-%m"
+
+    try:
+        start_date = datetime.strptime(args.start_date, date_format)
+    except ValueError:
+        raise ValueError("Dates must be in a format matching the frequency: Y-m-d for daily, Y-m for monthly.")
+
+    # if no end date, make it the same as the start date, then file will be created
+    if args.end_date:
+        end_date = datetime.strptime(args.end_date, date_format)
+        complete_stmnt = f'Files created for {args.start_date} {args.end_date}'
+    else:
+        end_date = start_date
+        complete_stmnt = f'File created for {args.start_date}'
+
+    # remove any repeated data products, keeping the order given
+    data_products = list(dict.fromkeys(args.data_products))
+    config = get_config(config_file=args.config)
+    fpath = os.path.expanduser(config['common']['qc_csv_path'])
+
+    results = process_files(start_date, end_date, freq, data_products, args.products, fpath, args.workers, config, args.qc_flag_levels)
+
+    failed = 0
+    for data_product, product_results in results.items():
+        print(f"{data_product}:")
+        failed += report_periods(product_results, freq)
+    print(complete_stmnt)
+
+    if failed:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
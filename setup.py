@@ -10,4 +10,5 @@ setup(
   packages=find_packages(),
   install_requires=requirements,
   package_data={"energy_balance": ["etc/config.ini"]},
+  entry_points={"console_scripts": ["energy-balance=energy_balance.cli:main"]},
 )